@@ -0,0 +1,12 @@
+"""
+Benchmarks and performance checks. Run from the backend directory, e.g.:
+
+    python -m benchmarks.number_parsing
+    python -m benchmarks.upload_throughput --sizes 1k 100k
+    python -m benchmarks.listing_queries
+    python -m benchmarks.serialization --rows 50000
+    python -m benchmarks.index_usage
+    python -m benchmarks.failed_upload
+
+benchmarks.generators produces the deterministic MT940 and CSV files they use.
+"""
@@ -0,0 +1,153 @@
+"""
+Check: a statement upload that fails part way through leaves nothing behind.
+
+Usage (from the backend directory):
+    python -m benchmarks.failed_upload [--rows 2000]
+
+Uploads an MT940 file whose last statement line holds a byte that isn't valid UTF-8,
+once through upload_mt940 and once as a background ingest job, with INGEST_CHUNK_SIZE=100
+so several chunks are committed before the decode error. Checks that the upload fails,
+that no transactions, raw data or upload batches are left, and that the corrected file
+can be uploaded afterwards. Also checks that transactions without an upload batch row
+are still listed by /api/upload-batches and can be deleted through it, and that a CSV
+export with a Windows-1252 byte past the sniffed prefix is imported rather than aborted.
+Exits with status 1 if a check fails.
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import uuid
+
+from benchmarks.generators import iter_csv_lines, iter_mt940_lines
+
+
+def statement_files(rows: int):
+    """(broken, corrected) MT940 file contents; broken has a Latin-1 byte in its last line"""
+    lines = list(iter_mt940_lines(rows))
+    corrected = '\r\n'.join(lines).encode('utf-8') + b'\r\n'
+    last_information = max(index for index, line in enumerate(lines) if line.startswith(':86:'))
+    broken_lines = [line.encode('utf-8') for line in lines]
+    broken_lines[last_information] += b' Caf\xe9'
+    return b'\r\n'.join(broken_lines) + b'\r\n', corrected
+
+
+def legacy_csv_file(rows: int) -> bytes:
+    """UTF-8 CSV export whose last row holds a Windows-1252 byte, past the sniffed prefix"""
+    # Another seed than the MT940 file's, so the amounts (and dedup keys) differ
+    lines = [line.encode('utf-8') for line in iter_csv_lines(rows, seed=7)]
+    lines[-1] = lines[-1].replace(b'invoice', b'factuur \x80')
+    return b'\r\n'.join(lines) + b'\r\n'
+
+
+def stored_counts(db) -> dict:
+    from sqlalchemy import func
+    from models import Transaction, TransactionRawData, UploadBatch
+    return {
+        'transactions': db.query(func.count(Transaction.id)).scalar(),
+        'raw data': db.query(func.count(TransactionRawData.transaction_id)).scalar(),
+        'upload batches': db.query(func.count(UploadBatch.id)).scalar(),
+    }
+
+
+def upload(app_main, db, content: bytes, upload_type: str = 'MT940'):
+    """Upload through the endpoint. Returns (summary, HTTP error status)."""
+    from fastapi import HTTPException, UploadFile
+    try:
+        if upload_type == 'MT940':
+            upload_file = UploadFile(file=io.BytesIO(content), filename='statement.sta')
+            return app_main.upload_mt940(file=upload_file, db=db), None
+        upload_file = UploadFile(file=io.BytesIO(content), filename='export.csv')
+        return app_main.upload_csv(file=upload_file, column_mapping=None, db=db), None
+    except HTTPException as e:
+        return None, e.status_code
+
+
+def run_as_job(db, spool_dir: str, content: bytes):
+    """Process the file as a background ingest job, synchronously. Returns the finished job."""
+    from ingest_jobs import run_job
+    from models import IngestJob
+    job_id = str(uuid.uuid4())
+    spool_path = os.path.join(spool_dir, job_id)
+    with open(spool_path, 'wb') as spool_file:
+        spool_file.write(content)
+    db.add(IngestJob(
+        id=job_id, file_name='broken.sta', upload_type='MT940', status='queued', spool_path=spool_path,
+        upload_batch_id=str(uuid.uuid4()), content_hash=hashlib.sha256(content).hexdigest(), file_size=len(content)
+    ))
+    db.commit()
+    run_job(job_id)
+    db.expire_all()
+    return db.query(IngestJob).filter(IngestJob.id == job_id).one()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--rows', type=int, default=2000)
+    args = arg_parser.parse_args()
+
+    database_dir = tempfile.mkdtemp(prefix='ssrf-failed-upload-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(database_dir, 'failed_upload.db')}"
+    os.environ['INGEST_SPOOL_DIR'] = os.path.join(database_dir, 'spool')
+    os.environ['INGEST_CHUNK_SIZE'] = '100'
+    os.makedirs(os.environ['INGEST_SPOOL_DIR'])
+
+    from datetime import date
+    from csv_import import PREVIEW_BYTES
+    from database import SessionLocal
+    from models import Transaction
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main as app_main  # Creates the tables
+
+    broken, corrected = statement_files(args.rows)
+    empty = {'transactions': 0, 'raw data': 0, 'upload batches': 0}
+    failures = []
+
+    def check(name: str, ok: bool, detail=''):
+        print(f"{'ok' if ok else 'FAIL':<5} {name}{f' ({detail})' if detail and not ok else ''}")
+        if not ok:
+            failures.append(name)
+
+    db = SessionLocal()
+
+    _, status = upload(app_main, db, broken)
+    check('broken upload is rejected', status == 400, f"status {status}")
+    check('broken upload leaves no rows', stored_counts(db) == empty, stored_counts(db))
+    check('broken upload is not listed', app_main.get_upload_batches(db=db) == [])
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        job = run_as_job(db, os.environ['INGEST_SPOOL_DIR'], broken)
+    check('broken job fails', job.status == 'failed', job.status)
+    check('broken job leaves no rows', stored_counts(db) == empty, stored_counts(db))
+
+    summary, status = upload(app_main, db, corrected)
+    check('corrected file is imported', status is None and summary.created_count == args.rows,
+          f"status {status}" if status else f"created {summary.created_count}")
+    check('corrected file gets one upload batch', stored_counts(db)['upload batches'] == 1, stored_counts(db))
+
+    # Rows no upload_batches row points to, as an upload interrupted by a restart would leave
+    db.add_all([
+        Transaction(date=date(2024, 1, index + 1), amount=1.0, reference=f"ORPHAN{index}", upload_batch_id='orphaned')
+        for index in range(3)
+    ])
+    db.commit()
+    listed = {batch.upload_batch_id: batch for batch in app_main.get_upload_batches(db=db)}
+    check('orphaned rows are listed', 'orphaned' in listed and listed['orphaned'].transaction_count == 3)
+    deleted = app_main.delete_upload_batch('orphaned', db=db)
+    check('orphaned rows can be deleted', deleted['deleted_count'] == 3, deleted)
+
+    csv_content = legacy_csv_file(args.rows)
+    check('CSV test file is longer than the sniffed prefix', len(csv_content) > PREVIEW_BYTES, len(csv_content))
+    summary, status = upload(app_main, db, csv_content, 'CSV')
+    check('CSV with a legacy byte past the prefix is imported', status is None and summary.created_count == args.rows,
+          f"status {status}" if status else f"created {summary.created_count}")
+
+    db.close()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
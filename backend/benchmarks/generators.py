@@ -0,0 +1,109 @@
+"""
+Deterministic synthetic bank statements for the ingestion benchmarks.
+
+The same (rows, style, seed) always produces the same bytes, so runs on different
+machines or commits ingest identical files. Files are written line by line, so
+even the 1M-row sizes never have to fit in memory.
+"""
+from datetime import date, timedelta
+from typing import Iterator
+import os
+import random
+
+# Named benchmark sizes (rows)
+SIZES = {
+    '1k': 1_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+
+# CSV number styles: (decimal separator, thousands separator, field delimiter, date format)
+CSV_STYLES = {
+    'dutch': (',', '.', ';', '%d-%m-%Y'),
+    'us': ('.', ',', ',', '%m/%d/%Y'),
+}
+
+# Transactions per MT940 statement (one :20:...:62F: block)
+STATEMENT_SIZE = 500
+
+FIRST_DATE = date(2020, 1, 1)
+DAY_SPAN = 5 * 365
+
+COUNTERPARTIES = [
+    'Albert Heijn', 'Bouwbedrijf De Vries', 'Gemeente Utrecht', 'Eneco', 'KPN', 'NS Reizigers',
+    'Belastingdienst', 'Notaris Jansen', 'Huurder Kerkstraat 12', 'Huurder Dorpsweg 3',
+]
+
+
+def _transactions(rows: int, seed: int) -> Iterator[tuple]:
+    """Yield (index, date, cents, counterparty) in date order; cents is signed"""
+    rng = random.Random(seed)
+    for index in range(rows):
+        day = FIRST_DATE + timedelta(days=index * DAY_SPAN // max(rows, 1))
+        cents = rng.randint(1, 2_500_000_00)
+        if rng.random() < 0.6:
+            cents = -cents
+        yield index, day, cents, rng.choice(COUNTERPARTIES)
+
+
+def _format_amount(cents: int, decimal_sep: str, thousands_sep: str) -> str:
+    whole = f"{abs(cents) // 100:,}".replace(',', thousands_sep)
+    return f"{'-' if cents < 0 else ''}{whole}{decimal_sep}{abs(cents) % 100:02d}"
+
+
+def iter_mt940_lines(rows: int, seed: int = 42) -> Iterator[str]:
+    """Yield the lines of an MT940 file with the given number of transactions"""
+    balance = 0
+    for index, day, cents, counterparty in _transactions(rows, seed):
+        statement, position = divmod(index, STATEMENT_SIZE)
+        if position == 0:
+            if index:
+                yield f":62F:{'C' if balance >= 0 else 'D'}{day:%y%m%d}EUR{_format_amount(abs(balance), ',', '')}"
+                yield "-"
+            yield ":20:BENCH"
+            yield ":25:NL91ABNA0417164300"
+            yield f":28C:{statement + 1:05d}"
+            yield f":60F:{'C' if balance >= 0 else 'D'}{day:%y%m%d}EUR{_format_amount(abs(balance), ',', '')}"
+        balance += cents
+        mark = 'C' if cents > 0 else 'D'
+        yield f":61:{day:%y%m%d}{day:%m%d}{mark}{_format_amount(abs(cents), ',', '')}NTRFREF{index:09d}//B{index:09d}"
+        yield f":86:/EREF/REF{index:09d}//NAME/{counterparty}/REMI/Invoice {index}"
+    if rows:
+        yield f":62F:{'C' if balance >= 0 else 'D'}{day:%y%m%d}EUR{_format_amount(abs(balance), ',', '')}"
+        yield "-"
+
+
+def iter_csv_lines(rows: int, style: str = 'dutch', seed: int = 42) -> Iterator[str]:
+    """Yield the lines of a bank CSV export in the given number style"""
+    decimal_sep, thousands_sep, delimiter, date_format = CSV_STYLES[style]
+    yield delimiter.join(['Date', 'Amount', 'Currency', 'Reference', 'Description', 'Account Number'])
+    for index, day, cents, counterparty in _transactions(rows, seed):
+        amount = _format_amount(cents, decimal_sep, thousands_sep)
+        yield delimiter.join([
+            day.strftime(date_format), f'"{amount}"', 'EUR', f"REF{index:09d}",
+            f'"{counterparty} invoice {index}"', 'NL91ABNA0417164300'
+        ])
+
+
+def write_file(path: str, lines: Iterator[str]) -> str:
+    """Write generated lines to path (CRLF, as banks export them) and return the path"""
+    with open(path, 'w', encoding='utf-8', newline='') as output:
+        for line in lines:
+            output.write(line)
+            output.write('\r\n')
+    return path
+
+
+def ensure_file(data_dir: str, upload_type: str, rows: int, style: str = 'dutch', seed: int = 42) -> str:
+    """Return the path of a generated benchmark file, generating it if it doesn't exist yet"""
+    os.makedirs(data_dir, exist_ok=True)
+    if upload_type == 'MT940':
+        path = os.path.join(data_dir, f"mt940-{rows}-{seed}.sta")
+        lines = iter_mt940_lines(rows, seed)
+    else:
+        path = os.path.join(data_dir, f"csv-{style}-{rows}-{seed}.csv")
+        lines = iter_csv_lines(rows, style, seed)
+    if not os.path.exists(path):
+        write_file(path + '.tmp', lines)
+        os.replace(path + '.tmp', path)
+    return path
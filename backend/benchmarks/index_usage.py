@@ -0,0 +1,135 @@
+"""
+Check: every hot query shape is planned with the index meant for it (EXPLAIN based).
+
+Usage (from the backend directory):
+    python -m benchmarks.index_usage [--rows 5000] [--postgres-url postgresql://localhost/ssrf_bench]
+
+Seeds a database (a temporary SQLite file, or with --postgres-url / BENCHMARK_POSTGRES_URL
+a scratch PostgreSQL database whose tables are dropped and recreated), runs the real code
+paths behind each hot query while recording their SQL, and EXPLAINs the recorded
+statements. Exits with status 1 if a plan doesn't mention the expected index.
+On PostgreSQL sequential scans are disabled for the EXPLAIN, since on a small data set a
+scan would win anyway; the check is that the index is usable for the query shape.
+"""
+from datetime import date, timedelta
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+
+def seed(db, rows: int):
+    from models import Transaction, CashTransaction, Project
+    projects = [Project(name=f"Project {index}") for index in range(50)]
+    db.add_all(projects)
+    db.flush()
+    for index in range(rows):
+        day = date(2024, 1, 1) - timedelta(days=index % 730)
+        project = projects[index % len(projects)]
+        transaction = Transaction(date=day, amount=index + 0.5, reference=f"REF{index}", description=f"Row {index}")
+        cash_transaction = CashTransaction(date=day, amount=index + 0.5, description=f"Row {index}")
+        for row in (transaction, cash_transaction):
+            if index % 2:
+                row.project_id = project.id
+            else:
+                row.projects = [project]
+        db.add_all([transaction, cash_transaction])
+    db.commit()
+
+
+def hot_queries(db, app_main):
+    """(name, expected index, function running the query through the real code path)"""
+    from fastapi import Request, Response
+    from ingestion import fetch_existing_keys
+    from models import Transaction, CashTransaction
+
+    def listing(function, path):
+        request = Request({'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'', 'headers': []})
+        return lambda: function(request=request, response=Response(), project_id=7, start_date=None, end_date=None,
+                                limit=100, cursor=None, include_total=False, q=None, fields=None, db=db)
+
+    return [
+        ('dedup lookup', 'ix_transactions_dedup',
+         lambda: fetch_existing_keys(db, [{'date': date(2023, 6, 1), 'reference': 'REF1', 'amount': 1.5}])),
+        ('transactions by project', 'ix_transaction_projects_project_id',
+         listing(app_main.get_transactions, '/api/transactions')),
+        ('cash transactions by project', 'ix_cash_transaction_projects_project_id',
+         listing(app_main.get_cash_transactions, '/api/cash-transactions')),
+        ('legacy project tag in period', 'ix_transactions_project_id_date',
+         lambda: db.query(Transaction.id).filter(
+             Transaction.project_id == 7, Transaction.date.between(date(2023, 1, 1), date(2023, 3, 31))
+         ).all()),
+        ('legacy cash project tag in period', 'ix_cash_transactions_project_id_date',
+         lambda: db.query(CashTransaction.id).filter(
+             CashTransaction.project_id == 7, CashTransaction.date.between(date(2023, 1, 1), date(2023, 3, 31))
+         ).all()),
+    ]
+
+
+def explain(connection, dialect: str, statement: str, parameters) -> str:
+    cursor = connection.cursor()
+    try:
+        if dialect == 'postgresql':
+            cursor.execute("SET enable_seqscan = off")
+            cursor.execute(f"EXPLAIN {statement}", parameters)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+            cursor.execute("RESET enable_seqscan")
+            return plan
+        cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--rows', type=int, default=5000)
+    arg_parser.add_argument('--postgres-url', default=os.getenv('BENCHMARK_POSTGRES_URL'))
+    args = arg_parser.parse_args()
+
+    database_dir = tempfile.mkdtemp(prefix='ssrf-indexes-')
+    os.environ['DATABASE_URL'] = args.postgres_url or f"sqlite:///{os.path.join(database_dir, 'indexes.db')}"
+    os.environ.setdefault('INGEST_SPOOL_DIR', os.path.join(database_dir, 'spool'))
+
+    from sqlalchemy import event, text
+    from database import SessionLocal, engine, Base
+    import models  # noqa: F401 - registers the tables on Base
+
+    if args.postgres_url:
+        Base.metadata.drop_all(bind=engine)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main as app_main  # Creates the tables
+
+    db = SessionLocal()
+    seed(db, args.rows)
+    db.execute(text("ANALYZE"))
+    db.commit()
+
+    recorded = []
+    event.listen(engine, 'before_cursor_execute',
+                 lambda conn, cursor, statement, parameters, context, executemany:
+                 recorded.append((statement, parameters)))
+
+    failed = False
+    for name, expected_index, run in hot_queries(db, app_main):
+        recorded.clear()
+        run()
+        statements = [(statement, parameters) for statement, parameters in recorded
+                      if statement.lstrip().upper().startswith('SELECT')]
+        connection = db.connection().connection
+        plans = [explain(connection, engine.dialect.name, statement, parameters) for statement, parameters in statements]
+        used = any(expected_index in plan for plan in plans)
+        print(f"{'ok' if used else 'FAIL':<5} {name:<34} {expected_index}")
+        if not used:
+            failed = True
+            for plan in plans:
+                print('      ' + plan.replace('\n', '\n      '))
+
+    db.close()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
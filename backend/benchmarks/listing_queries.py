@@ -0,0 +1,92 @@
+"""
+Check: SQL statements issued by the transaction listings must not grow with the page size.
+
+Usage (from the backend directory):
+    python -m benchmarks.listing_queries [--rows 2000]
+
+Seeds a temporary SQLite database with bank and cash transactions, half tagged through
+the legacy project_id column and half through the many-to-many projects table, then
+calls get_transactions/get_cash_transactions in-process at several page sizes, up to
+MAX_PAGE_SIZE, and counts the statements. Exits with status 1 if a page takes other than
+PAGE_STATEMENTS statements, or if listing every row (no limit, so no COUNT query) takes
+other than PAGE_STATEMENTS - 1.
+"""
+from datetime import date, timedelta
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+
+# Page sizes compared besides MAX_PAGE_SIZE, then every row (no limit)
+PAGE_SIZES = [1, 10, 100]
+
+# Statements a page takes whatever its size: table versions (ETag), COUNT, the page, its projects
+PAGE_STATEMENTS = 4
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--rows', type=int, default=2000)
+    args = arg_parser.parse_args()
+
+    database_dir = tempfile.mkdtemp(prefix='ssrf-listing-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(database_dir, 'listing.db')}"
+    os.environ.setdefault('INGEST_SPOOL_DIR', os.path.join(database_dir, 'spool'))
+
+    from fastapi import Request, Response
+    from sqlalchemy import event
+    from database import SessionLocal, engine
+    from models import Transaction, CashTransaction, Project
+    from pagination import MAX_PAGE_SIZE
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main as app_main  # Creates the tables
+
+    db = SessionLocal()
+    projects = [Project(name=f"Project {index}") for index in range(20)]
+    db.add_all(projects)
+    db.flush()
+    for index in range(args.rows):
+        day = date(2024, 1, 1) - timedelta(days=index % 365)
+        project = projects[index % len(projects)]
+        for model in (Transaction, CashTransaction):
+            row = model(date=day, amount=index + 0.5, description=f"Row {index}")
+            if index % 2:
+                row.project_id = project.id
+            else:
+                row.projects = [project]
+            db.add(row)
+    db.commit()
+
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args_: statements.append(args_[2]))
+
+    failed = False
+    for name, listing in (('transactions', app_main.get_transactions),
+                          ('cash-transactions', app_main.get_cash_transactions)):
+        counts = {}
+        for limit in [*PAGE_SIZES, MAX_PAGE_SIZE, None]:
+            db.expire_all()
+            statements.clear()
+            request = Request({'type': 'http', 'method': 'GET', 'path': f'/api/{name}', 'query_string': b'', 'headers': []})
+            rows = json.loads(listing(request=request, response=Response(), project_id=None, start_date=None,
+                                      end_date=None, limit=limit, cursor=None, include_total=True, q=None,
+                                      fields=None, db=db).body)
+            counts[limit] = len(statements)
+            print(f"{name:<18} limit={str(limit):<5} rows={len(rows):<6} statements={len(statements)}")
+        wrong = {limit: count for limit, count in counts.items() if limit is not None and count != PAGE_STATEMENTS}
+        if wrong:
+            failed = True
+            print(f"FAIL: {name} pages should take {PAGE_STATEMENTS} statements, not {wrong}")
+        if counts[None] != PAGE_STATEMENTS - 1:
+            failed = True
+            print(f"FAIL: {name} without limit should take {PAGE_STATEMENTS - 1} statements (no COUNT query)")
+
+    db.close()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark: per-column number parser vs. the per-value parse_european_number heuristic.
+
+Usage (from the backend directory):
+    python -m benchmarks.number_parsing [--cells 1000000] [--style dutch|us]
+"""
+import argparse
+import random
+import time
+
+from csv_import import (
+    parse_european_number, detect_decimal_separator, make_number_parser, FORMAT_SAMPLE_SIZE
+)
+
+
+def generate_cells(count: int, style: str, seed: int = 42) -> tuple:
+    """Deterministic amount cells in the given number style, with their true values"""
+    rng = random.Random(seed)
+    decimal_sep, thousands_sep = (',', '.') if style == 'dutch' else ('.', ',')
+    cells = []
+    values = []
+    for _ in range(count):
+        cents = rng.randint(1, 500_000_00)
+        whole = f"{cents // 100:,}".replace(',', thousands_sep)
+        cell = f"{whole}{decimal_sep}{cents % 100:02d}"
+        value = cents / 100
+        if rng.random() < 0.4:
+            cell = '-' + cell
+            value = -value
+        cells.append(cell)
+        values.append(value)
+    return cells, values
+
+
+def count_wrong(parser, cells: list, values: list) -> int:
+    return sum(1 for cell, value in zip(cells, values) if parser(cell) != value)
+
+
+def time_parser(parser, cells: list) -> float:
+    start = time.perf_counter()
+    for value in cells:
+        parser(value)
+    return time.perf_counter() - start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--cells', type=int, default=1_000_000)
+    arg_parser.add_argument('--style', choices=['dutch', 'us'], default='dutch')
+    args = arg_parser.parse_args()
+
+    cells, values = generate_cells(args.cells, args.style)
+
+    start = time.perf_counter()
+    decimal_sep = detect_decimal_separator(cells[:FORMAT_SAMPLE_SIZE])
+    fast_parser = make_number_parser(decimal_sep)
+    detect_time = time.perf_counter() - start
+
+    baseline = time_parser(parse_european_number, cells)
+    specialised = time_parser(fast_parser, cells)
+
+    print(f"cells:                 {len(cells):,} ({args.style} style, detected decimal separator {decimal_sep!r})")
+    print(f"format detection:      {detect_time * 1000:.2f} ms")
+    print(f"parse_european_number: {baseline:.3f} s ({len(cells) / baseline:,.0f} cells/s)")
+    print(f"specialised parser:    {specialised:.3f} s ({len(cells) / specialised:,.0f} cells/s)")
+    print(f"speedup:               {baseline / specialised:.1f}x")
+    print(f"wrong values:          parse_european_number {count_wrong(parse_european_number, cells, values):,}, "
+          f"specialised {count_wrong(fast_parser, cells, values):,}")
+
+
+if __name__ == '__main__':
+    main()
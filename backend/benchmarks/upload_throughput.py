@@ -0,0 +1,165 @@
+"""
+Benchmark: end-to-end MT940/CSV upload throughput, driving upload_mt940/upload_csv in-process.
+
+Usage (from the backend directory):
+    python -m benchmarks.upload_throughput [--sizes 1k 100k 1m] [--formats mt940 csv-dutch csv-us]
+        [--postgres-url postgresql://localhost/ssrf_bench] [--output results.json]
+
+Every case runs in a fresh process against an empty database, so peak RSS and SQL
+statement counts belong to that upload alone. SQLite uses a temporary file; with
+--postgres-url (or BENCHMARK_POSTGRES_URL) the same cases also run on PostgreSQL.
+All tables in that database are dropped and recreated, so point it at a scratch database.
+Statements sent with COPY bypass SQLAlchemy and are not counted.
+
+The SQL statement count of every case must stay within a budget that grows with the
+number of committed chunks, not rows (a row-at-a-time write path fails it); the script
+exits with status 1 otherwise.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from benchmarks.generators import SIZES, ensure_file
+
+# SQL statements an upload may send once (batch lookup, tagging rules, batch row, ...)
+FIXED_STATEMENT_BUDGET = 50
+
+# SQL statements per committed chunk (dedup lookups, insert, id read-back, raw data, ...)
+CHUNK_STATEMENT_BUDGET = 20
+
+# Format name -> (upload type, CSV style)
+FORMATS = {
+    'mt940': ('MT940', None),
+    'csv-dutch': ('CSV', 'dutch'),
+    'csv-us': ('CSV', 'us'),
+}
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the current process in MB"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_case(database_url: str, upload_type: str, path: str) -> dict:
+    """Upload one file into an empty database (runs in its own process)"""
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('INGEST_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'ssrf-benchmark-spool'))
+
+    from fastapi import UploadFile
+    from sqlalchemy import event
+    from database import SessionLocal, engine, Base
+    import models  # noqa: F401 - registers the tables on Base
+
+    Base.metadata.drop_all(bind=engine)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main  # Creates the tables
+    from ingestion import INGEST_CHUNK_SIZE
+
+    statements = {'count': 0, 'executemany': 0}
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements['count'] += 1
+        if executemany:
+            statements['executemany'] += 1
+
+    event.listen(engine, 'before_cursor_execute', count_statement)
+
+    db = SessionLocal()
+    try:
+        with open(path, 'rb') as upload_file:
+            upload = UploadFile(file=upload_file, filename=os.path.basename(path))
+            start = time.perf_counter()
+            if upload_type == 'MT940':
+                summary = main.upload_mt940(file=upload, db=db)
+            else:
+                summary = main.upload_csv(file=upload, column_mapping=None, db=db)
+            elapsed = time.perf_counter() - start
+    finally:
+        db.close()
+
+    rows = summary.created_count + summary.skipped_count + summary.error_count
+    chunks = -(-(summary.created_count + summary.skipped_count) // INGEST_CHUNK_SIZE)
+    return {
+        'database': engine.dialect.name,
+        'file_bytes': os.path.getsize(path),
+        'rows': rows,
+        'created_count': summary.created_count,
+        'skipped_count': summary.skipped_count,
+        'error_count': summary.error_count,
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(rows / elapsed) if elapsed else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'sql_statements': statements['count'],
+        'sql_executemany': statements['executemany'],
+        'sql_statement_budget': FIXED_STATEMENT_BUDGET + chunks * CHUNK_STATEMENT_BUDGET,
+    }
+
+
+def run_isolated(database_url: str, upload_type: str, path: str) -> dict:
+    """Run one case in a fresh spawned process"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(run_case, database_url, upload_type, path).result()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=['1k', '100k'])
+    arg_parser.add_argument('--formats', nargs='+', choices=list(FORMATS), default=list(FORMATS))
+    arg_parser.add_argument('--postgres-url', default=os.getenv('BENCHMARK_POSTGRES_URL'),
+                            help='Scratch PostgreSQL database (all tables are dropped)')
+    arg_parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'ssrf-benchmark-data'),
+                            help='Where generated statement files are cached')
+    arg_parser.add_argument('--seed', type=int, default=42)
+    arg_parser.add_argument('--output', default='upload-throughput.json')
+    args = arg_parser.parse_args()
+
+    sqlite_dir = tempfile.mkdtemp(prefix='ssrf-benchmark-')
+    databases = [('sqlite', None)]
+    if args.postgres_url:
+        databases.append(('postgresql', args.postgres_url))
+
+    results = []
+    failed = False
+    for size in args.sizes:
+        for format_name in args.formats:
+            upload_type, style = FORMATS[format_name]
+            path = ensure_file(args.data_dir, upload_type, SIZES[size], style or 'dutch', args.seed)
+            for database_name, database_url in databases:
+                if database_url is None:
+                    database_url = f"sqlite:///{os.path.join(sqlite_dir, f'{format_name}-{size}.db')}"
+                result = dict(size=size, format=format_name, **run_isolated(database_url, upload_type, path))
+                results.append(result)
+                print(f"{database_name:<10} {format_name:<9} {size:>5}: {result['rows_per_sec']:>9,} rows/s, "
+                      f"{result['seconds']:>8.2f} s, peak RSS {result['peak_rss_mb']:>7.1f} MB, "
+                      f"{result['sql_statements']:,} SQL statements")
+                if result['sql_statements'] > result['sql_statement_budget']:
+                    failed = True
+                    print(f"FAIL: {result['sql_statements']:,} SQL statements, "
+                          f"more than the budget of {result['sql_statement_budget']:,}")
+
+    with open(args.output, 'w') as output:
+        json.dump({
+            'started_at': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'results': results,
+        }, output, indent=2)
+    print(f"Results written to {args.output}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
 """
 Script to clear all data from the SSRF Accounting database.
-This will delete all transactions, cash transactions, and projects.
+This will delete all transactions, cash transactions, tagging rules and projects.
 """
 
 from database import SessionLocal, engine, Base
-from models import Transaction, CashTransaction, Project
+from models import Transaction, TransactionRawData, CashTransaction, Project, UploadBatch, TaggingRule, tagging_rule_projects
+import table_versions  # Bumps the listing ETags on commit
 import os
 
 def clear_all_data():
@@ -15,14 +16,24 @@ def clear_all_data():
     
     db = SessionLocal()
     try:
-        # Delete all transactions
+        # Delete all transactions and their raw source data
+        db.query(TransactionRawData).delete()
         deleted_transactions = db.query(Transaction).delete()
         print(f"Deleted {deleted_transactions} transactions")
         
+        # Delete all upload batches
+        deleted_batches = db.query(UploadBatch).delete()
+        print(f"Deleted {deleted_batches} upload batches")
+        
         # Delete all cash transactions
         deleted_cash = db.query(CashTransaction).delete()
         print(f"Deleted {deleted_cash} cash transactions")
         
+        # Delete all tagging rules (they reference projects)
+        db.execute(tagging_rule_projects.delete())
+        deleted_rules = db.query(TaggingRule).delete()
+        print(f"Deleted {deleted_rules} tagging rules")
+        
         # Delete all projects
         deleted_projects = db.query(Project).delete()
         print(f"Deleted {deleted_projects} projects")
@@ -0,0 +1,547 @@
+"""
+Helpers for parsing bank CSV exports.
+
+The column mapping is resolved once against the CSV header into a column plan
+(field name -> column index), which is then applied to plain csv.reader rows.
+Number and date formats are inferred once per column from a sample of rows,
+and the rest of the file is parsed with parsers specialised for those formats.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from datetime import datetime, date
+from itertools import chain, islice
+import codecs
+import csv
+import io
+
+from dateutil import parser as date_parser
+
+# Number of leading data rows used to infer number and date formats
+FORMAT_SAMPLE_SIZE = 200
+
+# Leading bytes of a file used to sniff its encoding and delimiter and to build the preview
+PREVIEW_BYTES = 64 * 1024
+
+# Number of sample rows returned by the preview
+PREVIEW_ROWS = 5
+
+# Delimiters considered when sniffing
+CSV_DELIMITERS = ',;\t|'
+
+# Maximum number of row errors kept for reporting back to the client
+MAX_REPORTED_ERRORS = 100
+
+# Fields holding amounts
+AMOUNT_FIELDS = ('amount', 'debit', 'credit')
+
+# Fixed date formats considered for a date column. When several parse the whole
+# sample (all days <= 12), the earliest wins: month-first like dateutil's default.
+DATE_FORMATS = [
+    '%Y-%m-%d', '%Y/%m/%d', '%Y%m%d',
+    '%m/%d/%Y', '%d/%m/%Y', '%m-%d-%Y', '%d-%m-%Y', '%m.%d.%Y', '%d.%m.%Y'
+]
+
+# Maximum number of distinct date strings memoised per file
+DATE_CACHE_SIZE = 10000
+
+# Column names tried, in order, for each field when it is not explicitly mapped
+FIELD_ALTERNATIVES = {
+    'date': ['Date', 'DATE', 'transaction_date', 'Transaction Date', 'Date/Time'],
+    'transaction_type': ['Transaction Type', 'Type', 'TYPE', 'Debit or Credit', 'Debit/Credit', 'D/C', 'DC'],
+    'debit': ['Debit', 'DEBIT', 'Debit Amount', 'Debit Amount (EUR)'],
+    'credit': ['Credit', 'CREDIT', 'Credit Amount', 'Credit Amount (EUR)'],
+    'amount': ['Amount', 'AMOUNT', 'transaction_amount', 'Transaction Amount', 'Value'],
+    'reference': ['Reference', 'REFERENCE', 'transaction_reference', 'Transaction Reference', 'Ref', 'ID'],
+    'description': ['Description', 'DESCRIPTION', 'details', 'Details', 'transaction_details', 'Memo', 'Narrative'],
+    'currency': ['Currency', 'CURRENCY', 'Curr'],
+    'account_number': ['Account Number', 'Account', 'account', 'Account No'],
+    'statement_number': ['Statement Number', 'Statement', 'statement'],
+}
+
+
+def resolve_column(header: List[str], field_name: str, mapping: dict) -> Optional[int]:
+    """Resolve one field to a column index: explicit mapping, then default alternatives,
+    then a case-insensitive match on the field name"""
+    mapped_col = mapping.get(field_name)
+    if mapped_col and mapped_col in header:
+        return header.index(mapped_col)
+
+    for alt in FIELD_ALTERNATIVES.get(field_name, []):
+        if alt in header:
+            return header.index(alt)
+
+    field_lower = field_name.lower()
+    for index, column in enumerate(header):
+        if column.lower() == field_lower:
+            return index
+
+    return None
+
+
+def resolve_column_plan(header: List[str], mapping: Optional[dict] = None) -> Dict[str, Optional[int]]:
+    """Resolve every known field against the header once per file"""
+    mapping = mapping or {}
+    return {field: resolve_column(header, field, mapping) for field in FIELD_ALTERNATIVES}
+
+
+def plan_columns(header: List[str], plan: Dict[str, Optional[int]]) -> Dict[str, Optional[str]]:
+    """Column plan expressed as column names, as returned to the client for confirmation"""
+    return {field: header[index] if index is not None else None for field, index in plan.items()}
+
+
+def cell(row: List[str], index: Optional[int]) -> Optional[str]:
+    """Value of a planned column in a csv.reader row (None if unmapped or missing in a short row)"""
+    if index is None or index >= len(row):
+        return None
+    return row[index]
+
+
+def parse_european_number(num_str):
+    """Parse number that may use comma as decimal separator (Dutch/German format)"""
+    if not num_str or str(num_str).strip() == '':
+        return None
+    num_str = str(num_str).strip()
+    
+    # Handle negative amounts in parentheses: (1.234,56) -> -1234.56
+    is_negative = False
+    if num_str.startswith('(') and num_str.endswith(')'):
+        is_negative = True
+        num_str = num_str[1:-1].strip()
+    elif num_str.startswith('-'):
+        is_negative = True
+        num_str = num_str[1:].strip()
+    
+    # Count commas and dots to determine format
+    comma_count = num_str.count(',')
+    dot_count = num_str.count('.')
+    
+    # Dutch/German format: comma as decimal, dot as thousands separator
+    # Examples: "1.234,56" or "1,50" or "1234,56"
+    if comma_count == 1 and dot_count >= 0:
+        # Remove thousands separators (dots) and replace comma with dot
+        num_str = num_str.replace('.', '').replace(',', '.')
+    # US format: dot as decimal, comma as thousands separator
+    # Examples: "1,234.56" or "1.50"
+    elif dot_count == 1 and comma_count >= 0:
+        # Remove thousands separators (commas)
+        num_str = num_str.replace(',', '')
+    # No decimal separator, just remove thousands separators
+    elif comma_count > 1 or dot_count > 1:
+        # Multiple separators - assume last comma is decimal if more commas than dots
+        if comma_count > dot_count:
+            # Last comma is decimal
+            last_comma = num_str.rfind(',')
+            num_str = num_str[:last_comma].replace(',', '').replace('.', '') + '.' + num_str[last_comma+1:].replace(',', '').replace('.', '')
+        else:
+            # Last dot is decimal
+            last_dot = num_str.rfind('.')
+            num_str = num_str[:last_dot].replace(',', '').replace('.', '') + '.' + num_str[last_dot+1:].replace(',', '').replace('.', '')
+    # Single comma, no dots - treat as decimal separator (Dutch format)
+    elif comma_count == 1:
+        num_str = num_str.replace(',', '.')
+    # Single dot, no commas - already in US format, just remove any remaining commas
+    elif dot_count == 1:
+        num_str = num_str.replace(',', '')
+    # No separators or ambiguous - try removing all and see if it's an integer
+    else:
+        # Try as integer (no decimal part)
+        num_str = num_str.replace(',', '').replace('.', '')
+    
+    result = float(num_str)
+    return -result if is_negative else result
+
+
+def _separator_vote(value: str) -> Optional[str]:
+    """Decimal separator implied by one sample value, or None if the value is ambiguous"""
+    value = value.strip().strip('()-+ ')
+    has_comma = ',' in value
+    has_dot = '.' in value
+    if has_comma and has_dot:
+        # The separator that comes last is the decimal separator: 1.234,56 or 1,234.56
+        return ',' if value.rfind(',') > value.rfind('.') else '.'
+    if has_comma or has_dot:
+        sep = ',' if has_comma else '.'
+        if value.count(sep) > 1:
+            return '.' if sep == ',' else ','  # Repeated separator is the thousands separator: 1.234.567
+        if len(value) - value.rfind(sep) - 1 != 3:
+            return sep  # 1,5 / 12,50 / 1.5 / 12.50
+    return None  # No separator, or 1,234 / 1.234 which could be either
+
+
+def detect_decimal_separator(samples: Iterable[Optional[str]]) -> Optional[str]:
+    """Infer the decimal separator of a column from sample values.
+
+    Returns ',' (Dutch/German style, '.' for thousands), '.' (US style, ',' for
+    thousands) or None if the sample does not decide it.
+    """
+    votes = {',': 0, '.': 0}
+    for value in samples:
+        if value:
+            vote = _separator_vote(value)
+            if vote:
+                votes[vote] += 1
+    if votes[','] == votes['.']:
+        return None
+    return ',' if votes[','] > votes['.'] else '.'
+
+
+def make_number_parser(decimal_sep: Optional[str]) -> Callable[[Optional[str]], Optional[float]]:
+    """Build a parser for a column whose decimal separator is known.
+
+    The fast path strips the thousands separator and calls float() directly.
+    Values it cannot handle (blank, parentheses, spaced signs) go through a slower
+    path; without a known separator every value uses the per-value heuristic.
+    """
+    if decimal_sep is None:
+        return parse_european_number
+
+    if decimal_sep == ',':
+        def parse_number(num_str):
+            try:
+                return float(num_str.replace('.', '').replace(',', '.'))
+            except (ValueError, AttributeError):
+                return parse_slow(num_str)
+    else:
+        def parse_number(num_str):
+            try:
+                return float(num_str.replace(',', ''))
+            except (ValueError, AttributeError):
+                return parse_slow(num_str)
+
+    def parse_slow(num_str):
+        stripped = num_str.strip() if num_str else ''
+        inner = None
+        if stripped.startswith('(') and stripped.endswith(')'):
+            inner = stripped[1:-1]
+        elif stripped.startswith('-'):
+            inner = stripped[1:]
+        if inner is not None:
+            value = parse_number(inner.strip())
+            return -value if value is not None else None
+        return parse_european_number(stripped)
+
+    return parse_number
+
+
+def detect_number_formats(plan: Dict[str, Optional[int]], sample_rows: List[List[str]]) -> Dict[str, Optional[str]]:
+    """Infer the decimal separator of each amount column from the sample rows (None if undecided)"""
+    formats = {}
+    for field in AMOUNT_FIELDS:
+        index = plan.get(field)
+        samples = (cell(row, index) for row in sample_rows) if index is not None else ()
+        formats[field] = detect_decimal_separator(samples)
+    return formats
+
+
+def build_number_parsers(formats: Dict[str, Optional[str]]) -> Dict[str, Callable]:
+    """Build the parser for each amount column from its detected format"""
+    return {field: make_number_parser(decimal_sep) for field, decimal_sep in formats.items()}
+
+
+def parse_date_slow(date_str: str) -> Optional[date]:
+    """Parse a date of unknown format with dateutil, then a list of fixed formats"""
+    try:
+        return date_parser.parse(str(date_str)).date()
+    except (ValueError, OverflowError):
+        pass
+    for fmt in ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%Y/%m/%d', '%d-%m-%Y', '%m-%d-%Y', '%d.%m.%Y', '%m.%d.%Y']:
+        try:
+            return datetime.strptime(str(date_str).strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def detect_date_format(samples: Iterable[Optional[str]]) -> Optional[str]:
+    """Infer the strptime format of a date column from sample values.
+
+    Each candidate format is scored on the whole sample, so a single unambiguous
+    value (e.g. a day of 13 or more) decides day-first versus month-first for all rows.
+    """
+    values = [value.strip() for value in samples if value and value.strip()]
+    if not values:
+        return None
+
+    best_format = None
+    best_count = 0
+    for fmt in DATE_FORMATS:
+        count = 0
+        for value in values:
+            try:
+                datetime.strptime(value, fmt)
+                count += 1
+            except ValueError:
+                pass
+        if count > best_count:
+            best_format = fmt
+            best_count = count
+    return best_format
+
+
+class DateParser:
+    """Parses a date column with one inferred format, memoising repeated values.
+
+    Values that do not match the format go through parse_date_slow and are counted
+    in fallback_count.
+    """
+
+    def __init__(self, date_format: Optional[str]):
+        self.date_format = date_format
+        self.fallback_count = 0
+        self._cache = {}
+
+    def __call__(self, date_str: Optional[str]) -> Optional[date]:
+        if not date_str:
+            return None
+        try:
+            result, is_fallback = self._cache[date_str]
+        except KeyError:
+            result = None
+            if self.date_format:
+                try:
+                    result = datetime.strptime(date_str.strip(), self.date_format).date()
+                except ValueError:
+                    pass
+            is_fallback = result is None
+            if is_fallback:
+                result = parse_date_slow(date_str)
+
+            if len(self._cache) >= DATE_CACHE_SIZE:
+                self._cache.clear()
+            self._cache[date_str] = (result, is_fallback)
+
+        if is_fallback:
+            self.fallback_count += 1
+        return result
+
+
+def detect_encoding(prefix: bytes) -> str:
+    """Detect the encoding of a file from its first bytes: UTF-8 (with or without BOM),
+    else Windows-1252, else Latin-1 (which decodes anything)"""
+    try:
+        prefix.decode('utf-8-sig')
+        return 'utf-8-sig'
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the prefix is still UTF-8
+        if e.reason == 'unexpected end of data' and e.start >= len(prefix) - 3:
+            return 'utf-8-sig'
+    try:
+        prefix.decode('cp1252')
+        return 'cp1252'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+
+def _legacy_fallback(error: UnicodeError):
+    """Codec error handler decoding bytes invalid in the sniffed encoding like detect_encoding
+    would have: as Windows-1252, else Latin-1 (for the few bytes Windows-1252 leaves undefined)"""
+    if not isinstance(error, UnicodeDecodeError):
+        raise error
+    text = ''
+    for byte in error.object[error.start:error.end]:
+        try:
+            text += bytes([byte]).decode('cp1252')
+        except UnicodeDecodeError:
+            text += chr(byte)
+    return text, error.end
+
+
+# Error handler for decoding whole files: the encoding is sniffed from the first
+# PREVIEW_BYTES only, so a stray legacy byte further on must not abort the import
+LEGACY_FALLBACK_ERRORS = 'csv-legacy-fallback'
+codecs.register_error(LEGACY_FALLBACK_ERRORS, _legacy_fallback)
+
+
+def detect_delimiter(text: str) -> str:
+    """Detect the delimiter from the first lines of a CSV file, defaulting to a comma"""
+    try:
+        return csv.Sniffer().sniff(text, delimiters=CSV_DELIMITERS).delimiter
+    except csv.Error:
+        return ','
+
+
+def sniff_csv(prefix: bytes) -> Tuple[str, str]:
+    """Return (encoding, delimiter) for a CSV file from its first bytes"""
+    encoding = detect_encoding(prefix)
+    text = prefix.decode(encoding, errors='ignore')
+    if len(prefix) >= PREVIEW_BYTES and '\n' in text:
+        # Only sniff complete lines
+        text = text[:text.rfind('\n') + 1]
+    return encoding, detect_delimiter(text)
+
+
+def build_csv_preview(prefix: bytes, file_size: Optional[int] = None, mapping: Optional[dict] = None) -> dict:
+    """Build the CSV preview (the CSVPreviewResponse fields) from the first bytes of a file.
+
+    prefix is at most PREVIEW_BYTES long; when the file is longer, the row count is
+    estimated from the average row size in the prefix and the total file_size.
+    """
+    encoding, delimiter = sniff_csv(prefix)
+    text = prefix.decode(encoding, errors='ignore')
+    truncated = file_size is not None and file_size > len(prefix)
+    if truncated and '\n' in text:
+        # Drop the partial last line
+        text = text[:text.rfind('\n') + 1]
+
+    csv_reader = csv.reader(io.StringIO(text), delimiter=delimiter)
+    header = next(csv_reader, None) or []
+    data_rows = list(filter(None, csv_reader))
+
+    plan = resolve_column_plan(header, mapping)
+    format_rows = data_rows[:FORMAT_SAMPLE_SIZE]
+
+    if truncated and data_rows:
+        header_bytes = len(text.split('\n', 1)[0].encode(encoding)) + 1
+        data_bytes = len(text.encode(encoding)) - header_bytes
+        estimated_row_count = round(len(data_rows) * (file_size - header_bytes) / max(data_bytes, 1))
+    else:
+        estimated_row_count = len(data_rows)
+
+    return {
+        'columns': header,
+        'sample_rows': [dict(zip(header, row)) for row in data_rows[:PREVIEW_ROWS]],
+        'resolved_columns': plan_columns(header, plan),
+        'estimated_row_count': estimated_row_count,
+        'row_count_exact': not truncated,
+        'encoding': encoding,
+        'delimiter': delimiter,
+        'number_formats': detect_number_formats(plan, format_rows),
+        'date_format': detect_date_format(cell(row, plan['date']) for row in format_rows),
+    }
+
+
+class CSVRecordReader:
+    """Streams transaction records from a bank CSV export.
+
+    The header is resolved to a column plan and the number and date formats are
+    inferred from the first FORMAT_SAMPLE_SIZE rows when the reader is created.
+    Iterating yields one record per valid row; invalid rows are counted in
+    error_count and the first MAX_REPORTED_ERRORS messages are kept in errors.
+    """
+
+    def __init__(self, text_stream, mapping: Optional[dict] = None, delimiter: str = ','):
+        csv_reader = csv.reader(text_stream, delimiter=delimiter)
+        self.header = next(csv_reader, None) or []
+        self.plan = resolve_column_plan(self.header, mapping)
+
+        # Blank lines are skipped
+        data_rows = filter(None, csv_reader)
+        sample_rows = list(islice(data_rows, FORMAT_SAMPLE_SIZE))
+        self._rows = chain(sample_rows, data_rows)
+        self.number_formats = detect_number_formats(self.plan, sample_rows)
+        self.date_format = detect_date_format(cell(row, self.plan['date']) for row in sample_rows)
+        self.parse_date = DateParser(self.date_format)
+
+        self.error_count = 0
+        self.errors = []
+
+    @property
+    def date_fallback_count(self) -> int:
+        return self.parse_date.fallback_count
+
+    def _record_error(self, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(message)
+
+    def __iter__(self):
+        plan = self.plan
+        parsers = build_number_parsers(self.number_formats)
+        parse_amount = parsers['amount']
+        parse_debit = parsers['debit']
+        parse_credit = parsers['credit']
+        parse_date = self.parse_date
+        record_error = self._record_error
+        
+        for row_num, row in enumerate(self._rows, start=2):  # Start at 2 (row 1 is header)
+            try:
+                # Parse date
+                date_str = cell(row, plan['date'])
+                trans_date = parse_date(date_str)
+                
+                if not trans_date:
+                    record_error(f"Row {row_num}: Could not parse date from '{date_str}'")
+                    continue
+                
+                # Parse amount - check for transaction type column (Debit/Credit text) or separate debit/credit columns
+                transaction_type_str = cell(row, plan['transaction_type'])
+                debit_str = cell(row, plan['debit'])
+                credit_str = cell(row, plan['credit'])
+                amount_str = cell(row, plan['amount'])
+                
+                # Determine amount based on transaction type, separate debit/credit columns, or amount column
+                amount = None
+                
+                # First, check if we have a transaction type column (Debit/Credit text indicator)
+                if transaction_type_str and amount_str:
+                    transaction_type = str(transaction_type_str).strip().upper()
+                    try:
+                        base_amount = parse_amount(amount_str)
+                        if base_amount is not None:
+                            # Apply sign based on transaction type
+                            if 'DEBIT' in transaction_type:
+                                amount = -abs(base_amount)  # Debit = negative
+                            elif 'CREDIT' in transaction_type:
+                                amount = abs(base_amount)  # Credit = positive
+                            else:
+                                # Unknown type, use amount as-is
+                                amount = base_amount
+                    except Exception as e:
+                        record_error(f"Row {row_num}: Could not parse amount '{amount_str}' with type '{transaction_type_str}': {str(e)}")
+                
+                # If transaction type approach didn't work, try separate debit/credit columns
+                if amount is None:
+                    if debit_str and str(debit_str).strip():
+                        # Debit should be negative
+                        try:
+                            debit_amount = parse_debit(debit_str)
+                            if debit_amount is not None:
+                                amount = -abs(debit_amount)  # Ensure negative
+                        except Exception as e:
+                            # If debit parsing fails, try credit instead
+                            pass
+                    
+                    if amount is None and credit_str and str(credit_str).strip():
+                        # Credit should be positive
+                        try:
+                            credit_amount = parse_credit(credit_str)
+                            if credit_amount is not None:
+                                amount = abs(credit_amount)  # Ensure positive
+                        except Exception as e:
+                            # Will fall back to amount column if credit also fails
+                            pass
+                
+                # Fall back to amount column if transaction type or debit/credit not available
+                if amount is None:
+                    if not amount_str:
+                        record_error(f"Row {row_num}: No amount, transaction type, debit, or credit column found")
+                        continue
+                    try:
+                        amount = parse_amount(amount_str)
+                        if amount is None:
+                            record_error(f"Row {row_num}: Could not parse amount '{amount_str}'")
+                            continue
+                    except Exception as e:
+                        record_error(f"Row {row_num}: Could not parse amount '{amount_str}': {str(e)}")
+                        continue
+                
+                # Get other fields
+                reference = str(cell(row, plan['reference']) or '').strip()
+                description = str(cell(row, plan['description']) or '').strip()
+                currency = str(cell(row, plan['currency']) or 'EUR').strip()[:3] or 'EUR'
+                account_number = str(cell(row, plan['account_number']) or '').strip()
+                statement_number = str(cell(row, plan['statement_number']) or '').strip()
+                
+                yield {
+                    'date': trans_date,
+                    'amount': amount,
+                    'currency': currency,
+                    'reference': reference,
+                    'description': description,
+                    'account_number': account_number,
+                    'statement_number': statement_number,
+                    'raw_data': dict(zip(self.header, row)),
+                }
+                
+            except Exception as e:
+                record_error(f"Row {row_num}: {str(e)}")
+                continue
@@ -0,0 +1,55 @@
+"""
+Sparse fieldsets for list endpoints (?fields=id,date,amount).
+
+Only the columns behind the requested fields are selected (load_only) and relationships
+are fetched only when asked for; serialization.rows_response then encodes the rows
+through a response model trimmed to those fields, so unused columns are neither
+fetched nor encoded.
+"""
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only
+
+
+def parse_fields(fields: Optional[str], response_model) -> Optional[Tuple[str, ...]]:
+    """Requested field names, sorted and without duplicates. None when all fields are wanted.
+    Raises ValueError for names the response model doesn't have.
+
+    The result is the cache key of the serializer built for the fieldset, so every
+    ordering or repetition of the same fields shares one.
+    """
+    if not fields:
+        return None
+    names = tuple(sorted({name.strip() for name in fields.split(',') if name.strip()}))
+    unknown = [name for name in names if name not in response_model.model_fields]
+    if unknown:
+        raise ValueError(
+            f"Unknown fields: {', '.join(unknown)}. "
+            f"Available: {', '.join(response_model.model_fields)}"
+        )
+    return names or None
+
+
+def fieldset_options(
+    model,
+    fields: Sequence[str],
+    relationships: Dict[str, Tuple[list, Sequence[str]]],
+    required: Sequence[str] = ('id',)
+) -> list:
+    """Loader options fetching only what the fieldset needs.
+
+    relationships maps relationship fields to (loader options, columns the loaders need,
+    e.g. the foreign key). required columns are always loaded (primary key, sort keys).
+    """
+    column_names = set(inspect(model).column_attrs.keys())
+    names = list(required)
+    options = []
+    for name in fields:
+        if name in relationships:
+            loaders, needed_columns = relationships[name]
+            options.extend(loaders)
+            names.extend(needed_columns)
+        elif name in column_names:
+            names.append(name)
+    return [load_only(*[getattr(model, name) for name in dict.fromkeys(names)]), *options]
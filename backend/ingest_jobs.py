@@ -0,0 +1,189 @@
+"""
+Background ingestion jobs for MT940 and CSV statement uploads.
+
+An upload is copied to a spool directory and recorded as an IngestJob; a pool
+of worker threads then parses and writes it, updating the job row after every
+committed chunk so clients can poll /api/ingest-jobs/{id} for progress.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import json
+import os
+import traceback
+import uuid
+
+from fastapi import UploadFile
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import IngestJob, Transaction
+from schemas import IngestJobResponse
+from tagging import apply_tagging_rules
+from ingestion import (
+    ingest_csv, ingest_mt940, hash_stream, find_upload_batch, record_upload_batch,
+    already_uploaded_summary, discard_upload, IngestError
+)
+
+# Directory uploaded files wait in until a worker picks them up (created on first use)
+SPOOL_DIR = Path(os.getenv("INGEST_SPOOL_DIR", "uploads/ingest"))
+
+# Number of uploads processed concurrently
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+
+UPLOAD_TYPES = ("MT940", "CSV")
+
+_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+
+
+def create_job(db: Session, file: UploadFile, upload_type: str, column_mapping: str = None) -> IngestJob:
+    """Spool an uploaded file to disk, record the job and queue it for a worker.
+
+    The file is hashed while it is spooled; a byte-identical re-upload of an
+    earlier batch is recorded as a completed job for that batch and not parsed.
+    """
+    job_id = str(uuid.uuid4())
+    SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+    spool_path = SPOOL_DIR / job_id
+    with open(spool_path, "wb") as spool_file:
+        content_hash, file_size = hash_stream(file.file, copy_to=spool_file)
+
+    job = IngestJob(
+        id=job_id,
+        file_name=file.filename,
+        upload_type=upload_type,
+        status="queued",
+        spool_path=str(spool_path),
+        column_mapping=column_mapping,
+        upload_batch_id=str(uuid.uuid4()),
+        content_hash=content_hash,
+        file_size=file_size
+    )
+
+    earlier_batch = find_upload_batch(db, content_hash, upload_type)
+    if earlier_batch:
+        _remove_spool_file(str(spool_path))
+        _apply_summary(job, already_uploaded_summary(earlier_batch, file.filename))
+        job.upload_batch_id = earlier_batch.id
+        job.already_uploaded = True
+        job.spool_path = None
+        job.status = "completed"
+        job.started_at = job.finished_at = datetime.utcnow()
+
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    if not earlier_batch:
+        _executor.submit(run_job, job_id)
+    return job
+
+
+def resume_jobs():
+    """Re-queue jobs left queued or running by a previous server process.
+
+    Chunks committed before the restart are detected as duplicates of rows in
+    the same batch, so a resumed job only writes what is still missing; those
+    rows still count as created.
+    """
+    db = SessionLocal()
+    try:
+        jobs = db.query(IngestJob).filter(IngestJob.status.in_(["queued", "running"])).all()
+        for job in jobs:
+            if job.spool_path and os.path.exists(job.spool_path):
+                job.status = "queued"
+                db.commit()
+                _executor.submit(run_job, job.id)
+            else:
+                job.status = "failed"
+                job.errors = json.dumps(["Uploaded file was lost before processing finished"])
+                job.finished_at = datetime.utcnow()
+                db.commit()
+    finally:
+        db.close()
+
+
+def run_job(job_id: str):
+    """Process one spooled upload (runs on a worker thread with its own session)"""
+    db = SessionLocal()
+    try:
+        job = db.query(IngestJob).filter(IngestJob.id == job_id).first()
+        if not job or job.status not in ("queued", "running"):
+            return
+
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        db.commit()
+
+        # Rows committed by an earlier run of this job that was interrupted by a restart
+        resumed_count = db.query(func.count(Transaction.id)).filter(
+            Transaction.upload_batch_id == job.upload_batch_id
+        ).scalar()
+
+        def on_progress(summary):
+            _apply_summary(job, summary)
+            db.commit()
+
+        try:
+            if job.upload_type == "MT940":
+                with open(job.spool_path, "rb") as spool_file:
+                    summary = ingest_mt940(db, spool_file, job.upload_batch_id, on_progress, resumed_count)
+            else:
+                mapping = json.loads(job.column_mapping) if job.column_mapping else {}
+                with open(job.spool_path, "rb") as spool_file:
+                    summary = ingest_csv(db, spool_file, job.upload_batch_id, mapping, on_progress, resumed_count)
+            _apply_summary(job, summary)
+            apply_tagging_rules(db, Transaction.upload_batch_id == job.upload_batch_id)
+            record_upload_batch(db, summary, job.file_name, job.content_hash, job.file_size)
+            job.status = "completed"
+        except Exception as e:
+            # Delete the chunks committed so far; the job's file can then be uploaded again
+            discard_upload(db, job.upload_batch_id)
+            if not isinstance(e, IngestError):
+                print(f"Ingest job {job_id} failed: {e}")
+                print(traceback.format_exc())
+            job.status = "failed"
+            job.rows_created = 0
+            job.errors = json.dumps([str(e)])
+
+        job.finished_at = datetime.utcnow()
+        db.commit()
+        _remove_spool_file(job.spool_path)
+    finally:
+        db.close()
+
+
+def job_response(job: IngestJob) -> IngestJobResponse:
+    """Build the API response for a job (errors are stored as JSON text)"""
+    return IngestJobResponse(
+        id=job.id,
+        file_name=job.file_name,
+        upload_type=job.upload_type,
+        status=job.status,
+        upload_batch_id=job.upload_batch_id,
+        rows_processed=job.rows_processed or 0,
+        rows_created=job.rows_created or 0,
+        rows_skipped=job.rows_skipped or 0,
+        error_count=job.error_count or 0,
+        errors=json.loads(job.errors) if job.errors else [],
+        already_uploaded=bool(job.already_uploaded),
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at
+    )
+
+
+def _apply_summary(job: IngestJob, summary: dict):
+    job.rows_created = summary['created_count']
+    job.rows_skipped = summary['skipped_count']
+    job.error_count = summary['error_count']
+    job.rows_processed = summary['created_count'] + summary['skipped_count'] + summary['error_count']
+    job.errors = json.dumps(summary['errors'])
+
+
+def _remove_spool_file(spool_path: str):
+    try:
+        os.remove(spool_path)
+    except OSError:
+        pass
@@ -0,0 +1,627 @@
+"""
+Shared stages of the statement ingestion pipeline (MT940 and CSV uploads).
+
+The upload endpoints parse a file into plain transaction records (dicts with the
+Transaction column names, plus the source data as raw_data) and hand them to the
+stages below, so that database work is done per upload instead of per row.
+"""
+from typing import Callable, Iterable, Iterator, List, Optional, Set, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from itertools import islice
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+import zipfile
+import zlib
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from models import Transaction, TransactionRawData, UploadBatch, transaction_projects
+from csv_import import CSVRecordReader, LEGACY_FALLBACK_ERRORS, PREVIEW_BYTES, sniff_csv
+from mt940_import import MT940RecordReader, parse_mt940_file
+from table_versions import touch_tables
+from tagging import apply_tagging_rules, load_matcher
+
+
+class IngestError(ValueError):
+    """An uploaded file could not be imported; the message is shown to the user"""
+
+
+# Maximum number of distinct dates sent in one IN (...) lookup
+DEDUP_DATE_CHUNK_SIZE = 500
+
+# Worker processes used to parse multi-file MT940 uploads (parsing is CPU-bound)
+PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", str(os.cpu_count() or 1)))
+
+# Process pool shared by all multi-file uploads, started on first use
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+
+# Limits for statement ZIP archives
+MAX_ARCHIVE_MEMBERS = int(os.getenv("INGEST_MAX_ARCHIVE_MEMBERS", "500"))
+MAX_ARCHIVE_BYTES = int(os.getenv("INGEST_MAX_ARCHIVE_BYTES", str(500 * 1024 * 1024)))
+
+# Uploads (or streamed chunks) with at least this many new rows are written with COPY on PostgreSQL
+COPY_THRESHOLD = int(os.getenv("INGEST_COPY_THRESHOLD", "5000"))
+
+# Number of parsed rows deduplicated, written and committed together by streaming uploads
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "10000"))
+
+# Bytes read at a time when hashing (and spooling) uploaded files
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Columns written by the bulk insert path, in COPY column order
+INSERT_COLUMNS = (
+    'date', 'amount', 'currency', 'reference', 'description', 'account_number',
+    'statement_number', 'upload_batch_id', 'created_at'
+)
+
+def pack_raw_data(raw) -> bytes:
+    """Serialize a record's raw source data as compact JSON and compress it with zlib"""
+    return zlib.compress(json.dumps(raw, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8'))
+
+
+def unpack_raw_data(data: bytes):
+    """Inverse of pack_raw_data"""
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+def hash_stream(binary_file, copy_to=None) -> Tuple[str, int]:
+    """Return the SHA-256 hex digest and size of a binary file object, read in chunks.
+
+    If copy_to is given every chunk is also written to it, so an upload can be
+    spooled and hashed in one pass.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = binary_file.read(HASH_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+        if copy_to is not None:
+            copy_to.write(chunk)
+    return digest.hexdigest(), size
+
+
+def find_upload_batch(db: Session, content_hash: str, upload_type: str) -> Optional[UploadBatch]:
+    """Return the earliest upload batch of a byte-identical file, if there is one"""
+    return db.query(UploadBatch).filter(
+        UploadBatch.content_hash == content_hash,
+        UploadBatch.upload_type == upload_type
+    ).order_by(UploadBatch.created_at).first()
+
+
+def record_upload_batch(
+    db: Session,
+    summary: dict,
+    file_name: Optional[str],
+    content_hash: Optional[str],
+    file_size: Optional[int]
+) -> UploadBatch:
+    """Store the UploadBatch row for a completed upload summary. The caller commits.
+
+    Account and statement number are read from the rows written for the batch.
+    """
+    numbers = db.query(
+        func.min(Transaction.account_number), func.min(Transaction.statement_number)
+    ).filter(
+        Transaction.upload_batch_id == summary['upload_batch_id']
+    ).one()
+
+    batch = UploadBatch(
+        id=summary['upload_batch_id'],
+        file_name=file_name,
+        upload_type=summary['upload_type'],
+        content_hash=content_hash,
+        file_size=file_size,
+        created_count=summary['created_count'],
+        skipped_count=summary['skipped_count'],
+        error_count=summary['error_count'],
+        account_number=numbers[0],
+        statement_number=numbers[1]
+    )
+    db.add(batch)
+    return batch
+
+
+def delete_batch_transactions(db: Session, batch_id: str) -> Tuple[int, int]:
+    """Delete the transactions of an upload batch with their project links and raw source data.
+
+    Runs as set-based DELETE statements without loading any rows. Returns the number of
+    transactions deleted and of project links removed. The caller commits.
+    """
+    batch_transaction_ids = select(Transaction.id).where(Transaction.upload_batch_id == batch_id)
+    unlinked_count = db.execute(
+        delete(transaction_projects).where(transaction_projects.c.transaction_id.in_(batch_transaction_ids))
+    ).rowcount
+    db.execute(
+        delete(TransactionRawData).where(TransactionRawData.transaction_id.in_(batch_transaction_ids))
+    )
+    count = db.query(Transaction).filter(
+        Transaction.upload_batch_id == batch_id
+    ).delete(synchronize_session=False)
+    return count, unlinked_count
+
+
+def discard_upload(db: Session, batch_id: str):
+    """Roll back a failed upload and delete the chunks it already committed.
+
+    Streaming uploads commit every chunk before their UploadBatch row is recorded, so
+    without this a failure part way through would leave rows no batch points to.
+    """
+    db.rollback()
+    delete_batch_transactions(db, batch_id)
+    db.commit()
+
+
+def already_uploaded_summary(batch: UploadBatch, file_name: Optional[str] = None) -> dict:
+    """Upload summary for a re-upload of an earlier batch's file: nothing is parsed or written"""
+    return {
+        'upload_batch_id': batch.id,
+        'upload_type': batch.upload_type,
+        'file_name': file_name,
+        'created_count': 0,
+        'skipped_count': (batch.created_count or 0) + (batch.skipped_count or 0),
+        'error_count': 0,
+        'errors': [],
+        'already_uploaded': True,
+    }
+
+
+def dedup_key(record: dict) -> tuple:
+    """Key used to detect duplicate bank transactions: date, reference and amount must match"""
+    return (record['date'], record['reference'], record['amount'])
+
+
+def fetch_existing_keys(db: Session, records: List[dict]) -> Set[tuple]:
+    """Fetch the dedup keys already stored for the dates covered by the given records.
+
+    Only the three key columns are selected, and the lookup is bounded by the
+    upload's min/max date plus an IN list on the (indexed) date column, so the
+    number of queries depends on the number of distinct dates, not rows.
+    """
+    dates = sorted({record['date'] for record in records})
+    existing = set()
+    for start in range(0, len(dates), DEDUP_DATE_CHUNK_SIZE):
+        chunk = dates[start:start + DEDUP_DATE_CHUNK_SIZE]
+        rows = db.query(
+            Transaction.date, Transaction.reference, Transaction.amount
+        ).filter(
+            Transaction.date >= chunk[0],
+            Transaction.date <= chunk[-1],
+            Transaction.date.in_(chunk)
+        ).all()
+        existing.update((row.date, row.reference, row.amount) for row in rows)
+    return existing
+
+
+def deduplicate(db: Session, records: Iterable[dict]) -> Tuple[List[dict], int]:
+    """Drop records that already exist in the database or earlier in the same upload.
+
+    Returns the records to insert (in input order) and the number skipped.
+    """
+    records = list(records)
+    if not records:
+        return [], 0
+
+    seen = fetch_existing_keys(db, records)
+    new_records = []
+    skipped_count = 0
+    for record in records:
+        key = dedup_key(record)
+        if key in seen:
+            skipped_count += 1
+            continue
+        seen.add(key)
+        new_records.append(record)
+    return new_records, skipped_count
+
+
+def bulk_write_transactions(db: Session, records: List[dict], batch_id: str) -> int:
+    """Insert new transaction records in bulk without returning them. Returns the row count.
+
+    Uses one executemany INSERT, or COPY FROM STDIN on PostgreSQL for large uploads.
+    INSERT ... RETURNING is avoided: SQLite can't return ids for an executemany in
+    parameter order, so SQLAlchemy would fall back to one statement per row. The ids
+    needed for the raw source data are read back afterwards instead. The records must
+    be deduplicated (see deduplicate). The caller commits.
+    """
+    if not records:
+        return 0
+
+    rows = _prepare_rows(records, batch_id)
+    with_raw_data = any(record.get('raw_data') is not None for record in records)
+    if with_raw_data:
+        # Rows inserted below get higher ids than any the batch already has
+        last_id = db.execute(
+            select(func.max(Transaction.id)).where(Transaction.upload_batch_id == batch_id)
+        ).scalar() or 0
+
+    if not (_use_copy(db, rows) and _copy_transactions(db, rows)):
+        db.execute(insert(Transaction.__table__), rows)
+
+    if with_raw_data:
+        _write_raw_data(db, batch_id, last_id, records)
+    return len(rows)
+
+
+def ingest_records(
+    db: Session,
+    records: Iterable[dict],
+    batch_id: str,
+    chunk_size: int = INGEST_CHUNK_SIZE,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    resumed_count: int = 0
+) -> Tuple[int, int]:
+    """Deduplicate and write a stream of records chunk by chunk, committing after each chunk.
+
+    Rows written by earlier chunks are visible to the dedup lookup of later
+    chunks, so duplicates across the whole file are still caught while only one
+    chunk is held in memory. on_progress(created_count, skipped_count) is called
+    after every commit. Returns (created_count, skipped_count).
+
+    If the upload fails, the caller removes the committed chunks with discard_upload.
+
+    resumed_count is the number of rows an interrupted earlier run of the same upload
+    committed under batch_id. They are found again as duplicates, but count as created.
+    """
+    created_count = resumed_count
+    skipped_count = 0
+    unclaimed_count = resumed_count
+    for chunk in _chunked(records, chunk_size):
+        new_records, skipped = deduplicate(db, chunk)
+        # The rows written before the restart come first in the file
+        resumed = min(skipped, unclaimed_count)
+        unclaimed_count -= resumed
+        created_count += bulk_write_transactions(db, new_records, batch_id)
+        skipped_count += skipped - resumed
+        db.commit()
+        if on_progress:
+            on_progress(created_count, skipped_count)
+    return created_count, skipped_count
+
+
+def ingest_csv(
+    db: Session,
+    binary_file,
+    batch_id: str,
+    mapping: Optional[dict] = None,
+    on_progress: Optional[Callable[[dict], None]] = None,
+    resumed_count: int = 0
+) -> dict:
+    """Stream a CSV export from a binary file object into the transactions table.
+
+    Returns an upload summary (the UploadSummaryResponse fields); on_progress
+    receives the running summary after every committed chunk. resumed_count is
+    passed on to ingest_records.
+    """
+    # Decode and split the file the same way the preview did; bytes past the preview
+    # that the sniffed encoding can't decode fall back to Windows-1252 / Latin-1
+    encoding, delimiter = sniff_csv(binary_file.read(PREVIEW_BYTES))
+    binary_file.seek(0)
+    text_stream = io.TextIOWrapper(binary_file, encoding=encoding, errors=LEGACY_FALLBACK_ERRORS, newline='')
+    reader = CSVRecordReader(text_stream, mapping, delimiter)
+    if not reader.header:
+        raise IngestError("CSV file has no columns or is not a valid CSV")
+
+    def summary(created_count, skipped_count):
+        return {
+            'upload_batch_id': batch_id,
+            'upload_type': "CSV",
+            'created_count': created_count,
+            'skipped_count': skipped_count,
+            'error_count': reader.error_count,
+            'errors': reader.errors,
+            'date_fallback_count': reader.date_fallback_count,
+        }
+
+    created_count, skipped_count = ingest_records(
+        db, reader, batch_id,
+        on_progress=(lambda created, skipped: on_progress(summary(created, skipped))) if on_progress else None,
+        resumed_count=resumed_count
+    )
+
+    if not created_count and not skipped_count:
+        # No transactions created and none skipped - likely a mapping issue
+        error_msg = "No transactions were imported. "
+        if reader.errors:
+            error_msg += f"Errors: {'; '.join(reader.errors[:10])}"
+        else:
+            error_msg += "Please check your column mapping or CSV format."
+        raise IngestError(error_msg)
+
+    return summary(created_count, skipped_count)
+
+
+def ingest_mt940(
+    db: Session,
+    binary_file,
+    batch_id: str,
+    on_progress: Optional[Callable[[dict], None]] = None,
+    resumed_count: int = 0
+) -> dict:
+    """Stream an MT940 statement from a binary file object into the transactions table.
+
+    Records are read tag by tag and written in committed chunks, so memory use
+    does not grow with the size of the statement. Returns an upload summary
+    (the UploadSummaryResponse fields); resumed_count is passed on to ingest_records.
+    Statement lines that can't be parsed are reported as errors.
+    """
+    reader = MT940RecordReader(io.TextIOWrapper(binary_file, encoding='utf-8', newline=''))
+
+    def summary(created_count, skipped_count):
+        return {
+            'upload_batch_id': batch_id,
+            'upload_type': "MT940",
+            'created_count': created_count,
+            'skipped_count': skipped_count,
+            'error_count': reader.error_count,
+            'errors': reader.errors,
+        }
+
+    created_count, skipped_count = ingest_records(
+        db, reader, batch_id,
+        on_progress=(lambda created, skipped: on_progress(summary(created, skipped))) if on_progress else None,
+        resumed_count=resumed_count
+    )
+
+    if not created_count and not skipped_count:
+        error_msg = "No transactions were imported. "
+        if reader.errors:
+            error_msg += f"Errors: {'; '.join(reader.errors[:10])}"
+        else:
+            error_msg += "The file contains no MT940 statement lines."
+        raise IngestError(error_msg)
+
+    return summary(created_count, skipped_count)
+
+
+def ingest_mt940_files(db: Session, files: List[Tuple[str, bytes]]) -> dict:
+    """Parse several MT940 files in parallel and write them with one deduplicating bulk write.
+
+    files is a list of (file_name, content). Each file gets its own upload batch;
+    duplicates are detected across the database and all files together, and
+    everything is committed at once. Files that fail to parse or hold no
+    transactions are reported in their own summary, do not stop the others and get
+    no upload batch (so the same bytes can be uploaded again once fixed). Files
+    byte-identical to an earlier upload are not parsed at all.
+    """
+    hashes = [hashlib.sha256(content).hexdigest() for _, content in files]
+    earlier_batches = {
+        batch.content_hash: batch
+        for batch in db.query(UploadBatch).filter(
+            UploadBatch.content_hash.in_(set(hashes)),
+            UploadBatch.upload_type == "MT940"
+        ).order_by(UploadBatch.created_at.desc())
+    }
+
+    file_summaries = []
+    to_parse = []  # (summary, content hash, file size, content) for files not uploaded before
+    for (file_name, content), content_hash in zip(files, hashes):
+        if content_hash in earlier_batches:
+            file_summaries.append(already_uploaded_summary(earlier_batches[content_hash], file_name))
+            continue
+        summary = {
+            'upload_batch_id': str(uuid.uuid4()),
+            'upload_type': "MT940",
+            'file_name': file_name,
+            'created_count': 0,
+            'skipped_count': 0,
+            'error_count': 0,
+            'errors': [],
+        }
+        file_summaries.append(summary)
+        to_parse.append((summary, content_hash, len(content), content))
+
+    results = _parse_files_in_parallel([content for _, _, _, content in to_parse])
+
+    parsed = []  # (summary, content hash, file size, records) for files with transactions
+    for (summary, content_hash, file_size, _), (records, error_count, errors) in zip(to_parse, results):
+        summary['error_count'] = error_count
+        summary['errors'] = errors
+        if records:
+            parsed.append((summary, content_hash, file_size, records))
+        elif not error_count:
+            summary['error_count'] = 1
+            summary['errors'] = ["No transactions found in MT940 file"]
+
+    # One dedup pass over all files so a transaction present in two statements is imported once
+    all_records = [
+        dict(record, upload_batch_id=summary['upload_batch_id'])
+        for summary, _, _, records in parsed for record in records
+    ]
+    new_records, _ = deduplicate(db, all_records)
+
+    new_by_batch = {}
+    for record in new_records:
+        new_by_batch.setdefault(record.pop('upload_batch_id'), []).append(record)
+    matcher = load_matcher(db)
+    for summary, content_hash, file_size, records in parsed:
+        batch_records = new_by_batch.get(summary['upload_batch_id'], [])
+        summary['created_count'] = bulk_write_transactions(db, batch_records, summary['upload_batch_id'])
+        summary['skipped_count'] = len(records) - summary['created_count']
+        summary['tagged_count'] = apply_tagging_rules(
+            db, Transaction.upload_batch_id == summary['upload_batch_id'], matcher=matcher
+        )
+        record_upload_batch(db, summary, summary['file_name'], content_hash, file_size)
+    db.commit()
+
+    return {
+        'files': file_summaries,
+        'created_count': sum(summary['created_count'] for summary in file_summaries),
+        'skipped_count': sum(summary['skipped_count'] for summary in file_summaries),
+        'error_count': sum(summary['error_count'] for summary in file_summaries),
+    }
+
+
+def read_zip_members(binary_file) -> List[Tuple[str, bytes]]:
+    """Read the statement files from a ZIP archive as (file_name, content) pairs.
+
+    Directories and hidden/metadata entries are skipped; the total uncompressed
+    size and member count are capped to guard against ZIP bombs.
+    """
+    binary_file.seek(0)
+    members = []
+    total_size = 0
+    with zipfile.ZipFile(binary_file) as archive:
+        for info in archive.infolist():
+            name = os.path.basename(info.filename)
+            if info.is_dir() or not name or name.startswith('.') or info.filename.startswith('__MACOSX/'):
+                continue
+            total_size += info.file_size
+            if len(members) >= MAX_ARCHIVE_MEMBERS or total_size > MAX_ARCHIVE_BYTES:
+                raise IngestError(
+                    f"ZIP archive is too large (max {MAX_ARCHIVE_MEMBERS} files, "
+                    f"{MAX_ARCHIVE_BYTES // (1024 * 1024)} MB uncompressed)"
+                )
+            members.append((name, archive.read(info)))
+    return members
+
+
+def _parse_files_in_parallel(contents: List[bytes]) -> List[Tuple[List[dict], int, List[str]]]:
+    """Parse MT940 file contents in worker processes. Returns (records, error count, error messages) per file."""
+    if len(contents) <= 1 or PARSE_WORKERS <= 1:
+        results = []
+        for content in contents:
+            try:
+                results.append(parse_mt940_file(content))
+            except Exception as e:
+                results.append(([], 1, [f"Error parsing MT940: {e}"]))
+        return results
+
+    try:
+        futures = [_get_parse_pool().submit(parse_mt940_file, content) for content in contents]
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool once
+        _reset_parse_pool()
+        futures = [_get_parse_pool().submit(parse_mt940_file, content) for content in contents]
+
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except BrokenProcessPool:
+            _reset_parse_pool()
+            results.append(([], 1, ["Error parsing MT940: the parser process stopped unexpectedly"]))
+        except Exception as e:
+            results.append(([], 1, [f"Error parsing MT940: {e}"]))
+    return results
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    """The shared parse pool; starting worker processes costs too much to do per upload"""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            # spawn rather than fork: the server process has threads and open database connections
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=PARSE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _parse_pool
+
+
+def _reset_parse_pool():
+    """Drop a broken parse pool so the next upload starts a new one"""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown(wait=False)
+            _parse_pool = None
+
+
+def _chunked(items: Iterable, size: int) -> Iterator[list]:
+    """Split an iterable into lists of at most size items"""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _prepare_rows(records: List[dict], batch_id: str) -> List[dict]:
+    """Add the batch id and a shared creation timestamp to parsed records (without raw_data)"""
+    created_at = datetime.utcnow()
+    return [
+        {
+            **{name: value for name, value in record.items() if name != 'raw_data'},
+            'upload_batch_id': batch_id,
+            'created_at': created_at,
+        }
+        for record in records
+    ]
+
+
+def _write_raw_data(db: Session, batch_id: str, last_id: int, records: List[dict]):
+    """Store the compressed raw_data of records just inserted under batch_id.
+
+    Their ids are read back with one query over the batch's ids above last_id (its
+    highest id before the insert) and matched by dedup key, which deduplicated
+    records have unique.
+    """
+    ids = {
+        (row.date, row.reference, row.amount): row.id
+        for row in db.execute(
+            select(Transaction.id, Transaction.date, Transaction.reference, Transaction.amount)
+            .where(Transaction.upload_batch_id == batch_id, Transaction.id > last_id)
+        )
+    }
+    rows = [
+        {'transaction_id': ids[dedup_key(record)], 'data': pack_raw_data(record['raw_data'])}
+        for record in records
+        if record.get('raw_data') is not None
+    ]
+    if rows:
+        db.execute(insert(TransactionRawData.__table__), rows)
+
+
+def _use_copy(db: Session, rows: List[dict]) -> bool:
+    return db.get_bind().dialect.name == "postgresql" and len(rows) >= COPY_THRESHOLD
+
+
+def _copy_text(value) -> str:
+    """Format a value for PostgreSQL COPY text format"""
+    if value is None:
+        return '\\N'
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+def _copy_transactions(db: Session, rows: List[dict]) -> bool:
+    """Write rows with COPY on the session's connection. Returns False if the driver has no COPY support."""
+    cursor = db.connection().connection.cursor()
+    if not hasattr(cursor, 'copy_expert'):  # Only psycopg2 is supported
+        cursor.close()
+        return False
+
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_text(row[name]) for name in INSERT_COLUMNS))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    try:
+        cursor.copy_expert(
+            f"COPY transactions ({', '.join(INSERT_COLUMNS)}) FROM STDIN",
+            buffer
+        )
+    finally:
+        cursor.close()
+    # COPY bypasses the session, so its change counter isn't bumped on its own
+    touch_tables(db, Transaction.__tablename__)
+    return True
@@ -0,0 +1,160 @@
+"""
+Unified ledger: bank and cash transactions in one listing.
+
+Both tables are read by a single UNION ALL query with a source discriminator column
+('bank' or 'cash') and paged by keyset on (date DESC, source DESC, id DESC), since ids
+are only unique per source. The keyset condition and the page limit are pushed into
+each branch, where the source is a constant, so a page reads at most limit + 1 rows
+from each table through its date index however deep the client has scrolled.
+"""
+from typing import Dict, List, Optional, Tuple
+from datetime import date
+import base64
+import json
+
+from fastapi import Response
+from sqlalchemy import String, and_, func, literal, null, or_, select, union_all
+from sqlalchemy.orm import Session
+
+from models import Transaction, CashTransaction, Project, transaction_projects, cash_transaction_projects
+from pagination import NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER
+
+# Source discriminator -> (model, association table, its transaction id column)
+LEDGER_SOURCES = {
+    'bank': (Transaction, transaction_projects, transaction_projects.c.transaction_id),
+    'cash': (CashTransaction, cash_transaction_projects, cash_transaction_projects.c.cash_transaction_id),
+}
+
+# Columns of a ledger row besides source; the ones a model lacks are NULL in its branch
+LEDGER_COLUMNS = (
+    'id', 'date', 'amount', 'currency', 'description', 'reference', 'account_number', 'project_id', 'created_at'
+)
+
+
+def encode_ledger_cursor(row_date: date, source: str, row_id: int) -> str:
+    """Opaque cursor pointing just after the given ledger row"""
+    payload = json.dumps([row_date.isoformat(), source, row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_ledger_cursor(cursor: str) -> Tuple[date, str, int]:
+    """Inverse of encode_ledger_cursor. Raises ValueError for malformed cursors."""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        row_date, source, row_id = json.loads(payload)
+        if source not in LEDGER_SOURCES:
+            raise ValueError(source)
+        return date.fromisoformat(row_date), source, int(row_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _after_cursor(model, source: str, cursor: Tuple[date, str, int]):
+    """(date, source, id) < cursor, for a branch whose source is the constant source"""
+    cursor_date, cursor_source, cursor_id = cursor
+    if source < cursor_source:
+        # Same-day rows of this source all come after the cursor's
+        return model.date <= cursor_date
+    if source > cursor_source:
+        return model.date < cursor_date
+    return or_(model.date < cursor_date, and_(model.date == cursor_date, model.id < cursor_id))
+
+
+def _branch(
+    source: str,
+    project_id: Optional[int],
+    start_date: Optional[date],
+    end_date: Optional[date]
+):
+    """SELECT of one source's rows as ledger columns, with the listing filters applied"""
+    model, association, transaction_column = LEDGER_SOURCES[source]
+    columns = [literal(source, String).label('source')] + [
+        getattr(model, name).label(name) if hasattr(model, name) else null().label(name)
+        for name in LEDGER_COLUMNS
+    ]
+    query = select(*columns).select_from(model)
+    if project_id:
+        query = query.join(association, transaction_column == model.id).where(association.c.project_id == project_id)
+    if start_date:
+        query = query.where(model.date >= start_date)
+    if end_date:
+        query = query.where(model.date <= end_date)
+    return query
+
+
+def ledger_page(
+    db: Session,
+    response: Response,
+    project_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = True
+) -> List:
+    """Ledger rows (source, then LEDGER_COLUMNS) newest first, from one UNION ALL query.
+
+    Pagination works like pagination.paginate: without limit every matching row is
+    returned; the next cursor and the total count are set as response headers, and
+    include_total=False skips the COUNT query. Without limit no COUNT query is run:
+    the total is the number of rows returned.
+    """
+    key = decode_ledger_cursor(cursor) if cursor else None
+    branches = {source: _branch(source, project_id, start_date, end_date) for source in LEDGER_SOURCES}
+
+    if include_total and limit is not None:
+        counted = union_all(*branches.values()).subquery()
+        response.headers[TOTAL_COUNT_HEADER] = str(db.execute(select(func.count()).select_from(counted)).scalar())
+
+    parts = []
+    for source, branch in branches.items():
+        model = LEDGER_SOURCES[source][0]
+        if key:
+            branch = branch.where(_after_cursor(model, source, key))
+        if limit is not None:
+            # No source can contribute more than a page (plus the look-ahead row)
+            branch = select(branch.order_by(model.date.desc(), model.id.desc()).limit(limit + 1).subquery())
+        parts.append(branch)
+
+    ledger = union_all(*parts).subquery()
+    query = select(ledger).order_by(ledger.c.date.desc(), ledger.c.source.desc(), ledger.c.id.desc())
+    if limit is None:
+        rows = db.execute(query).all()
+        if include_total:
+            response.headers[TOTAL_COUNT_HEADER] = str(len(rows))
+        return rows
+
+    # One extra row tells whether there is a next page
+    rows = db.execute(query.limit(limit + 1)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_ledger_cursor(rows[-1].date, rows[-1].source, rows[-1].id)
+    return rows
+
+
+def ledger_projects(db: Session, rows: List) -> Dict[Tuple[str, int], List[Project]]:
+    """Projects of the given ledger rows by (source, id), with one query for both sources.
+
+    Rows without associations fall back to their legacy project_id, like the listings.
+    """
+    ids = {source: [row.id for row in rows if row.source == source] for source in LEDGER_SOURCES}
+    project_ids: Dict[Tuple[str, int], List[int]] = {}
+    branches = [
+        select(literal(source, String).label('source'), transaction_column.label('id'), association.c.project_id)
+        .where(transaction_column.in_(ids[source]))
+        for source, (model, association, transaction_column) in LEDGER_SOURCES.items()
+        if ids[source]
+    ]
+    if branches:
+        for source, row_id, project_id in db.execute(union_all(*branches)):
+            project_ids.setdefault((source, row_id), []).append(project_id)
+    for row in rows:
+        if row.project_id and (row.source, row.id) not in project_ids:
+            project_ids[(row.source, row.id)] = [row.project_id]
+
+    wanted = {project_id for values in project_ids.values() for project_id in values}
+    projects = {project.id: project for project in db.query(Project).filter(Project.id.in_(wanted))} if wanted else {}
+    return {
+        key: [projects[project_id] for project_id in values if project_id in projects]
+        for key, values in project_ids.items()
+    }
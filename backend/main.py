@@ -1,26 +1,47 @@
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, RedirectResponse
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
-from typing import List, Optional
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import func, and_, bindparam, delete, exists, insert, or_, select, true, update
+from typing import Dict, List, Optional, Tuple
+from itertools import chain
 from datetime import datetime, date
-import mt940
 import csv
 import io
 import uuid
 import os
+import re
+import zipfile
 from pathlib import Path
 from pydantic import BaseModel
 from database import SessionLocal, engine, Base
-from models import Transaction, Project, CashTransaction
+from models import (
+    Transaction, TransactionRawData, Project, CashTransaction, IngestJob, UploadBatch, TaggingRule,
+    transaction_projects, cash_transaction_projects, tagging_rule_projects
+)
+from ingestion import (
+    ingest_csv, ingest_mt940, ingest_mt940_files, read_zip_members, hash_stream, find_upload_batch,
+    record_upload_batch, already_uploaded_summary, unpack_raw_data, delete_batch_transactions, discard_upload,
+    IngestError
+)
+from csv_import import build_csv_preview, PREVIEW_BYTES
+from ingest_jobs import create_job, resume_jobs, job_response, UPLOAD_TYPES
+from pagination import paginate, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER
+from search import ensure_search_indexes, apply_search
+from fieldsets import parse_fields, fieldset_options
+from serialization import rows_response, default_response_class
+from ledger import ledger_page, ledger_projects
+from table_versions import ensure_table_versions, not_modified
+from tagging import apply_tagging_rules, MATCH_FIELDS, MATCH_TYPES
 from schemas import (
-    TransactionCreate, TransactionResponse, TransactionUpdate,
+    TransactionCreate, TransactionResponse, TransactionUpdate, TransactionRawDataResponse,
     ProjectCreate, ProjectResponse,
     CashTransactionCreate, CashTransactionResponse, CashTransactionUpdate,
-    DashboardStats, PeriodFilter, ProjectStats,
-    CSVColumnMapping, CSVPreviewResponse, UploadBatchResponse
+    DashboardStats, PeriodFilter, ProjectStats, LedgerEntryResponse,
+    CSVColumnMapping, CSVPreviewResponse, UploadBatchResponse, UploadSummaryResponse,
+    MultiUploadSummaryResponse, IngestJobResponse, BulkTagRequest, BulkTagResponse,
+    TaggingRuleCreate, TaggingRuleResponse, TaggingRuleApplyRequest, TaggingRuleApplyResponse
 )
 from typing import Union
 from portfolio_api import router as portfolio_router
@@ -36,7 +57,19 @@ except Exception as e:
     print(f"Warning: Could not create database tables: {e}")
     print("Server will continue, but database operations may fail")
 
-app = FastAPI(title="SSRF Accounting API")
+# Change counters behind the ETags of the listing endpoints
+try:
+    ensure_table_versions(engine)
+except Exception as e:
+    print(f"Warning: Could not initialize table versions: {e}")
+
+# Full-text search indexes (FTS5 tables and triggers on SQLite, GIN indexes on PostgreSQL)
+try:
+    ensure_search_indexes(engine)
+except Exception as e:
+    print(f"Warning: Could not create search indexes: {e}")
+
+app = FastAPI(title="SSRF Accounting API", default_response_class=default_response_class())
 
 # Add startup event to log server initialization
 @app.on_event("startup")
@@ -47,6 +80,11 @@ async def startup_event():
     print(f"Working directory: {os.getcwd()}")
     print(f"Backend directory: {Path(__file__).parent}")
     print("=" * 50)
+    # Pick up ingestion jobs interrupted by a restart
+    try:
+        resume_jobs()
+    except Exception as e:
+        print(f"Warning: Could not resume ingestion jobs: {e}")
 
 # Include portfolio API router
 try:
@@ -63,6 +101,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, "ETag"],
 )
 
 # Dependency to get DB session
@@ -74,6 +113,132 @@ def get_db():
         db.close()
 
 
+# Association table and its transaction column for each model that can be tagged with projects
+PROJECT_ASSOCIATIONS = {
+    Transaction: (transaction_projects, transaction_projects.c.transaction_id),
+    CashTransaction: (cash_transaction_projects, cash_transaction_projects.c.cash_transaction_id),
+}
+
+# Tables the transaction listings read (their ETags change when any of them does)
+TRANSACTION_LISTING_TABLES = [Transaction.__tablename__, transaction_projects.name, Project.__tablename__]
+CASH_TRANSACTION_LISTING_TABLES = [CashTransaction.__tablename__, cash_transaction_projects.name, Project.__tablename__]
+LEDGER_TABLES = list(dict.fromkeys(TRANSACTION_LISTING_TABLES + CASH_TRANSACTION_LISTING_TABLES))
+
+
+def filter_by_project(query, model, project_id: int):
+    """Restrict a Transaction or CashTransaction query to rows tagged with a project.
+    
+    Joins the association table through its (project_id, transaction id) index, so the
+    filter is an index seek. Legacy project_id tags are moved into the association tables
+    by migrate_backfill_project_associations.py, and every write path sets both.
+    """
+    association, transaction_column = PROJECT_ASSOCIATIONS[model]
+    return query.join(association, transaction_column == model.id).filter(association.c.project_id == project_id)
+
+
+def listing_projects(db: Session, model, rows: list) -> Tuple[Dict[int, List[Project]], Dict[int, Project]]:
+    """Projects of listed transactions (or cash transactions), with one query for any number of rows.
+    
+    Returns (projects by transaction id, projects by project id). A transaction without
+    associations falls back to its legacy project_id, which the rows must have loaded.
+    The ids are rendered inline rather than bound one parameter each, so an unpaginated
+    listing stays within SQLite's bound-parameter limit.
+    """
+    if not rows:
+        return {}, {}
+    association, transaction_column = PROJECT_ASSOCIATIONS[model]
+    ids = bindparam('ids', [row.id for row in rows], expanding=True, literal_execute=True)
+    legacy_ids = {row.project_id for row in rows if row.project_id}
+    wanted = transaction_column.is_not(None)
+    if legacy_ids:
+        wanted = or_(wanted, Project.id.in_(legacy_ids))
+    # Every project once for the legacy tags, plus one row per association of the listed ids
+    result = db.execute(
+        select(Project, transaction_column)
+        .outerjoin(association, and_(association.c.project_id == Project.id, transaction_column.in_(ids)))
+        .where(wanted)
+        .order_by(Project.id)
+    )
+    
+    by_transaction: Dict[int, List[Project]] = {}
+    projects: Dict[int, Project] = {}
+    for project, transaction_id in result:
+        projects[project.id] = project
+        if transaction_id is not None:
+            by_transaction.setdefault(transaction_id, []).append(project)
+    for row in rows:
+        if row.id not in by_transaction and row.project_id in projects:
+            by_transaction[row.id] = [projects[row.project_id]]
+    return by_transaction, projects
+
+
+def bulk_tag(db: Session, model, tag_request: BulkTagRequest) -> BulkTagResponse:
+    """Set the projects of many transactions (or cash transactions) at once.
+    
+    The projects are checked with one query; the legacy project_id column and the
+    association table are rewritten with set-based UPDATE, INSERT ... SELECT and DELETE
+    statements over the targeted ids, committed together. Associations are added before
+    stale ones are removed, so a filter on the current project still selects the same rows.
+    A filter without criteria is rejected unless it sets all, so an empty filter can't
+    retag every transaction by accident.
+    """
+    project_ids = list(dict.fromkeys(tag_request.project_ids))
+    if project_ids:
+        found = {project_id for (project_id,) in db.query(Project.id).filter(Project.id.in_(project_ids))}
+        missing = [project_id for project_id in project_ids if project_id not in found]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Projects not found: {', '.join(map(str, missing))}")
+    
+    # Targeted ids, as a subquery
+    targets = db.query(model.id)
+    if tag_request.transaction_ids is not None:
+        targets = targets.filter(model.id.in_(tag_request.transaction_ids))
+    elif tag_request.filter is not None:
+        criteria = tag_request.filter
+        if not (criteria.project_id or criteria.start_date or criteria.end_date or criteria.q or criteria.all):
+            raise HTTPException(
+                status_code=422,
+                detail="filter has no criteria; set all to true to tag every transaction"
+            )
+        if criteria.project_id:
+            targets = filter_by_project(targets, model, criteria.project_id)
+        if criteria.start_date:
+            targets = targets.filter(model.date >= criteria.start_date)
+        if criteria.end_date:
+            targets = targets.filter(model.date <= criteria.end_date)
+        if criteria.q:
+            targets, _ = apply_search(targets, model, criteria.q, db.get_bind().dialect.name)
+    else:
+        raise HTTPException(status_code=422, detail="Either transaction_ids or filter is required")
+    target_ids = select(targets.subquery().c.id)
+    
+    association, transaction_column = PROJECT_ASSOCIATIONS[model]
+    # Keep project_id for backward compatibility (only set for a single project)
+    result = db.execute(
+        update(model)
+        .where(model.id.in_(target_ids))
+        .values(project_id=project_ids[0] if len(project_ids) == 1 else None)
+        .execution_options(synchronize_session=False)
+    )
+    if project_ids:
+        already_tagged = select(association.c.project_id).where(
+            transaction_column == model.id, association.c.project_id == Project.id
+        ).exists()
+        db.execute(insert(association).from_select(
+            [transaction_column.name, 'project_id'],
+            # Every targeted id with every project, so the cross join is explicit
+            select(model.id, Project.id).select_from(model).join(Project, true()).where(
+                model.id.in_(target_ids), Project.id.in_(project_ids), ~already_tagged
+            )
+        ))
+    stale = delete(association).where(transaction_column.in_(target_ids))
+    if project_ids:
+        stale = stale.where(association.c.project_id.not_in(project_ids))
+    db.execute(stale)
+    db.commit()
+    return BulkTagResponse(updated_count=result.rowcount, project_ids=project_ids)
+
+
 @app.get("/api/health")
 def health_check():
     """Health check endpoint - doesn't require database or static files"""
@@ -171,146 +336,70 @@ def simple_health_check():
     return {"status": "ok", "service": "SSRF Accounting API"}
 
 
-@app.post("/api/upload-mt940", response_model=List[TransactionResponse])
-async def upload_mt940(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    """Upload and parse MT940 statement file"""
+@app.post("/api/upload-mt940", response_model=UploadSummaryResponse)
+def upload_mt940(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    """Upload and parse MT940 statement file. Deduplicates based on date, reference, and amount.
+    
+    The statement is read tag by tag from the uploaded (spooled) file and written in chunks
+    of INGEST_CHUNK_SIZE transactions, so memory use does not grow with the statement size.
+    A byte-identical re-upload returns the earlier batch without parsing the file.
+    If the upload fails, the chunks already committed are deleted again. A plain (not
+    async) endpoint, so the parse and the writes run on the threadpool, not the event loop.
+    """
+    # Generate unique batch ID for this upload
+    batch_id = str(uuid.uuid4())
     try:
-        # Generate unique batch ID for this upload
-        batch_id = str(uuid.uuid4())
-        
-        content = await file.read()
-        content_str = content.decode('utf-8')
-        transactions_data = mt940.parse(content_str)
+        content_hash, file_size = hash_stream(file.file)
+        earlier_batch = find_upload_batch(db, content_hash, "MT940")
+        if earlier_batch:
+            return UploadSummaryResponse(**already_uploaded_summary(earlier_batch, file.filename))
+        file.file.seek(0)
         
-        created_transactions = []
+        summary = ingest_mt940(db, file.file, batch_id)
+        summary['tagged_count'] = apply_tagging_rules(db, Transaction.upload_batch_id == batch_id)
+        record_upload_batch(db, summary, file.filename, content_hash, file_size)
+        db.commit()
         
-        # MT940 parser returns a dict with account numbers as keys
-        if isinstance(transactions_data, dict):
-            for account_number, account in transactions_data.items():
-                statement_number = getattr(account, 'statement_number', '') if hasattr(account, 'statement_number') else ''
-                
-                # Get transactions from the account
-                transactions = getattr(account, 'transactions', [])
-                
-                for transaction in transactions:
-                    # Extract transaction details
-                    trans_date = None
-                    amount = 0.0
-                    currency = 'EUR'
-                    reference = ''
-                    description = ''
-                    
-                    # Get date
-                    if hasattr(transaction, 'date'):
-                        trans_date_obj = transaction.date
-                        if hasattr(trans_date_obj, 'date'):
-                            trans_date = trans_date_obj.date()
-                        elif isinstance(trans_date_obj, date):
-                            trans_date = trans_date_obj
-                    
-                    # Get amount
-                    if hasattr(transaction, 'amount'):
-                        amount_obj = transaction.amount
-                        if hasattr(amount_obj, 'amount'):
-                            amount = float(amount_obj.amount)
-                        elif isinstance(amount_obj, (int, float)):
-                            amount = float(amount_obj)
-                        
-                        if hasattr(amount_obj, 'currency'):
-                            currency = amount_obj.currency
-                    
-                    # Get reference
-                    if hasattr(transaction, 'transaction_reference'):
-                        reference = str(transaction.transaction_reference)
-                    elif hasattr(transaction, 'reference'):
-                        reference = str(transaction.reference)
-                    
-                    # Get description/details
-                    if hasattr(transaction, 'transaction_details'):
-                        description = str(transaction.transaction_details)
-                    elif hasattr(transaction, 'details'):
-                        description = str(transaction.details)
-                    elif hasattr(transaction, 'description'):
-                        description = str(transaction.description)
-                    
-                    if trans_date:
-                        # Check for duplicate: date, reference, and amount must match
-                        existing = db.query(Transaction).filter(
-                            Transaction.date == trans_date,
-                            Transaction.reference == reference,
-                            Transaction.amount == amount
-                        ).first()
-                        
-                        if not existing:
-                            db_transaction = Transaction(
-                                date=trans_date,
-                                amount=amount,
-                                currency=currency,
-                                reference=reference,
-                                description=description,
-                                account_number=str(account_number) if account_number else '',
-                                statement_number=str(statement_number) if statement_number else '',
-                                raw_data=str(transaction.__dict__ if hasattr(transaction, '__dict__') else transaction),
-                                upload_batch_id=batch_id
-                            )
-                            db.add(db_transaction)
-                            created_transactions.append(db_transaction)
-        else:
-            # Fallback: try to iterate directly
-            for account in transactions_data:
-                account_number = getattr(account, 'account', '') if hasattr(account, 'account') else ''
-                statement_number = getattr(account, 'statement_number', '') if hasattr(account, 'statement_number') else ''
-                transactions = getattr(account, 'transactions', [account])
-                
-                for transaction in transactions:
-                    trans_date = getattr(transaction, 'date', None)
-                    if trans_date and hasattr(trans_date, 'date'):
-                        trans_date = trans_date.date()
-                    
-                    amount = 0.0
-                    if hasattr(transaction, 'amount'):
-                        amt = transaction.amount
-                        amount = float(getattr(amt, 'amount', amt) if hasattr(amt, 'amount') else amt)
-                    
-                    currency = 'EUR'
-                    if hasattr(transaction, 'amount') and hasattr(transaction.amount, 'currency'):
-                        currency = transaction.amount.currency
-                    
-                    reference = getattr(transaction, 'transaction_reference', '') or getattr(transaction, 'reference', '')
-                    description = getattr(transaction, 'transaction_details', '') or getattr(transaction, 'details', '') or getattr(transaction, 'description', '')
-                    
-                    if trans_date:
-                        # Check for duplicate: date, reference, and amount must match
-                        existing = db.query(Transaction).filter(
-                            Transaction.date == trans_date,
-                            Transaction.reference == str(reference),
-                            Transaction.amount == amount
-                        ).first()
-                        
-                        if not existing:
-                            db_transaction = Transaction(
-                                date=trans_date,
-                                amount=amount,
-                                currency=currency,
-                                reference=str(reference),
-                                description=str(description),
-                                account_number=str(account_number),
-                                statement_number=str(statement_number),
-                                raw_data=str(transaction.__dict__ if hasattr(transaction, '__dict__') else transaction),
-                                upload_batch_id=batch_id
-                            )
-                            db.add(db_transaction)
-                            created_transactions.append(db_transaction)
+        return UploadSummaryResponse(**summary, file_name=file.filename)
+    except IngestError as e:
+        discard_upload(db, batch_id)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        discard_upload(db, batch_id)
+        import traceback
+        raise HTTPException(status_code=400, detail=f"Error parsing MT940: {str(e)}\n{traceback.format_exc()}")
+
+
+@app.post("/api/upload-mt940-batch", response_model=MultiUploadSummaryResponse)
+def upload_mt940_batch(files: List[UploadFile] = File(...), db: Session = Depends(get_db)):
+    """Upload several MT940 statement files, or ZIP archives of them, in one request.
+    
+    Files are parsed in parallel worker processes and written with one deduplicating
+    bulk write; every source file gets its own upload batch. A plain (not async)
+    endpoint, so waiting for the parse runs on the threadpool instead of the event loop.
+    """
+    try:
+        statement_files = []
+        for file in files:
+            if zipfile.is_zipfile(file.file):
+                statement_files.extend(read_zip_members(file.file))
+            else:
+                file.file.seek(0)
+                statement_files.append((file.filename, file.file.read()))
         
-        db.commit()
-        for transaction in created_transactions:
-            db.refresh(transaction)
+        if not statement_files:
+            raise HTTPException(status_code=400, detail="No MT940 files found in the upload")
         
-        return [TransactionResponse.model_validate(t) for t in created_transactions]
+        summary = ingest_mt940_files(db, statement_files)
+        return MultiUploadSummaryResponse(**summary)
+    except IngestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         import traceback
-        raise HTTPException(status_code=400, detail=f"Error parsing MT940: {str(e)}\n{traceback.format_exc()}")
+        raise HTTPException(status_code=400, detail=f"Error processing MT940 files: {str(e)}\n{traceback.format_exc()}")
 
 
 @app.get("/api/preview-csv/test")
@@ -320,32 +409,39 @@ def test_preview_endpoint():
 
 
 @app.post("/api/preview-csv", response_model=CSVPreviewResponse)
-async def preview_csv(file: UploadFile = File(...)):
-    """Preview CSV file to detect columns and show sample rows"""
+async def preview_csv(
+    file: UploadFile = File(...),
+    column_mapping: Optional[str] = Form(None),
+    file_size: Optional[int] = Form(None)
+):
+    """Preview CSV file to detect columns and show sample rows.
+    
+    Only the first PREVIEW_BYTES of the file are read: the encoding and delimiter are sniffed
+    from them, and the estimated row count and number/date formats are based on them. Clients
+    may upload just the beginning of the file and pass the full file_size for the row estimate.
+    
+    Also returns the column each field resolves to (explicit column_mapping first, then
+    auto-detection), which is the plan upload-csv will apply to every row.
+    """
     try:
-        content = await file.read()
-        content_str = content.decode('utf-8')
+        mapping = {}
+        if column_mapping:
+            import json
+            mapping = json.loads(column_mapping)
         
-        # Handle different encodings
-        if not content_str:
+        prefix = await file.read(PREVIEW_BYTES)
+        if not prefix:
             raise HTTPException(status_code=400, detail="CSV file appears to be empty")
         
-        csv_reader = csv.DictReader(io.StringIO(content_str))
+        if file_size is None:
+            file.file.seek(0, os.SEEK_END)
+            file_size = file.file.tell()
         
-        # Get column names
-        columns = csv_reader.fieldnames or []
-        
-        if not columns:
+        preview = build_csv_preview(prefix, file_size, mapping)
+        if not preview['columns']:
             raise HTTPException(status_code=400, detail="CSV file has no columns or is not a valid CSV")
         
-        # Get first 5 rows as samples
-        sample_rows = []
-        for i, row in enumerate(csv_reader):
-            if i >= 5:
-                break
-            sample_rows.append(dict(row))
-        
-        return CSVPreviewResponse(columns=list(columns), sample_rows=sample_rows)
+        return CSVPreviewResponse(**preview)
     except HTTPException:
         raise
     except Exception as e:
@@ -353,8 +449,8 @@ async def preview_csv(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail=f"Error reading CSV: {str(e)}\n{traceback.format_exc()}")
 
 
-@app.post("/api/upload-csv", response_model=List[TransactionResponse])
-async def upload_csv(
+@app.post("/api/upload-csv", response_model=UploadSummaryResponse)
+def upload_csv(
     file: UploadFile = File(...),
     column_mapping: Optional[str] = Form(None),
     db: Session = Depends(get_db)
@@ -362,10 +458,21 @@ async def upload_csv(
     """Upload and parse CSV file with bank transactions. Deduplicates based on date, reference, and amount.
     
     column_mapping: JSON string with mapping like {"date": "Transaction Date", "amount": "Amount", ...}
+    
+    The file is decoded and parsed as a stream and written in chunks of INGEST_CHUNK_SIZE rows
+    (each chunk is committed), so memory use does not grow with the file size.
+    A byte-identical re-upload returns the earlier batch without parsing the file.
+    If the upload fails, the chunks already committed are deleted again. A plain (not
+    async) endpoint, so the parse and the writes run on the threadpool, not the event loop.
     """
+    # Generate unique batch ID for this upload
+    batch_id = str(uuid.uuid4())
     try:
-        # Generate unique batch ID for this upload
-        batch_id = str(uuid.uuid4())
+        content_hash, file_size = hash_stream(file.file)
+        earlier_batch = find_upload_batch(db, content_hash, "CSV")
+        if earlier_batch:
+            return UploadSummaryResponse(**already_uploaded_summary(earlier_batch, file.filename))
+        file.file.seek(0)
         
         # Parse column mapping if provided
         mapping = {}
@@ -373,273 +480,134 @@ async def upload_csv(
             import json
             mapping = json.loads(column_mapping)
         
-        content = await file.read()
-        content_str = content.decode('utf-8')
-        csv_reader = csv.DictReader(io.StringIO(content_str))
-        
-        created_transactions = []
-        skipped_count = 0
-        error_rows = []
-        
-        # Helper function to get value from row using mapping or auto-detect
-        def get_value(row, field_name, default_alternatives=None):
-            # First try explicit mapping
-            if field_name in mapping and mapping[field_name]:
-                mapped_col = mapping[field_name]
-                if mapped_col in row:
-                    return row[mapped_col]
-            
-            # Then try default alternatives
-            if default_alternatives:
-                for alt in default_alternatives:
-                    if alt in row and row[alt]:
-                        return row[alt]
-            
-            # Try case-insensitive match
-            field_lower = field_name.lower()
-            for key in row.keys():
-                if key.lower() == field_lower:
-                    return row[key]
-            
-            return None
-        
-        for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 (row 1 is header)
-            try:
-                # Parse date
-                trans_date = None
-                date_str = get_value(row, 'date', ['Date', 'DATE', 'transaction_date', 'Transaction Date', 'Date/Time'])
-                if date_str:
-                    from dateutil import parser
-                    try:
-                        trans_date = parser.parse(str(date_str)).date()
-                    except:
-                        # Try specific formats
-                        for fmt in ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%Y/%m/%d', '%d-%m-%Y', '%m-%d-%Y', '%d.%m.%Y', '%m.%d.%Y']:
-                            try:
-                                trans_date = datetime.strptime(str(date_str).strip(), fmt).date()
-                                break
-                            except:
-                                continue
-                
-                if not trans_date:
-                    error_rows.append(f"Row {row_num}: Could not parse date from '{date_str}'")
-                    continue
-                
-                # Parse amount - check for transaction type column (Debit/Credit text) or separate debit/credit columns
-                transaction_type_str = get_value(row, 'transaction_type', ['Transaction Type', 'Type', 'TYPE', 'Debit or Credit', 'Debit/Credit', 'D/C', 'DC'])
-                debit_str = get_value(row, 'debit', ['Debit', 'DEBIT', 'Debit Amount', 'Debit Amount (EUR)'])
-                credit_str = get_value(row, 'credit', ['Credit', 'CREDIT', 'Credit Amount', 'Credit Amount (EUR)'])
-                amount_str = get_value(row, 'amount', ['Amount', 'AMOUNT', 'transaction_amount', 'Transaction Amount', 'Value'])
-                
-                # Helper function to parse European number formats
-                def parse_european_number(num_str):
-                    """Parse number that may use comma as decimal separator (Dutch/German format)"""
-                    if not num_str or str(num_str).strip() == '':
-                        return None
-                    num_str = str(num_str).strip()
-                    
-                    # Handle negative amounts in parentheses: (1.234,56) -> -1234.56
-                    is_negative = False
-                    if num_str.startswith('(') and num_str.endswith(')'):
-                        is_negative = True
-                        num_str = num_str[1:-1].strip()
-                    elif num_str.startswith('-'):
-                        is_negative = True
-                        num_str = num_str[1:].strip()
-                    
-                    # Count commas and dots to determine format
-                    comma_count = num_str.count(',')
-                    dot_count = num_str.count('.')
-                    
-                    # Dutch/German format: comma as decimal, dot as thousands separator
-                    # Examples: "1.234,56" or "1,50" or "1234,56"
-                    if comma_count == 1 and dot_count >= 0:
-                        # Remove thousands separators (dots) and replace comma with dot
-                        num_str = num_str.replace('.', '').replace(',', '.')
-                    # US format: dot as decimal, comma as thousands separator
-                    # Examples: "1,234.56" or "1.50"
-                    elif dot_count == 1 and comma_count >= 0:
-                        # Remove thousands separators (commas)
-                        num_str = num_str.replace(',', '')
-                    # No decimal separator, just remove thousands separators
-                    elif comma_count > 1 or dot_count > 1:
-                        # Multiple separators - assume last comma is decimal if more commas than dots
-                        if comma_count > dot_count:
-                            # Last comma is decimal
-                            last_comma = num_str.rfind(',')
-                            num_str = num_str[:last_comma].replace(',', '').replace('.', '') + '.' + num_str[last_comma+1:].replace(',', '').replace('.', '')
-                        else:
-                            # Last dot is decimal
-                            last_dot = num_str.rfind('.')
-                            num_str = num_str[:last_dot].replace(',', '').replace('.', '') + '.' + num_str[last_dot+1:].replace(',', '').replace('.', '')
-                    # Single comma, no dots - treat as decimal separator (Dutch format)
-                    elif comma_count == 1:
-                        num_str = num_str.replace(',', '.')
-                    # Single dot, no commas - already in US format, just remove any remaining commas
-                    elif dot_count == 1:
-                        num_str = num_str.replace(',', '')
-                    # No separators or ambiguous - try removing all and see if it's an integer
-                    else:
-                        # Try as integer (no decimal part)
-                        num_str = num_str.replace(',', '').replace('.', '')
-                    
-                    result = float(num_str)
-                    return -result if is_negative else result
-                
-                # Determine amount based on transaction type, separate debit/credit columns, or amount column
-                amount = None
-                
-                # First, check if we have a transaction type column (Debit/Credit text indicator)
-                if transaction_type_str and amount_str:
-                    transaction_type = str(transaction_type_str).strip().upper()
-                    try:
-                        base_amount = parse_european_number(amount_str)
-                        if base_amount is not None:
-                            # Apply sign based on transaction type
-                            if 'DEBIT' in transaction_type:
-                                amount = -abs(base_amount)  # Debit = negative
-                            elif 'CREDIT' in transaction_type:
-                                amount = abs(base_amount)  # Credit = positive
-                            else:
-                                # Unknown type, use amount as-is
-                                amount = base_amount
-                    except Exception as e:
-                        error_rows.append(f"Row {row_num}: Could not parse amount '{amount_str}' with type '{transaction_type_str}': {str(e)}")
-                
-                # If transaction type approach didn't work, try separate debit/credit columns
-                if amount is None:
-                    if debit_str and str(debit_str).strip():
-                        # Debit should be negative
-                        try:
-                            debit_amount = parse_european_number(debit_str)
-                            if debit_amount is not None:
-                                amount = -abs(debit_amount)  # Ensure negative
-                        except Exception as e:
-                            # If debit parsing fails, try credit instead
-                            pass
-                    
-                    if amount is None and credit_str and str(credit_str).strip():
-                        # Credit should be positive
-                        try:
-                            credit_amount = parse_european_number(credit_str)
-                            if credit_amount is not None:
-                                amount = abs(credit_amount)  # Ensure positive
-                        except Exception as e:
-                            # Will fall back to amount column if credit also fails
-                            pass
-                
-                # Fall back to amount column if transaction type or debit/credit not available
-                if amount is None:
-                    if not amount_str:
-                        error_rows.append(f"Row {row_num}: No amount, transaction type, debit, or credit column found")
-                        continue
-                    try:
-                        amount = parse_european_number(amount_str)
-                        if amount is None:
-                            error_rows.append(f"Row {row_num}: Could not parse amount '{amount_str}'")
-                            continue
-                    except Exception as e:
-                        error_rows.append(f"Row {row_num}: Could not parse amount '{amount_str}': {str(e)}")
-                        continue
-                
-                # Get other fields
-                reference = str(get_value(row, 'reference', ['Reference', 'REFERENCE', 'transaction_reference', 'Transaction Reference', 'Ref', 'ID']) or '').strip()
-                description = str(get_value(row, 'description', ['Description', 'DESCRIPTION', 'details', 'Details', 'transaction_details', 'Memo', 'Narrative']) or '').strip()
-                currency = str(get_value(row, 'currency', ['Currency', 'CURRENCY', 'Curr']) or 'EUR').strip()[:3] or 'EUR'
-                account_number = str(get_value(row, 'account_number', ['Account Number', 'Account', 'account', 'Account No']) or '').strip()
-                statement_number = str(get_value(row, 'statement_number', ['Statement Number', 'Statement', 'statement']) or '').strip()
-                
-                # Check for duplicate: date, reference, and amount must match
-                existing = db.query(Transaction).filter(
-                    Transaction.date == trans_date,
-                    Transaction.reference == reference,
-                    Transaction.amount == amount
-                ).first()
-                
-                if existing:
-                    skipped_count += 1
-                    continue
-                
-                # Create new transaction
-                db_transaction = Transaction(
-                    date=trans_date,
-                    amount=amount,
-                    currency=currency,
-                    reference=reference,
-                    description=description,
-                    account_number=account_number,
-                    statement_number=statement_number,
-                    raw_data=str(row),
-                    upload_batch_id=batch_id
-                )
-                db.add(db_transaction)
-                created_transactions.append(db_transaction)
-                
-            except Exception as e:
-                error_rows.append(f"Row {row_num}: {str(e)}")
-                continue
-        
-        if not created_transactions and not skipped_count:
-            # No transactions created and none skipped - likely a mapping issue
-            error_msg = "No transactions were imported. "
-            if error_rows:
-                error_msg += f"Errors: {'; '.join(error_rows[:10])}"
-            else:
-                error_msg += "Please check your column mapping or CSV format."
-            raise HTTPException(status_code=400, detail=error_msg)
-        
+        # The file is decoded incrementally from the uploaded (spooled) file
+        summary = ingest_csv(db, file.file, batch_id, mapping)
+        summary['tagged_count'] = apply_tagging_rules(db, Transaction.upload_batch_id == batch_id)
+        record_upload_batch(db, summary, file.filename, content_hash, file_size)
         db.commit()
-        for transaction in created_transactions:
-            db.refresh(transaction)
         
-        return [TransactionResponse.model_validate(t) for t in created_transactions]
+        return UploadSummaryResponse(**summary, file_name=file.filename)
+    except IngestError as e:
+        discard_upload(db, batch_id)
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
+        discard_upload(db, batch_id)
         raise
     except Exception as e:
-        db.rollback()
+        discard_upload(db, batch_id)
         import traceback
         raise HTTPException(status_code=400, detail=f"Error parsing CSV: {str(e)}\n{traceback.format_exc()}")
 
 
+@app.post("/api/ingest-jobs", response_model=IngestJobResponse, status_code=202)
+def create_ingest_job(
+    file: UploadFile = File(...),
+    upload_type: str = Form(...),
+    column_mapping: Optional[str] = Form(None),
+    db: Session = Depends(get_db)
+):
+    """Queue an MT940 or CSV upload for background processing and return the job right away.
+    
+    upload_type: "MT940" or "CSV"
+    column_mapping: JSON string with the CSV column mapping (same as upload-csv)
+    
+    A plain (not async) endpoint: the file is hashed and spooled to disk on the
+    threadpool, so a large upload doesn't block the event loop.
+    """
+    upload_type = upload_type.upper()
+    if upload_type not in UPLOAD_TYPES:
+        raise HTTPException(status_code=400, detail=f"upload_type must be one of {', '.join(UPLOAD_TYPES)}")
+    if column_mapping:
+        import json
+        try:
+            json.loads(column_mapping)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="column_mapping is not valid JSON")
+    
+    job = create_job(db, file, upload_type, column_mapping)
+    return job_response(job)
+
+
+@app.get("/api/ingest-jobs/{job_id}", response_model=IngestJobResponse)
+def get_ingest_job(job_id: str, db: Session = Depends(get_db)):
+    """Get the state and progress of an ingestion job"""
+    job = db.query(IngestJob).filter(IngestJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return job_response(job)
+
+
 @app.get("/api/transactions", response_model=List[TransactionResponse])
 def get_transactions(
+    request: Request,
+    response: Response,
     project_id: Optional[int] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    q: Optional[str] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Get all transactions with optional filters"""
+    """Get all transactions with optional filters, newest first.
+    
+    With limit, one page is returned; the X-Next-Cursor response header holds the cursor
+    for the next page (absent on the last page). X-Total-Count holds the number of
+    matching rows unless include_total=false, which skips the COUNT query.
+    With q, only rows whose words start with every search term are returned, best match first.
+    With fields (comma-separated response field names), only those fields are loaded and returned.
+    Answers If-None-Match with 304 while none of the tables read have changed.
+    """
+    try:
+        fieldset = parse_fields(fields, TransactionResponse)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    cached = not_modified(db, request, response, TRANSACTION_LISTING_TABLES)
+    if cached:
+        return cached
+    
     query = db.query(Transaction)
     
     if project_id:
-        # Filter by project (either in project_id or in projects relationship)
-        query = query.filter(
-            (Transaction.project_id == project_id) |
-            (Transaction.projects.any(Project.id == project_id))
-        )
+        query = filter_by_project(query, Transaction, project_id)
     if start_date:
         query = query.filter(Transaction.date >= start_date)
     if end_date:
         query = query.filter(Transaction.date <= end_date)
+    ranking = None
+    if q:
+        query, ranking = apply_search(query, Transaction, q, db.get_bind().dialect.name)
     
-    # Eagerly load projects relationship
-    transactions = query.options(joinedload(Transaction.projects)).order_by(Transaction.date.desc()).all()
-    
-    # Build responses with all projects
-    result = []
-    for t in transactions:
-        response = TransactionResponse.model_validate(t)
-        # Load projects from the many-to-many relationship
-        response.projects = [ProjectResponse.model_validate(p) for p in t.projects] if t.projects else []
-        # Keep backward compatibility - set project and project_id from first project or old project_id
-        if not response.projects and t.project_id:
-            # If no projects in many-to-many but project_id exists, get that project
-            project = db.query(Project).filter(Project.id == t.project_id).first()
-            if project:
-                response.projects = [ProjectResponse.model_validate(project)]
-        result.append(response)
+    # Projects are read afterwards by listing_projects, in one query for the whole page
+    # (selectinload would issue one per 500 rows and relationship), so the query count
+    # doesn't grow with the page
+    options = []
+    if fieldset:
+        # date is the pagination key
+        options = fieldset_options(Transaction, fieldset, {
+            'projects': ([], ['project_id']),
+            'project': ([], ['project_id']),
+        }, required=['id', 'date'])
+    try:
+        transactions = paginate(
+            query.options(*options), Transaction, response,
+            limit=limit, cursor=cursor, include_total=include_total, ranking=ranking
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return result
+    project_map, projects = {}, {}
+    if not fieldset or 'projects' in fieldset or 'project' in fieldset:
+        project_map, projects = listing_projects(db, Transaction, transactions)
+    
+    # Validated and encoded in one pass; projects falls back to the legacy project_id
+    return rows_response(transactions, TransactionResponse, response, fields=fieldset, computed={
+        'projects': lambda t: project_map.get(t.id, []),
+        'project': lambda t: projects.get(t.project_id)
+    })
 
 
 @app.get("/api/transactions/{transaction_id}", response_model=TransactionResponse)
@@ -651,6 +619,19 @@ def get_transaction(transaction_id: int, db: Session = Depends(get_db)):
     return TransactionResponse.model_validate(transaction)
 
 
+@app.get("/api/transactions/{transaction_id}/raw", response_model=TransactionRawDataResponse)
+def get_transaction_raw_data(transaction_id: int, db: Session = Depends(get_db)):
+    """Get the source data a transaction was imported from (CSV row or MT940 fields)"""
+    if not db.query(Transaction.id).filter(Transaction.id == transaction_id).first():
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    
+    raw = db.query(TransactionRawData.data).filter(TransactionRawData.transaction_id == transaction_id).first()
+    return TransactionRawDataResponse(
+        transaction_id=transaction_id,
+        raw_data=unpack_raw_data(raw.data) if raw else None
+    )
+
+
 @app.patch("/api/transactions/{transaction_id}", response_model=TransactionResponse)
 def update_transaction(
     transaction_id: int,
@@ -710,6 +691,12 @@ def update_transaction(
     return response
 
 
+@app.post("/api/transactions/bulk-tag", response_model=BulkTagResponse)
+def bulk_tag_transactions(tag_request: BulkTagRequest, db: Session = Depends(get_db)):
+    """Tag many transactions (by id or by listing filter) with the same projects in one commit"""
+    return bulk_tag(db, Transaction, tag_request)
+
+
 @app.delete("/api/transactions/{transaction_id}")
 def delete_transaction(transaction_id: int, db: Session = Depends(get_db)):
     """Delete a transaction - Bank transactions cannot be deleted"""
@@ -718,66 +705,96 @@ def delete_transaction(transaction_id: int, db: Session = Depends(get_db)):
 
 @app.get("/api/upload-batches", response_model=List[UploadBatchResponse])
 def get_upload_batches(db: Session = Depends(get_db)):
-    """Get all upload batches with transaction counts"""
-    # Get distinct batch IDs with their metadata
-    batches_query = db.query(
+    """Get all upload batches with transaction counts.
+    
+    Transactions whose batch has no upload_batches row (an upload interrupted by a server
+    restart, or one still being processed) are listed as well, so they can be found and deleted.
+    """
+    batches = db.query(UploadBatch).order_by(UploadBatch.created_at.desc()).all()
+    
+    orphaned_batches = db.query(
         Transaction.upload_batch_id,
         func.min(Transaction.created_at).label('created_at'),
         func.count(Transaction.id).label('transaction_count'),
         func.min(Transaction.account_number).label('account_number'),
         func.min(Transaction.statement_number).label('statement_number')
     ).filter(
-        Transaction.upload_batch_id.isnot(None)
+        Transaction.upload_batch_id.isnot(None),
+        ~exists().where(UploadBatch.id == Transaction.upload_batch_id)
     ).group_by(
         Transaction.upload_batch_id
-    ).order_by(
-        func.min(Transaction.created_at).desc()
     ).all()
     
-    batches = []
-    for batch in batches_query:
-        # Determine upload type based on statement_number presence (MT940 usually has it)
-        upload_type = "MT940" if batch.statement_number else "CSV"
-        
-        batches.append(UploadBatchResponse(
+    result = [
+        UploadBatchResponse(
+            upload_batch_id=batch.id,
+            upload_type=batch.upload_type,
+            transaction_count=batch.created_count or 0,
+            created_at=batch.created_at,
+            account_number=batch.account_number,
+            statement_number=batch.statement_number,
+            file_name=batch.file_name,
+            file_size=batch.file_size,
+            skipped_count=batch.skipped_count or 0,
+            error_count=batch.error_count or 0
+        )
+        for batch in batches
+    ]
+    result.extend(
+        UploadBatchResponse(
             upload_batch_id=batch.upload_batch_id,
-            upload_type=upload_type,
+            # MT940 statements carry a statement number, CSV exports usually don't
+            upload_type="MT940" if batch.statement_number else "CSV",
             transaction_count=batch.transaction_count,
             created_at=batch.created_at,
             account_number=batch.account_number,
             statement_number=batch.statement_number
-        ))
-    
-    return batches
+        )
+        for batch in orphaned_batches
+    )
+    result.sort(key=lambda batch: batch.created_at, reverse=True)
+    return result
 
 
 @app.delete("/api/upload-batches/{batch_id}")
 def delete_upload_batch(batch_id: str, db: Session = Depends(get_db)):
-    """Delete all transactions from a specific upload batch"""
-    transactions = db.query(Transaction).filter(
-        Transaction.upload_batch_id == batch_id
-    ).all()
+    """Delete all transactions from a specific upload batch.
     
-    if not transactions:
-        raise HTTPException(status_code=404, detail="Upload batch not found")
+    Runs as set-based DELETE statements in one database transaction (project links, raw
+    source data, transactions, then the batch itself) without loading any rows.
+    """
+    count, unlinked_count = delete_batch_transactions(db, batch_id)
     
-    count = len(transactions)
-    for transaction in transactions:
-        db.delete(transaction)
+    # Forget the file's hash as well, so the same file can be uploaded again
+    batch_count = db.query(UploadBatch).filter(UploadBatch.id == batch_id).delete(synchronize_session=False)
+    
+    if not count and not batch_count:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Upload batch not found")
     
     db.commit()
-    return {"message": f"Deleted {count} transactions from upload batch", "deleted_count": count}
+    return {
+        "message": f"Deleted {count} transactions from upload batch",
+        "deleted_count": count,
+        "unlinked_project_count": unlinked_count
+    }
 
 
 @app.delete("/api/transactions/all")
 def delete_all_transactions(db: Session = Depends(get_db)):
     """Delete all bank transactions"""
     try:
+        # Forget all upload batches, so their files can be uploaded again
+        db.query(UploadBatch).delete()
+        
         count = db.query(Transaction).count()
         if count == 0:
+            db.commit()
             return {"message": "No transactions to delete", "deleted_count": 0}
         
-        # Delete all transactions
+        # Delete all transactions with their project links and raw source data
+        db.execute(delete(transaction_projects))
+        db.query(TransactionRawData).delete()
         deleted_count = db.query(Transaction).delete()
         db.commit()
         
@@ -803,8 +820,11 @@ def create_project(project: ProjectCreate, db: Session = Depends(get_db)):
 
 
 @app.get("/api/projects", response_model=List[ProjectResponse])
-def get_projects(db: Session = Depends(get_db)):
-    """Get all projects"""
+def get_projects(request: Request, response: Response, db: Session = Depends(get_db)):
+    """Get all projects. Answers If-None-Match with 304 while the projects are unchanged."""
+    cached = not_modified(db, request, response, [Project.__tablename__])
+    if cached:
+        return cached
     projects = db.query(Project).order_by(Project.name).all()
     return [ProjectResponse.model_validate(p) for p in projects]
 
@@ -847,12 +867,101 @@ def delete_project(project_id: int, db: Session = Depends(get_db)):
     # Remove project tags from transactions
     db.query(Transaction).filter(Transaction.project_id == project_id).update({"project_id": None})
     db.query(CashTransaction).filter(CashTransaction.project_id == project_id).update({"project_id": None})
+    for association, _ in PROJECT_ASSOCIATIONS.values():
+        db.execute(delete(association).where(association.c.project_id == project_id))
+    db.execute(delete(tagging_rule_projects).where(tagging_rule_projects.c.project_id == project_id))
     
     db.delete(project)
     db.commit()
     return {"message": "Project deleted"}
 
 
+# Tagging rule endpoints
+def rule_projects(db: Session, rule: TaggingRuleCreate) -> List[Project]:
+    """Validate a tagging rule and load its projects (one query)"""
+    if rule.field not in MATCH_FIELDS:
+        raise HTTPException(status_code=400, detail=f"field must be one of: {', '.join(MATCH_FIELDS)}")
+    if rule.match_type not in MATCH_TYPES:
+        raise HTTPException(status_code=400, detail=f"match_type must be one of: {', '.join(MATCH_TYPES)}")
+    if not rule.pattern:
+        raise HTTPException(status_code=400, detail="pattern must not be empty")
+    if rule.match_type == "regex":
+        try:
+            re.compile(rule.pattern)
+        except re.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid regex: {e}")
+    if not rule.project_ids:
+        raise HTTPException(status_code=400, detail="At least one project is required")
+    
+    projects = db.query(Project).filter(Project.id.in_(rule.project_ids)).all()
+    missing = set(rule.project_ids) - {project.id for project in projects}
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Projects not found: {', '.join(map(str, sorted(missing)))}")
+    # Keep the requested order (the first project becomes project_id for single-project rules)
+    order = {project_id: index for index, project_id in enumerate(rule.project_ids)}
+    return sorted(projects, key=lambda project: order[project.id])
+
+
+@app.get("/api/tagging-rules", response_model=List[TaggingRuleResponse])
+def get_tagging_rules(db: Session = Depends(get_db)):
+    """Get all tagging rules, in the order they are tried"""
+    rules = (
+        db.query(TaggingRule)
+        .options(selectinload(TaggingRule.projects))
+        .order_by(TaggingRule.priority.desc(), TaggingRule.id)
+        .all()
+    )
+    return [TaggingRuleResponse.model_validate(rule) for rule in rules]
+
+
+@app.post("/api/tagging-rules", response_model=TaggingRuleResponse)
+def create_tagging_rule(rule: TaggingRuleCreate, db: Session = Depends(get_db)):
+    """Create a tagging rule. New uploads are tagged by it; use /api/tagging-rules/apply for existing transactions."""
+    projects = rule_projects(db, rule)
+    db_rule = TaggingRule(**rule.dict(exclude={"project_ids"}), projects=projects)
+    db.add(db_rule)
+    db.commit()
+    db.refresh(db_rule)
+    return TaggingRuleResponse.model_validate(db_rule)
+
+
+@app.put("/api/tagging-rules/{rule_id}", response_model=TaggingRuleResponse)
+def update_tagging_rule(rule_id: int, rule: TaggingRuleCreate, db: Session = Depends(get_db)):
+    """Update a tagging rule"""
+    db_rule = db.query(TaggingRule).filter(TaggingRule.id == rule_id).first()
+    if not db_rule:
+        raise HTTPException(status_code=404, detail="Tagging rule not found")
+    projects = rule_projects(db, rule)
+    for key, value in rule.dict(exclude={"project_ids"}).items():
+        setattr(db_rule, key, value)
+    db_rule.projects = projects
+    db.commit()
+    db.refresh(db_rule)
+    return TaggingRuleResponse.model_validate(db_rule)
+
+
+@app.delete("/api/tagging-rules/{rule_id}")
+def delete_tagging_rule(rule_id: int, db: Session = Depends(get_db)):
+    """Delete a tagging rule (transactions it tagged keep their projects)"""
+    db_rule = db.query(TaggingRule).filter(TaggingRule.id == rule_id).first()
+    if not db_rule:
+        raise HTTPException(status_code=404, detail="Tagging rule not found")
+    db.delete(db_rule)
+    db.commit()
+    return {"message": "Tagging rule deleted"}
+
+
+@app.post("/api/tagging-rules/apply", response_model=TaggingRuleApplyResponse)
+def apply_tagging_rules_endpoint(apply_request: TaggingRuleApplyRequest, db: Session = Depends(get_db)):
+    """Run the active tagging rules over existing bank transactions (untagged ones unless overwrite)"""
+    criteria = []
+    if apply_request.upload_batch_id:
+        criteria.append(Transaction.upload_batch_id == apply_request.upload_batch_id)
+    tagged_count = apply_tagging_rules(db, *criteria, overwrite=apply_request.overwrite)
+    db.commit()
+    return TaggingRuleApplyResponse(tagged_count=tagged_count)
+
+
 # Cash transaction endpoints
 @app.post("/api/cash-transactions", response_model=CashTransactionResponse)
 def create_cash_transaction(
@@ -907,43 +1016,75 @@ def create_cash_transaction(
 
 @app.get("/api/cash-transactions", response_model=List[CashTransactionResponse])
 def get_cash_transactions(
+    request: Request,
+    response: Response,
     project_id: Optional[int] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    q: Optional[str] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Get all cash transactions with optional filters"""
+    """Get all cash transactions with optional filters, newest first.
+    
+    With limit, one page is returned; the X-Next-Cursor response header holds the cursor
+    for the next page (absent on the last page). X-Total-Count holds the number of
+    matching rows unless include_total=false, which skips the COUNT query.
+    With q, only rows whose words start with every search term are returned, best match first.
+    With fields (comma-separated response field names), only those fields are loaded and returned.
+    Answers If-None-Match with 304 while none of the tables read have changed.
+    """
+    try:
+        fieldset = parse_fields(fields, CashTransactionResponse)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    cached = not_modified(db, request, response, CASH_TRANSACTION_LISTING_TABLES)
+    if cached:
+        return cached
+    
     query = db.query(CashTransaction)
     
     if project_id:
-        # Filter by project (either in project_id or in projects relationship)
-        query = query.filter(
-            (CashTransaction.project_id == project_id) |
-            (CashTransaction.projects.any(Project.id == project_id))
-        )
+        query = filter_by_project(query, CashTransaction, project_id)
     if start_date:
         query = query.filter(CashTransaction.date >= start_date)
     if end_date:
         query = query.filter(CashTransaction.date <= end_date)
+    ranking = None
+    if q:
+        query, ranking = apply_search(query, CashTransaction, q, db.get_bind().dialect.name)
     
-    # Eagerly load projects relationship
-    transactions = query.options(joinedload(CashTransaction.projects)).order_by(CashTransaction.date.desc()).all()
-    
-    # Build responses with all projects
-    result = []
-    for t in transactions:
-        response = CashTransactionResponse.model_validate(t)
-        # Load projects from the many-to-many relationship
-        response.projects = [ProjectResponse.model_validate(p) for p in t.projects] if t.projects else []
-        # Keep backward compatibility - set project from first project or old project_id
-        if not response.projects and t.project_id:
-            # If no projects in many-to-many but project_id exists, get that project
-            project = db.query(Project).filter(Project.id == t.project_id).first()
-            if project:
-                response.projects = [ProjectResponse.model_validate(project)]
-        result.append(response)
+    # Projects are read afterwards by listing_projects, in one query for the whole page
+    # (selectinload would issue one per 500 rows and relationship), so the query count
+    # doesn't grow with the page
+    options = []
+    if fieldset:
+        # date is the pagination key
+        options = fieldset_options(CashTransaction, fieldset, {
+            'projects': ([], ['project_id']),
+            'project': ([], ['project_id']),
+        }, required=['id', 'date'])
+    try:
+        transactions = paginate(
+            query.options(*options), CashTransaction, response,
+            limit=limit, cursor=cursor, include_total=include_total, ranking=ranking
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return result
+    project_map, projects = {}, {}
+    if not fieldset or 'projects' in fieldset or 'project' in fieldset:
+        project_map, projects = listing_projects(db, CashTransaction, transactions)
+    
+    # Validated and encoded in one pass; projects falls back to the legacy project_id
+    return rows_response(transactions, CashTransactionResponse, response, fields=fieldset, computed={
+        'projects': lambda t: project_map.get(t.id, []),
+        'project': lambda t: projects.get(t.project_id)
+    })
 
 
 @app.patch("/api/cash-transactions/{transaction_id}", response_model=CashTransactionResponse)
@@ -1010,6 +1151,12 @@ def update_cash_transaction(
     return response
 
 
+@app.post("/api/cash-transactions/bulk-tag", response_model=BulkTagResponse)
+def bulk_tag_cash_transactions(tag_request: BulkTagRequest, db: Session = Depends(get_db)):
+    """Tag many cash transactions (by id or by listing filter) with the same projects in one commit"""
+    return bulk_tag(db, CashTransaction, tag_request)
+
+
 @app.delete("/api/cash-transactions/{transaction_id}")
 def delete_cash_transaction(transaction_id: int, db: Session = Depends(get_db)):
     """Delete a cash transaction"""
@@ -1022,33 +1169,78 @@ def delete_cash_transaction(transaction_id: int, db: Session = Depends(get_db)):
     return {"message": "Cash transaction deleted"}
 
 
+# Ledger endpoints
+@app.get("/api/ledger", response_model=List[LedgerEntryResponse])
+def get_ledger(
+    request: Request,
+    response: Response,
+    project_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    db: Session = Depends(get_db)
+):
+    """Get bank and cash transactions as one list, newest first.
+    
+    Each entry's source (bank or cash) tells which table it comes from; ids are unique per
+    source. Both tables are read by one UNION ALL query, paged like the transaction
+    listings: with limit, one page is returned and X-Next-Cursor holds the cursor for the
+    next page; X-Total-Count holds the number of matching rows unless include_total=false.
+    Answers If-None-Match with 304 while none of the tables read have changed.
+    """
+    cached = not_modified(db, request, response, LEDGER_TABLES)
+    if cached:
+        return cached
+    
+    try:
+        rows = ledger_page(
+            db, response, project_id=project_id, start_date=start_date, end_date=end_date,
+            limit=limit, cursor=cursor, include_total=include_total
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Projects of the whole page at once (not per row), then validated and encoded in one pass
+    projects = ledger_projects(db, rows)
+    return rows_response(rows, LedgerEntryResponse, response, computed={
+        'projects': lambda row: projects.get((row.source, row.id), [])
+    })
+
+
 # Dashboard endpoints
 @app.post("/api/dashboard/stats", response_model=DashboardStats)
 def get_dashboard_stats(
     filter: PeriodFilter,
     db: Session = Depends(get_db)
 ):
-    """Get dashboard statistics for a project and period"""
+    """Get dashboard statistics for a project and period.
+    
+    A transaction tagged with several projects counts in full for each of them; only
+    transactions without any project count as Untagged. The totals count every
+    transaction once.
+    """
     start_date = filter.start_date
     end_date = filter.end_date
     
     # Get bank transactions
-    bank_query = db.query(Transaction)
+    bank_query = db.query(Transaction).options(selectinload(Transaction.projects), selectinload(Transaction.project))
     if filter.project_id:
-        bank_query = bank_query.filter(Transaction.project_id == filter.project_id)
+        bank_query = filter_by_project(bank_query, Transaction, filter.project_id)
     bank_query = bank_query.filter(Transaction.date >= start_date, Transaction.date <= end_date)
     bank_transactions = bank_query.all()
     
     # Get cash transactions
-    cash_query = db.query(CashTransaction)
+    cash_query = db.query(CashTransaction).options(selectinload(CashTransaction.projects), selectinload(CashTransaction.project))
     if filter.project_id:
-        cash_query = cash_query.filter(CashTransaction.project_id == filter.project_id)
+        cash_query = filter_by_project(cash_query, CashTransaction, filter.project_id)
     cash_query = cash_query.filter(CashTransaction.date >= start_date, CashTransaction.date <= end_date)
     cash_transactions = cash_query.all()
     
     # Calculate totals
-    total_income = sum(t.amount for t in bank_transactions + cash_transactions if t.amount > 0)
-    total_expenses = abs(sum(t.amount for t in bank_transactions + cash_transactions if t.amount < 0))
+    total_income = sum(t.amount for t in chain(bank_transactions, cash_transactions) if t.amount > 0)
+    total_expenses = abs(sum(t.amount for t in chain(bank_transactions, cash_transactions) if t.amount < 0))
     net_amount = total_income - total_expenses
     
     # Transaction counts
@@ -1057,43 +1249,45 @@ def get_dashboard_stats(
     
     # Calculate project-wise statistics
     project_stats_dict = {}
-    all_transactions = bank_transactions + cash_transactions
     
-    for transaction in all_transactions:
-        project_id = transaction.project_id
-        project_name = None
-        if project_id:
-            project = db.query(Project).filter(Project.id == project_id).first()
-            project_name = project.name if project else None
-        
-        key = project_id if project_id else None
-        
-        if key not in project_stats_dict:
-            project_stats_dict[key] = {
-                'project_id': project_id,
-                'project_name': project_name or 'Untagged',
-                'income': 0.0,
-                'expenses': 0.0,
-                'transaction_count': 0
-            }
-        
-        if transaction.amount > 0:
-            project_stats_dict[key]['income'] += transaction.amount
+    project_names = {}
+    
+    for transaction in chain(bank_transactions, cash_transactions):
+        # Projects from the association rows, falling back to the legacy project_id
+        projects = transaction.projects or ([transaction.project] if transaction.project else [])
+        project_names.update((project.id, project.name) for project in projects)
+        if filter.project_id:
+            # With a project filter only that project's figures are wanted
+            project_ids = [filter.project_id]
         else:
-            project_stats_dict[key]['expenses'] += abs(transaction.amount)
+            project_ids = [project.id for project in projects] or [None]
         
-        project_stats_dict[key]['transaction_count'] += 1
+        for key in project_ids:
+            if key not in project_stats_dict:
+                project_stats_dict[key] = {
+                    'project_id': key,
+                    'income': 0.0,
+                    'expenses': 0.0,
+                    'transaction_count': 0
+                }
+            
+            if transaction.amount > 0:
+                project_stats_dict[key]['income'] += transaction.amount
+            else:
+                project_stats_dict[key]['expenses'] += abs(transaction.amount)
+            
+            project_stats_dict[key]['transaction_count'] += 1
     
     # Convert to list and calculate net amounts
     project_stats_list = []
     for key, stats in project_stats_dict.items():
-        net_amount = stats['income'] - stats['expenses']
+        project_net_amount = stats['income'] - stats['expenses']
         project_stats_list.append(ProjectStats(
             project_id=stats['project_id'],
-            project_name=stats['project_name'],
+            project_name=project_names.get(key) or 'Untagged',
             income=stats['income'],
             expenses=stats['expenses'],
-            net_amount=net_amount,
+            net_amount=project_net_amount,
             transaction_count=stats['transaction_count']
         ))
     
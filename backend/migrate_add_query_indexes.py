@@ -0,0 +1,70 @@
+"""
+Migration script to add the indexes matching the hot query shapes.
+
+- ix_transactions_dedup (date, reference, amount): the duplicate check at upload
+- ix_transactions_project_id_date / ix_cash_transactions_project_id_date: the legacy
+  project_id tag filtered by period; they replace the single-column project_id indexes
+- ix_transaction_projects_project_id / ix_cash_transaction_projects_project_id
+  (project_id, transaction id): filtering by project through the association tables
+- ix_transactions_date_brin / ix_cash_transactions_date_brin: BRIN on date (PostgreSQL only)
+
+Existing indexes are left alone, so the script can be run more than once.
+Check the plans afterwards with: python -m benchmarks.index_usage
+"""
+import sys
+from sqlalchemy import inspect, text
+from database import engine
+from models import Transaction, CashTransaction, transaction_projects, cash_transaction_projects
+
+# Indexes superseded by the (project_id, date) ones
+OBSOLETE_INDEXES = ['ix_transactions_project_id', 'ix_cash_transactions_project_id']
+
+
+def migrate():
+    """Create the missing indexes and drop the ones they supersede"""
+    postgresql = engine.dialect.name == "postgresql"
+    indexes = [
+        index
+        for table in (Transaction.__table__, CashTransaction.__table__, transaction_projects, cash_transaction_projects)
+        for index in sorted(table.indexes, key=lambda index: index.name)
+        if postgresql or index.dialect_kwargs.get('postgresql_using') != 'brin'
+    ]
+
+    inspector = inspect(engine)
+    existing = {
+        index['name']
+        for table_name in ('transactions', 'cash_transactions', 'transaction_projects', 'cash_transaction_projects')
+        for index in inspector.get_indexes(table_name)
+    }
+
+    conn = engine.connect()
+    trans = conn.begin()
+
+    try:
+        for index in indexes:
+            if index.name in existing:
+                print(f"Index '{index.name}' already exists.")
+            else:
+                index.create(bind=conn)
+                print(f"Created index '{index.name}' on {index.table.name}.")
+
+        for name in OBSOLETE_INDEXES:
+            if name in existing:
+                conn.execute(text(f"DROP INDEX {name}"))
+                print(f"Dropped index '{name}'.")
+
+        # Fresh statistics so the planner picks the new indexes up
+        conn.execute(text("ANALYZE"))
+
+        trans.commit()
+        print("Indexes are up to date.")
+
+    except Exception as e:
+        trans.rollback()
+        print(f"Error during migration: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
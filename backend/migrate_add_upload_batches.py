@@ -0,0 +1,68 @@
+"""
+Migration script to add the upload_batches table and backfill it from existing transactions.
+
+Batches imported before the table existed get a row with the counts and account/statement
+numbers aggregated from their transactions. Their content hash is unknown (NULL), so a
+re-upload of one of those files is still parsed and deduplicated row by row.
+Also adds the content_hash, file_size and already_uploaded columns to ingest_jobs.
+"""
+import sys
+from sqlalchemy import inspect, text
+from database import engine, Base
+from models import UploadBatch, IngestJob
+
+INGEST_JOB_COLUMNS = {
+    'content_hash': 'VARCHAR(64)',
+    'file_size': 'INTEGER',
+    'already_uploaded': 'BOOLEAN DEFAULT FALSE',
+}
+
+
+def migrate():
+    """Create upload_batches, add the new ingest_jobs columns and backfill batches"""
+    # Creates upload_batches (and ingest_jobs) if they don't exist yet
+    Base.metadata.create_all(bind=engine, tables=[UploadBatch.__table__, IngestJob.__table__])
+
+    existing_columns = {column['name'] for column in inspect(engine).get_columns('ingest_jobs')}
+
+    conn = engine.connect()
+    trans = conn.begin()
+
+    try:
+        for name, column_type in INGEST_JOB_COLUMNS.items():
+            if name in existing_columns:
+                print(f"Column '{name}' already exists in ingest_jobs table.")
+            else:
+                conn.execute(text(f"ALTER TABLE ingest_jobs ADD COLUMN {name} {column_type}"))
+                print(f"Added '{name}' column to ingest_jobs table.")
+
+        # One row per batch id that has transactions but no upload_batches row;
+        # MT940 statements carry a statement number, CSV exports usually don't
+        result = conn.execute(text("""
+            INSERT INTO upload_batches (
+                id, upload_type, created_count, skipped_count, error_count,
+                account_number, statement_number, created_at
+            )
+            SELECT
+                t.upload_batch_id,
+                CASE WHEN MIN(t.statement_number) IS NOT NULL THEN 'MT940' ELSE 'CSV' END,
+                COUNT(t.id), 0, 0,
+                MIN(t.account_number), MIN(t.statement_number), MIN(t.created_at)
+            FROM transactions t
+            WHERE t.upload_batch_id IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM upload_batches b WHERE b.id = t.upload_batch_id)
+            GROUP BY t.upload_batch_id
+        """))
+
+        trans.commit()
+        print(f"Backfilled {result.rowcount} upload batches from existing transactions.")
+
+    except Exception as e:
+        trans.rollback()
+        print(f"Error during migration: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
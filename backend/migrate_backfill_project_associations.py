@@ -0,0 +1,57 @@
+"""
+Migration script to move legacy project_id tags into the project association tables.
+
+Rows tagged only through transactions.project_id / cash_transactions.project_id get the
+matching transaction_projects / cash_transaction_projects row, so project filters can go
+through the association tables alone. Also creates the (project_id, transaction id)
+indexes those filters use. Safe to run more than once.
+"""
+import sys
+from sqlalchemy import text
+from database import engine
+
+# (table, association table, association transaction column)
+TAGGED_TABLES = [
+    ('transactions', 'transaction_projects', 'transaction_id'),
+    ('cash_transactions', 'cash_transaction_projects', 'cash_transaction_id'),
+]
+
+
+def migrate():
+    """Backfill the association tables and create the reverse indexes"""
+    conn = engine.connect()
+    trans = conn.begin()
+    
+    try:
+        for table, association, column in TAGGED_TABLES:
+            result = conn.execute(text(f"""
+                INSERT INTO {association} ({column}, project_id)
+                SELECT t.id, t.project_id
+                FROM {table} t
+                WHERE t.project_id IS NOT NULL
+                  AND EXISTS (SELECT 1 FROM projects p WHERE p.id = t.project_id)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM {association} a
+                      WHERE a.{column} = t.id AND a.project_id = t.project_id
+                  )
+            """))
+            print(f"Backfilled {result.rowcount} {association} rows from {table}.project_id.")
+            
+            conn.execute(text(f"""
+                CREATE INDEX IF NOT EXISTS ix_{association}_project_id
+                ON {association}(project_id, {column})
+            """))
+            print(f"Index created on {association}(project_id, {column}).")
+        
+        trans.commit()
+        print("Successfully moved legacy project tags into the association tables.")
+        
+    except Exception as e:
+        trans.rollback()
+        print(f"Error during migration: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,96 @@
+"""
+Migration script to move transactions.raw_data into the compressed transaction_raw_data table.
+
+Old rows hold a Python repr (str(dict) for CSV rows, str(transaction.__dict__) for MT940)
+or the raw :61:/:86: lines. Each value is converted to structured JSON where possible
+(a dict repr becomes the dict, statement lines become fields by tag, anything else is kept
+as {"text": ...}), compressed and stored in transaction_raw_data. The raw_data column is then
+dropped (or emptied where the database can't drop columns).
+"""
+import ast
+import io
+import sys
+from sqlalchemy import inspect, insert, text
+from database import engine, Base
+from models import TransactionRawData
+from ingestion import pack_raw_data
+from mt940_import import iter_tags
+
+# Rows converted and committed together
+BATCH_SIZE = 1000
+
+
+def convert_raw_data(raw: str):
+    """Turn a legacy raw_data string into JSON-serializable structured data"""
+    if raw.startswith(':61:'):
+        return {tag: value for tag, value in iter_tags(io.StringIO(raw))}
+    try:
+        value = ast.literal_eval(raw)
+        if isinstance(value, dict):
+            return value
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        pass
+    return {'text': raw}
+
+
+def migrate():
+    """Convert and move raw_data, then drop the old column"""
+    Base.metadata.create_all(bind=engine, tables=[TransactionRawData.__table__])
+
+    columns = [column['name'] for column in inspect(engine).get_columns('transactions')]
+    if 'raw_data' not in columns:
+        print("Column 'raw_data' no longer exists in transactions table. No migration needed.")
+        return
+
+    conn = engine.connect()
+    converted = 0
+    last_id = 0
+
+    try:
+        # Keyset batches by id; rows already moved by an interrupted run are skipped
+        while True:
+            rows = conn.execute(text("""
+                SELECT t.id, t.raw_data
+                FROM transactions t
+                WHERE t.id > :last_id AND t.raw_data IS NOT NULL
+                  AND NOT EXISTS (SELECT 1 FROM transaction_raw_data r WHERE r.transaction_id = t.id)
+                ORDER BY t.id
+                LIMIT :batch_size
+            """), {"last_id": last_id, "batch_size": BATCH_SIZE}).fetchall()
+            if not rows:
+                break
+
+            conn.execute(insert(TransactionRawData.__table__), [
+                {'transaction_id': row.id, 'data': pack_raw_data(convert_raw_data(row.raw_data))}
+                for row in rows
+            ])
+            conn.commit()
+            converted += len(rows)
+            last_id = rows[-1].id
+            print(f"Converted {converted} rows...")
+
+        try:
+            conn.execute(text("ALTER TABLE transactions DROP COLUMN raw_data"))
+            conn.commit()
+            print("Dropped 'raw_data' column from transactions table.")
+        except Exception as e:
+            # SQLite before 3.35 cannot drop columns; free the space by emptying it instead
+            conn.rollback()
+            print(f"Note: Could not drop 'raw_data' column: {e}")
+            conn.execute(text("UPDATE transactions SET raw_data = NULL"))
+            conn.commit()
+            print("Emptied 'raw_data' column instead.")
+
+        print(f"Successfully moved raw data of {converted} transactions to transaction_raw_data.")
+        if engine.dialect.name == "sqlite":
+            print("Run VACUUM on the database file to reclaim the freed space.")
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Error during migration: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
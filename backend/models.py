@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Text, DateTime, Table, Boolean
+from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Text, DateTime, Table, Boolean, LargeBinary, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime, date
@@ -9,7 +9,9 @@ transaction_projects = Table(
     'transaction_projects',
     Base.metadata,
     Column('transaction_id', Integer, ForeignKey('transactions.id'), primary_key=True),
-    Column('project_id', Integer, ForeignKey('projects.id'), primary_key=True)
+    Column('project_id', Integer, ForeignKey('projects.id'), primary_key=True),
+    # The primary key leads with transaction_id; this one serves filtering by project
+    Index('ix_transaction_projects_project_id', 'project_id', 'transaction_id')
 )
 
 # Association table for many-to-many relationship between cash_transactions and projects
@@ -17,6 +19,15 @@ cash_transaction_projects = Table(
     'cash_transaction_projects',
     Base.metadata,
     Column('cash_transaction_id', Integer, ForeignKey('cash_transactions.id'), primary_key=True),
+    Column('project_id', Integer, ForeignKey('projects.id'), primary_key=True),
+    Index('ix_cash_transaction_projects_project_id', 'project_id', 'cash_transaction_id')
+)
+
+# Association table for the projects a tagging rule assigns
+tagging_rule_projects = Table(
+    'tagging_rule_projects',
+    Base.metadata,
+    Column('tagging_rule_id', Integer, ForeignKey('tagging_rules.id', ondelete="CASCADE"), primary_key=True),
     Column('project_id', Integer, ForeignKey('projects.id'), primary_key=True)
 )
 
@@ -46,13 +57,29 @@ class Transaction(Base):
     description = Column(Text, nullable=True)
     account_number = Column(String, nullable=True)
     statement_number = Column(String, nullable=True)
-    raw_data = Column(Text, nullable=True)
-    project_id = Column(Integer, ForeignKey("projects.id"), nullable=True, index=True)  # Keep for backward compatibility
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=True)  # Keep for backward compatibility
     upload_batch_id = Column(String, nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     project = relationship("Project", back_populates="transactions", foreign_keys=[project_id])
     projects = relationship("Project", secondary=transaction_projects, back_populates="transaction_associations")  # Many-to-many
+    
+    __table_args__ = (
+        # Covers the duplicate check on (date, reference, amount) without reading the table
+        Index('ix_transactions_dedup', 'date', 'reference', 'amount'),
+        # Legacy project tag filtered by period; also serves lookups by project_id alone
+        Index('ix_transactions_project_id_date', 'project_id', 'date'),
+        # Rows are imported roughly in date order, so a tiny BRIN index serves date ranges (PostgreSQL only)
+        Index('ix_transactions_date_brin', 'date', postgresql_using='brin').ddl_if(dialect='postgresql'),
+    )
+
+
+class TransactionRawData(Base):
+    __tablename__ = "transaction_raw_data"
+    
+    # Source data of an imported transaction, kept out of the transactions table so list queries never load it
+    transaction_id = Column(Integer, ForeignKey("transactions.id", ondelete="CASCADE"), primary_key=True)
+    data = Column(LargeBinary, nullable=False)  # zlib-compressed JSON (CSV row by column, MT940 fields by tag)
 
 
 class CashTransaction(Base):
@@ -63,11 +90,76 @@ class CashTransaction(Base):
     amount = Column(Float, nullable=False)
     currency = Column(String(3), default="EUR")
     description = Column(Text, nullable=True)
-    project_id = Column(Integer, ForeignKey("projects.id"), nullable=True, index=True)  # Keep for backward compatibility
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=True)  # Keep for backward compatibility
     created_at = Column(DateTime, default=datetime.utcnow)
     
     project = relationship("Project", back_populates="cash_transactions", foreign_keys=[project_id])
     projects = relationship("Project", secondary=cash_transaction_projects, back_populates="cash_transaction_associations")  # Many-to-many
+    
+    __table_args__ = (
+        Index('ix_cash_transactions_project_id_date', 'project_id', 'date'),
+        Index('ix_cash_transactions_date_brin', 'date', postgresql_using='brin').ddl_if(dialect='postgresql'),
+    )
+
+
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+    
+    id = Column(String, primary_key=True, index=True)  # UUID
+    file_name = Column(String, nullable=True)
+    upload_type = Column(String, nullable=False)  # MT940, CSV
+    status = Column(String, default="queued", index=True)  # queued, running, completed, failed
+    spool_path = Column(String, nullable=True)  # Uploaded file waiting to be processed
+    column_mapping = Column(Text, nullable=True)  # JSON CSV column mapping
+    upload_batch_id = Column(String, nullable=False, index=True)  # Batch the imported transactions belong to
+    content_hash = Column(String(64), nullable=True)  # SHA-256 of the uploaded bytes
+    file_size = Column(Integer, nullable=True)  # Size in bytes
+    already_uploaded = Column(Boolean, default=False)  # Byte-identical to an earlier upload; not parsed
+    rows_processed = Column(Integer, default=0)
+    rows_created = Column(Integer, default=0)
+    rows_skipped = Column(Integer, default=0)  # Duplicates
+    error_count = Column(Integer, default=0)
+    errors = Column(Text, nullable=True)  # JSON list of the first row errors, or the failure message
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class UploadBatch(Base):
+    __tablename__ = "upload_batches"
+    
+    id = Column(String, primary_key=True, index=True)  # UUID, the upload_batch_id of the imported transactions
+    file_name = Column(String, nullable=True)
+    upload_type = Column(String, nullable=False)  # MT940, CSV
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 of the uploaded bytes; NULL for backfilled batches
+    file_size = Column(Integer, nullable=True)  # Size in bytes
+    created_count = Column(Integer, default=0)
+    skipped_count = Column(Integer, default=0)  # Duplicates
+    error_count = Column(Integer, default=0)
+    account_number = Column(String, nullable=True)
+    statement_number = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class TaggingRule(Base):
+    __tablename__ = "tagging_rules"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    pattern = Column(String, nullable=False)
+    field = Column(String, nullable=False, default="description")  # description, reference, account_number
+    match_type = Column(String, nullable=False, default="contains")  # contains (case-insensitive literal), regex
+    priority = Column(Integer, nullable=False, default=0)  # The highest-priority matching rule wins
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    projects = relationship("Project", secondary=tagging_rule_projects)
+
+
+class TableVersion(Base):
+    __tablename__ = "table_versions"
+    
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)  # Bumped by every commit that writes to the table
 
 
 # Portfolio/Investment App Models
@@ -0,0 +1,178 @@
+"""
+Streaming reader for MT940 bank statements.
+
+Statements are read line by line from a file-like object and turned into
+transaction records (dicts with the Transaction column names) tag by tag: each
+:61: statement line becomes a record once its :86: information line (if any)
+has been read, so no statement object graph is ever built. The record's raw_data
+holds the source fields by tag, e.g. {'61': ..., '86': ...}.
+"""
+from typing import Iterator, List, Optional, Tuple
+from datetime import datetime
+import io
+import re
+
+# A field tag at the start of a line, e.g. ":61:" or ":28C:"
+TAG_LINE = re.compile(r'^:(\w{2,3}):(.*)$')
+
+# :61: statement line: value date, optional entry date, debit/credit mark (R = reversal),
+# optional funds code, amount with decimal comma, transaction type, references
+STATEMENT_LINE = re.compile(
+    r'^(?P<value_date>\d{6})(?P<entry_date>\d{4})?'
+    r'(?P<mark>R?[CD])(?P<funds_code>[A-Z])?'
+    r'(?P<amount>\d[\d,]*)'
+    r'(?P<type>[NSF][A-Z0-9]{3})'
+    r'(?P<customer_reference>.*?)'
+    r'(?://(?P<bank_reference>.*))?$'
+)
+
+# :61: customer references that only say there is none (or that it is in :86:)
+PLACEHOLDER_REFERENCES = ('NONREF', 'EREF', 'NOTPROVIDED')
+
+# End-to-end reference in a :86: information field: /EREF/<ref>/ (structured SEPA
+# information) or ?20EREF+<ref> (German subfields)
+END_TO_END_REFERENCE = re.compile(r'/EREF/([^/]*)|EREF\+([^?]*)')
+
+# Maximum number of statement line errors kept for reporting back to the client
+MAX_REPORTED_ERRORS = 100
+
+# Tags that end the statement lines of a statement
+CLOSING_TAGS = ('62F', '62M', '64', '65')
+
+
+def iter_tags(text_stream) -> Iterator[Tuple[str, str]]:
+    """Yield (tag, value) for every field in an MT940 stream. Continuation lines are
+    joined to their field with newlines; SWIFT block envelopes ({1:...}{4: and -}) are skipped."""
+    tag = None
+    lines = []
+    for line in text_stream:
+        line = line.rstrip('\r\n')
+        if line.startswith('{'):
+            # Block header; text after "{4:" on the same line is part of the message
+            start = line.find('{4:')
+            line = line[start + 3:] if start >= 0 else ''
+            if not line:
+                continue
+        match = TAG_LINE.match(line)
+        if match or line == '-' or line.startswith('-}'):
+            if tag:
+                yield tag, '\n'.join(lines)
+            tag, lines = (match.group(1), [match.group(2)]) if match else (None, [])
+        elif tag:
+            lines.append(line)
+    if tag:
+        yield tag, '\n'.join(lines)
+
+
+def end_to_end_reference(information: str) -> str:
+    """The EREF end-to-end reference of a :86: field, or '' if it has none"""
+    # Continuation lines may split the reference
+    match = END_TO_END_REFERENCE.search(information.replace('\n', ''))
+    if not match:
+        return ''
+    reference = (match.group(1) or match.group(2) or '').strip()
+    return '' if reference.upper() in PLACEHOLDER_REFERENCES else reference
+
+
+def parse_statement_line(value: str) -> Optional[dict]:
+    """Parse the first line of a :61: field. Returns None if it is not a valid statement line.
+    Placeholder customer references (NONREF and the like) become ''."""
+    first_line = value.split('\n', 1)[0]
+    match = STATEMENT_LINE.match(first_line)
+    if not match:
+        return None
+
+    amount = float(match.group('amount').replace(',', '.'))
+    # Debit and reversal of credit reduce the balance
+    if match.group('mark') in ('D', 'RC'):
+        amount = -amount
+
+    reference = match.group('customer_reference').strip()
+    if reference.upper() in PLACEHOLDER_REFERENCES:
+        reference = ''
+
+    return {
+        'date': datetime.strptime(match.group('value_date'), '%y%m%d').date(),
+        'amount': amount,
+        'reference': reference,
+        'bank_reference': (match.group('bank_reference') or '').strip(),
+        'transaction_type': match.group('type'),
+    }
+
+
+class MT940RecordReader:
+    """Streams transaction records from an MT940 text stream, one per :61: line.
+
+    Statement lines that can't be parsed are skipped, counted in error_count and the
+    first MAX_REPORTED_ERRORS messages are kept in errors.
+    """
+
+    def __init__(self, text_stream):
+        self.text_stream = text_stream
+        self.error_count = 0
+        self.errors = []
+
+    def _record_error(self, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(message)
+
+    def __iter__(self) -> Iterator[dict]:
+        account_number = ''
+        statement_number = ''
+        currency = 'EUR'
+        pending = None  # Statement line waiting for its :86: information
+        line_count = 0
+
+        def build(line, raw, description=''):
+            return {
+                'date': line['date'],
+                'amount': line['amount'],
+                'currency': currency,
+                # Without a customer reference, the :86: end-to-end reference tells rows apart
+                'reference': line['reference'] or end_to_end_reference(raw.get('86', '')),
+                'description': description,
+                'account_number': account_number,
+                'statement_number': statement_number,
+                'raw_data': raw,
+            }
+
+        for tag, value in iter_tags(self.text_stream):
+            if tag == '86' and pending:
+                line, raw = pending
+                pending = None
+                yield build(line, {**raw, '86': value}, value.strip())
+                continue
+
+            if pending and (tag == '61' or tag == '20' or tag in CLOSING_TAGS or tag.startswith('60')):
+                yield build(*pending)
+                pending = None
+
+            if tag == '25':
+                account_number = value.strip()
+            elif tag == '28C':
+                statement_number = value.strip()
+            elif tag.startswith('60'):
+                # Opening balance: D/C mark, date, currency, amount (e.g. C240131EUR1234,56)
+                balance = value.strip()
+                if len(balance) >= 10 and balance[7:10].isalpha():
+                    currency = balance[7:10]
+            elif tag == '61':
+                line_count += 1
+                line = parse_statement_line(value)
+                if line:
+                    pending = (line, {'61': value})
+                else:
+                    first_line = value.split('\n', 1)[0]
+                    self._record_error(f"Statement line {line_count}: Could not parse ':61:{first_line}'")
+
+        if pending:
+            yield build(*pending)
+
+
+def parse_mt940_file(content: bytes) -> Tuple[List[dict], int, List[str]]:
+    """Decode and parse one MT940 file. Module-level so it can run in a worker process.
+    Returns the records, the number of unparseable statement lines and their first messages."""
+    reader = MT940RecordReader(io.StringIO(content.decode('utf-8')))
+    records = list(reader)
+    return records, reader.error_count, reader.errors
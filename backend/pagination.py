@@ -0,0 +1,113 @@
+"""
+Keyset (cursor) pagination for listings ordered by (date DESC, id DESC).
+
+A page is fetched with WHERE (date, id) < (cursor date, cursor id) ORDER BY date DESC,
+id DESC LIMIT n, so it costs the same however deep the client has scrolled. The
+cursor handed to clients is an opaque URL-safe token encoding the last row's key
+(or, for relevance-ranked search results, the offset of the next page).
+"""
+from typing import List, Optional, Tuple
+from datetime import date
+import base64
+import json
+
+from fastapi import Response
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+# Largest page a client may request
+MAX_PAGE_SIZE = 1000
+
+# Response headers carrying the pagination metadata (the body stays a plain JSON array)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+
+def encode_cursor(row_date: date, row_id: int) -> str:
+    """Opaque cursor pointing just after the given row"""
+    payload = json.dumps([row_date.isoformat(), row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    """Inverse of encode_cursor. Raises ValueError for malformed cursors."""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        row_date, row_id = json.loads(payload)
+        return date.fromisoformat(row_date), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def encode_offset_cursor(offset: int) -> str:
+    """Opaque cursor for listings ordered by something other than (date, id), e.g. search rank"""
+    return base64.urlsafe_b64encode(json.dumps({'offset': offset}).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_offset_cursor(cursor: str) -> int:
+    """Inverse of encode_offset_cursor. Raises ValueError for malformed cursors."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return max(int(payload['offset']), 0)
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def paginate(
+    query: Query,
+    model,
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    ranking: Optional[list] = None
+) -> List:
+    """Apply (date DESC, id DESC) ordering and keyset pagination to a filtered query.
+
+    Without limit every matching row is returned, as before pagination existed.
+    The next cursor (when there are more rows) and the total count of matching
+    rows are set as response headers; include_total=False skips the COUNT query.
+    Without limit no COUNT query is run: the total is the number of rows returned.
+
+    With ranking (ORDER BY expressions, e.g. search relevance) rows are ordered by
+    those first; such pages are addressed by offset, since a rank is not a stable key.
+    """
+    if include_total and limit is not None:
+        response.headers[TOTAL_COUNT_HEADER] = str(query.order_by(None).count())
+
+    if ranking:
+        query = query.order_by(*ranking, model.date.desc(), model.id.desc())
+        if limit is None:
+            return _all_rows(query, response, include_total)
+        offset = decode_offset_cursor(cursor) if cursor else 0
+        rows = query.offset(offset).limit(limit + 1).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers[NEXT_CURSOR_HEADER] = encode_offset_cursor(offset + limit)
+        return rows
+
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            model.date < cursor_date,
+            and_(model.date == cursor_date, model.id < cursor_id)
+        ))
+
+    query = query.order_by(model.date.desc(), model.id.desc())
+    if limit is None:
+        return _all_rows(query, response, include_total)
+
+    # One extra row tells whether there is a next page
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].date, rows[-1].id)
+    return rows
+
+
+def _all_rows(query: Query, response: Response, include_total: bool) -> List:
+    """Every row of an unpaginated listing; the total needs no COUNT query"""
+    rows = query.all()
+    if include_total:
+        response.headers[TOTAL_COUNT_HEADER] = str(len(rows))
+    return rows
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session, joinedload
@@ -22,6 +22,9 @@ from schemas import (
     OpportunityDocumentResponse, SubscriptionCreate, SubscriptionResponse, SubscriptionUpdate,
     InvestmentCreate, InvestmentResponse, InvestmentUpdate, ConvertSubscriptionToInvestment
 )
+from fieldsets import parse_fields, fieldset_options
+from serialization import rows_response
+from table_versions import not_modified
 from auth import (
     get_current_active_user, get_current_admin_user,
     get_password_hash, verify_password, create_access_token
@@ -41,6 +44,27 @@ router = APIRouter(prefix="/api/portfolio", tags=["portfolio"])
 UPLOAD_DIR = Path("uploads/opportunities")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+# Relationship loaders (and the columns they need) for sparse fieldsets on the list endpoints
+SUBSCRIPTION_RELATIONSHIPS = {
+    'opportunity': ([joinedload(Subscription.opportunity).joinedload(InvestmentOpportunity.documents)], ['opportunity_id']),
+    'user': ([joinedload(Subscription.user)], ['user_id']),
+    'investment': ([joinedload(Subscription.investment)], []),
+}
+SUBSCRIPTION_COMPUTED = {
+    'investment': lambda sub: {"id": sub.investment.id} if sub.investment else None,
+}
+INVESTMENT_RELATIONSHIPS = {
+    'portfolio': ([joinedload(Investment.portfolio)], ['portfolio_id']),
+    'opportunity': ([joinedload(Investment.opportunity).joinedload(InvestmentOpportunity.documents)], ['opportunity_id']),
+}
+
+
+def parse_fields_or_400(fields: Optional[str], response_model):
+    try:
+        return parse_fields(fields, response_model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 
 # Authentication endpoints
 @router.post("/auth/register", response_model=UserResponse)
@@ -173,10 +197,15 @@ def create_portfolio(
 
 @router.get("/portfolios", response_model=List[PortfolioResponse])
 def get_portfolios(
+    request: Request,
+    response: Response,
     is_active: Optional[bool] = None,
     db: Session = Depends(get_db)
 ):
-    """Get all portfolios"""
+    """Get all portfolios. Answers If-None-Match with 304 while the portfolios are unchanged."""
+    cached = not_modified(db, request, response, [Portfolio.__tablename__])
+    if cached:
+        return cached
     query = db.query(Portfolio)
     if is_active is not None:
         query = query.filter(Portfolio.is_active == is_active)
@@ -338,10 +367,15 @@ def create_opportunity(
 
 @router.get("/opportunities", response_model=List[InvestmentOpportunityResponse])
 def get_opportunities(
+    request: Request,
+    response: Response,
     status: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Get all investment opportunities"""
+    """Get all investment opportunities. Answers If-None-Match with 304 while they are unchanged."""
+    cached = not_modified(db, request, response, [InvestmentOpportunity.__tablename__, OpportunityDocument.__tablename__])
+    if cached:
+        return cached
     query = db.query(InvestmentOpportunity).options(joinedload(InvestmentOpportunity.documents))
     if status:
         query = query.filter(InvestmentOpportunity.status == status)
@@ -556,58 +590,55 @@ def subscribe_to_opportunity(
 
 @router.get("/subscriptions", response_model=List[SubscriptionResponse])
 def get_my_subscriptions(
+    response: Response,
+    fields: Optional[str] = None,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Get current user's subscriptions"""
-    subscriptions = db.query(Subscription).options(
-        joinedload(Subscription.opportunity).joinedload(InvestmentOpportunity.documents)
-    ).filter(Subscription.user_id == current_user.id).order_by(desc(Subscription.created_at)).all()
-    
-    result = []
-    for sub in subscriptions:
-        response = SubscriptionResponse.model_validate(sub)
-        opp_response = InvestmentOpportunityResponse.model_validate(sub.opportunity)
-        opp_response.documents = [OpportunityDocumentResponse.model_validate(d) for d in sub.opportunity.documents]
-        response.opportunity = opp_response
-        result.append(response)
+    """Get current user's subscriptions. fields restricts the returned fields (comma-separated)."""
+    fieldset = parse_fields_or_400(fields, SubscriptionResponse)
+    query = db.query(Subscription)
+    if fieldset:
+        query = query.options(*fieldset_options(Subscription, fieldset, SUBSCRIPTION_RELATIONSHIPS))
+    else:
+        query = query.options(
+            joinedload(Subscription.opportunity).joinedload(InvestmentOpportunity.documents),
+            joinedload(Subscription.user),
+            joinedload(Subscription.investment)
+        )
+    subscriptions = query.filter(Subscription.user_id == current_user.id).order_by(desc(Subscription.created_at)).all()
     
-    return result
+    # Validated and encoded in one pass (see serialization.rows_response)
+    return rows_response(subscriptions, SubscriptionResponse, response, fields=fieldset, computed=SUBSCRIPTION_COMPUTED)
 
 
 @router.get("/subscriptions/all", response_model=List[SubscriptionResponse])
 def get_all_subscriptions(
+    response: Response,
     opportunity_id: Optional[int] = None,
+    fields: Optional[str] = None,
     current_user: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
-    """Get all subscriptions (admin only)"""
-    query = db.query(Subscription).options(
-        joinedload(Subscription.opportunity).joinedload(InvestmentOpportunity.documents),
-        joinedload(Subscription.user),
-        joinedload(Subscription.investment)
-    )
+    """Get all subscriptions (admin only). fields restricts the returned fields (comma-separated)."""
+    fieldset = parse_fields_or_400(fields, SubscriptionResponse)
+    query = db.query(Subscription)
+    if fieldset:
+        query = query.options(*fieldset_options(Subscription, fieldset, SUBSCRIPTION_RELATIONSHIPS))
+    else:
+        query = query.options(
+            joinedload(Subscription.opportunity).joinedload(InvestmentOpportunity.documents),
+            joinedload(Subscription.user),
+            joinedload(Subscription.investment)
+        )
     
     if opportunity_id:
         query = query.filter(Subscription.opportunity_id == opportunity_id)
     
     subscriptions = query.order_by(desc(Subscription.created_at)).all()
     
-    result = []
-    for sub in subscriptions:
-        response = SubscriptionResponse.model_validate(sub)
-        opp_response = InvestmentOpportunityResponse.model_validate(sub.opportunity)
-        opp_response.documents = [OpportunityDocumentResponse.model_validate(d) for d in sub.opportunity.documents]
-        response.opportunity = opp_response
-        # Add user info if available (not in schema but useful for admin)
-        if hasattr(sub, 'user') and sub.user:
-            response.user = UserResponse.model_validate(sub.user)
-        # Add investment info if converted
-        if hasattr(sub, 'investment') and sub.investment:
-            response.investment = {"id": sub.investment.id}
-        result.append(response)
-    
-    return result
+    # Validated and encoded in one pass (see serialization.rows_response)
+    return rows_response(subscriptions, SubscriptionResponse, response, fields=fieldset, computed=SUBSCRIPTION_COMPUTED)
 
 
 @router.patch("/subscriptions/{subscription_id}", response_model=SubscriptionResponse)
@@ -758,16 +789,23 @@ def create_investment(
 
 @router.get("/investments", response_model=List[InvestmentResponse])
 def get_investments(
+    response: Response,
     portfolio_id: Optional[int] = None,
     opportunity_id: Optional[int] = None,
     status: Optional[str] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Get all investments with optional filters"""
-    query = db.query(Investment).options(
-        joinedload(Investment.portfolio),
-        joinedload(Investment.opportunity).joinedload(InvestmentOpportunity.documents)
-    )
+    """Get all investments with optional filters. fields restricts the returned fields (comma-separated)."""
+    fieldset = parse_fields_or_400(fields, InvestmentResponse)
+    query = db.query(Investment)
+    if fieldset:
+        query = query.options(*fieldset_options(Investment, fieldset, INVESTMENT_RELATIONSHIPS))
+    else:
+        query = query.options(
+            joinedload(Investment.portfolio),
+            joinedload(Investment.opportunity).joinedload(InvestmentOpportunity.documents)
+        )
     
     if portfolio_id:
         query = query.filter(Investment.portfolio_id == portfolio_id)
@@ -778,17 +816,8 @@ def get_investments(
     
     investments = query.order_by(desc(Investment.investment_date)).all()
     
-    result = []
-    for inv in investments:
-        response = InvestmentResponse.model_validate(inv)
-        response.portfolio = PortfolioResponse.model_validate(inv.portfolio)
-        if inv.opportunity:
-            opp_response = InvestmentOpportunityResponse.model_validate(inv.opportunity)
-            opp_response.documents = [OpportunityDocumentResponse.model_validate(d) for d in inv.opportunity.documents]
-            response.opportunity = opp_response
-        result.append(response)
-    
-    return result
+    # Validated and encoded in one pass (see serialization.rows_response)
+    return rows_response(investments, InvestmentResponse, response, fields=fieldset)
 
 
 @router.get("/investments/{investment_id}", response_model=InvestmentResponse)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List, Union
+from typing import Optional, List, Union, Dict
 from datetime import date, datetime
 
 
@@ -54,6 +54,11 @@ class TransactionResponse(TransactionBase):
         from_attributes = True
 
 
+class TransactionRawDataResponse(BaseModel):
+    transaction_id: int
+    raw_data: Optional[Union[dict, list, str]] = None  # Source data as imported; None for manually created transactions
+
+
 class CashTransactionBase(BaseModel):
     date: date
     amount: float
@@ -82,6 +87,76 @@ class CashTransactionResponse(CashTransactionBase):
         from_attributes = True
 
 
+class LedgerEntryResponse(BaseModel):
+    """A bank or cash transaction in the unified ledger"""
+    source: str  # bank, cash
+    id: int  # Unique per source
+    date: date
+    amount: float
+    currency: str = "EUR"
+    description: Optional[str] = None
+    reference: Optional[str] = None  # Bank transactions only
+    account_number: Optional[str] = None  # Bank transactions only
+    project_id: Optional[int] = None  # Keep for backward compatibility
+    projects: List[ProjectResponse] = []
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class BulkTagFilter(BaseModel):
+    """Same filters as the transaction listings"""
+    project_id: Optional[int] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    q: Optional[str] = None
+    all: bool = False  # Must be set to target every transaction (no other criterion)
+
+
+class BulkTagRequest(BaseModel):
+    transaction_ids: Optional[List[int]] = None  # Either explicit ids...
+    filter: Optional[BulkTagFilter] = None  # ...or every transaction matching a filter
+    project_ids: List[int]  # Replaces the transactions' projects; empty removes them
+
+
+class BulkTagResponse(BaseModel):
+    updated_count: int
+    project_ids: List[int]
+
+
+class TaggingRuleCreate(BaseModel):
+    pattern: str
+    field: str = "description"  # description, reference, account_number
+    match_type: str = "contains"  # contains (case-insensitive literal) or regex
+    project_ids: List[int]
+    priority: int = 0  # The highest-priority matching rule wins
+    is_active: bool = True
+
+
+class TaggingRuleResponse(BaseModel):
+    id: int
+    pattern: str
+    field: str
+    match_type: str
+    priority: int
+    is_active: bool
+    projects: List[ProjectResponse] = []
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class TaggingRuleApplyRequest(BaseModel):
+    upload_batch_id: Optional[str] = None  # Only this upload batch; all transactions if omitted
+    overwrite: bool = False  # Also retag transactions that already have projects
+
+
+class TaggingRuleApplyResponse(BaseModel):
+    tagged_count: int
+
+
 class PeriodFilter(BaseModel):
     project_id: Optional[int] = None
     start_date: date
@@ -127,6 +202,13 @@ class CSVColumnMapping(BaseModel):
 class CSVPreviewResponse(BaseModel):
     columns: List[str]
     sample_rows: List[dict]
+    resolved_columns: Dict[str, Optional[str]] = {}  # Field name -> CSV column the upload will read it from
+    estimated_row_count: int = 0
+    row_count_exact: bool = True  # False when the count is extrapolated from the start of the file
+    encoding: str = "utf-8-sig"
+    delimiter: str = ","
+    number_formats: Dict[str, Optional[str]] = {}  # Amount field -> detected decimal separator
+    date_format: Optional[str] = None  # strptime format detected for the date column
 
 
 class UploadBatchResponse(BaseModel):
@@ -136,6 +218,47 @@ class UploadBatchResponse(BaseModel):
     created_at: datetime
     account_number: Optional[str] = None
     statement_number: Optional[str] = None
+    file_name: Optional[str] = None
+    file_size: Optional[int] = None  # Size in bytes
+    skipped_count: int = 0
+    error_count: int = 0
+
+
+class UploadSummaryResponse(BaseModel):
+    upload_batch_id: str
+    upload_type: str  # "MT940" or "CSV"
+    file_name: Optional[str] = None
+    created_count: int
+    skipped_count: int  # Duplicates of existing rows or of earlier rows in the same file
+    error_count: int
+    errors: List[str] = []  # First few row errors only
+    date_fallback_count: int = 0  # Rows whose date did not match the inferred format (parsed with dateutil)
+    already_uploaded: bool = False  # Byte-identical to an earlier upload; upload_batch_id is that batch
+    tagged_count: int = 0  # New transactions tagged by the tagging rules
+
+
+class MultiUploadSummaryResponse(BaseModel):
+    files: List[UploadSummaryResponse]  # One upload batch per source file
+    created_count: int
+    skipped_count: int
+    error_count: int
+
+
+class IngestJobResponse(BaseModel):
+    id: str
+    file_name: Optional[str] = None
+    upload_type: str
+    status: str  # queued, running, completed, failed
+    upload_batch_id: str
+    rows_processed: int = 0
+    rows_created: int = 0
+    rows_skipped: int = 0  # Duplicates
+    error_count: int = 0
+    errors: List[str] = []
+    already_uploaded: bool = False  # Byte-identical to an earlier upload; upload_batch_id is that batch
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
 
 
 # Portfolio/Investment App Schemas
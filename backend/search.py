@@ -0,0 +1,146 @@
+"""
+Full-text search over bank and cash transactions.
+
+SQLite uses FTS5 external-content tables (transactions_fts, cash_transactions_fts)
+kept in sync with their source tables by triggers. PostgreSQL uses GIN expression
+indexes on to_tsvector('simple', ...), which the database maintains itself. On a
+SQLite build without FTS5 search falls back to LIKE filters.
+
+Search terms are matched as word prefixes and all terms must match; results are
+ordered by relevance (bm25 / ts_rank).
+"""
+from typing import List, Tuple
+import re
+
+from sqlalchemy import and_, column, false, func, literal_column, or_, table, text
+from sqlalchemy.orm import Query
+
+from models import Transaction, CashTransaction
+
+# Searched columns per model
+SEARCH_COLUMNS = {
+    Transaction: ('description', 'reference', 'account_number'),
+    CashTransaction: ('description',),
+}
+
+# Words of a search string; everything else (FTS/tsquery operators, quotes) is dropped
+SEARCH_TERM = re.compile(r'\w+', re.UNICODE)
+
+# Maximum number of terms used from one search string
+MAX_SEARCH_TERMS = 10
+
+# SQLite tables that have an FTS5 index (filled in by ensure_search_indexes)
+_fts_tables = set()
+
+
+def search_terms(q: str) -> List[str]:
+    return SEARCH_TERM.findall(q or '')[:MAX_SEARCH_TERMS]
+
+
+def _fts_table_name(model) -> str:
+    return f"{model.__tablename__}_fts"
+
+
+def _sqlite_statements(model) -> List[str]:
+    """FTS5 table and the triggers keeping it in sync with the model's table"""
+    source = model.__tablename__
+    fts = _fts_table_name(model)
+    columns = SEARCH_COLUMNS[model]
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f"new.{name}" for name in columns)
+    old_values = ', '.join(f"old.{name}" for name in columns)
+    return [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {column_list}, content='{source}', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {source} BEGIN
+            INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {source} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column_list} ON {source} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values});
+        END""",
+    ]
+
+
+def _tsvector(model):
+    """to_tsvector expression over the searched columns. Constants are rendered inline
+    so the expression matches the GIN index definition exactly."""
+    parts = []
+    for name in SEARCH_COLUMNS[model]:
+        if parts:
+            parts.append(literal_column("' '"))
+        parts.append(func.coalesce(getattr(model, name), literal_column("''")))
+    document = parts[0]
+    for part in parts[1:]:
+        document = document.op('||')(part)
+    return func.to_tsvector(literal_column("'simple'"), document)
+
+
+def _postgresql_index(model) -> str:
+    source = model.__tablename__
+    document = " || ' ' || ".join(f"coalesce({name}, '')" for name in SEARCH_COLUMNS[model])
+    return (
+        f"CREATE INDEX IF NOT EXISTS ix_{source}_search ON {source} "
+        f"USING GIN (to_tsvector('simple', {document}))"
+    )
+
+
+def ensure_search_indexes(engine):
+    """Create the full-text indexes (and SQLite sync triggers) if they don't exist yet.
+
+    A newly created SQLite FTS table is filled from its source table once.
+    """
+    with engine.begin() as conn:
+        for model in SEARCH_COLUMNS:
+            if engine.dialect.name == "postgresql":
+                conn.execute(text(_postgresql_index(model)))
+            elif engine.dialect.name == "sqlite":
+                fts = _fts_table_name(model)
+                exists = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": fts}
+                ).first()
+                try:
+                    for statement in _sqlite_statements(model):
+                        conn.execute(text(statement))
+                except Exception as e:
+                    print(f"Warning: full-text search unavailable for {model.__tablename__} ({e}); using LIKE")
+                    continue
+                if not exists:
+                    print(f"Building full-text index {fts}...")
+                    conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+                _fts_tables.add(fts)
+
+
+def apply_search(query: Query, model, q: str, dialect: str) -> Tuple[Query, list]:
+    """Restrict a query to rows matching the search string.
+
+    Returns the filtered query and the ORDER BY expressions ranking the hits, best first.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return query.filter(false()), []
+
+    if dialect == "postgresql":
+        ts_query = func.to_tsquery(literal_column("'simple'"), ' & '.join(f"{term}:*" for term in terms))
+        vector = _tsvector(model)
+        return query.filter(vector.op('@@')(ts_query)), [func.ts_rank(vector, ts_query).desc()]
+
+    fts = _fts_table_name(model)
+    if dialect == "sqlite" and fts in _fts_tables:
+        fts_table = table(fts, column('rowid'), column('rank'))
+        match = ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+        query = query.join(fts_table, fts_table.c.rowid == model.id).filter(
+            literal_column(fts).op('MATCH')(match)
+        )
+        # FTS5 rank is bm25, lower is better
+        return query, [fts_table.c.rank]
+
+    # No full-text index: every term must appear in one of the columns
+    return query.filter(and_(*[
+        or_(*[getattr(model, name).ilike(f"%{term}%") for name in SEARCH_COLUMNS[model]])
+        for term in terms
+    ])), []
@@ -0,0 +1,104 @@
+"""
+Per-table change counters and conditional GET (ETag / If-None-Match) support.
+
+Every commit made through a Session bumps the counter in table_versions of each table
+it wrote to: ORM flushes, bulk ORM statements and Core INSERT/UPDATE/DELETE executed on
+the session alike. Writes that bypass the session (e.g. COPY) call touch_tables.
+Listing endpoints derive their ETag from the counters of the tables they read, so an
+unchanged poll costs one primary-key lookup and no query or serialization.
+"""
+from typing import Iterable, Optional, Sequence
+import hashlib
+
+from fastapi import Request, Response
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+
+from database import Base
+from models import TableVersion
+
+_CHANGED_TABLES = "changed_tables"
+
+
+def touch_tables(db: Session, *table_names: str):
+    """Mark tables as written in the session's transaction"""
+    db.info.setdefault(_CHANGED_TABLES, set()).update(table_names)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_tables(session, flush_context):
+    touch_tables(session, *{
+        instance.__table__.name
+        for instance in (*session.new, *session.dirty, *session.deleted)
+    })
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_statement_tables(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        touch_tables(orm_execute_state.session, orm_execute_state.statement.table.name)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_versions(session):
+    # Flush first so pending changes are collected too; commit would flush after this hook
+    session.flush()
+    changed = session.info.pop(_CHANGED_TABLES, set()) - {TableVersion.__tablename__}
+    if changed:
+        # Straight on the connection, so this UPDATE doesn't go through the session hooks
+        session.connection().execute(
+            update(TableVersion)
+            .where(TableVersion.table_name.in_(sorted(changed)))
+            .values(version=TableVersion.version + 1)
+        )
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changes(session):
+    session.info.pop(_CHANGED_TABLES, None)
+
+
+def ensure_table_versions(engine):
+    """Create a counter row for every table that doesn't have one yet"""
+    with engine.begin() as conn:
+        existing = set(conn.execute(select(TableVersion.table_name)).scalars())
+        missing = [name for name in Base.metadata.tables if name not in existing]
+        if missing:
+            conn.execute(insert(TableVersion), [{"table_name": name, "version": 0} for name in missing])
+
+
+def table_etag(db: Session, request: Request, table_names: Sequence[str]) -> str:
+    """ETag for a response built from the given tables and the request's query string"""
+    versions = dict(
+        db.query(TableVersion.table_name, TableVersion.version)
+        .filter(TableVersion.table_name.in_(table_names))
+        .all()
+    )
+    key = "|".join(
+        [request.url.path, str(request.url.query)] + [f"{name}={versions.get(name, 0)}" for name in table_names]
+    )
+    return '"' + hashlib.sha1(key.encode('utf-8')).hexdigest() + '"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates: Iterable[str] = (value.strip() for value in if_none_match.split(','))
+    return any(value == '*' or value.removeprefix('W/') == etag for value in candidates)
+
+
+def not_modified(
+    db: Session,
+    request: Request,
+    response: Response,
+    table_names: Sequence[str]
+) -> Optional[Response]:
+    """Conditional GET: a 304 response if the client's copy is current, otherwise None
+    (with the ETag set on response so the client can revalidate next time)."""
+    etag = table_etag(db, request, table_names)
+    # no-cache: browsers may keep the response but must revalidate it on every request
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if _etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
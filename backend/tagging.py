@@ -0,0 +1,169 @@
+"""
+Rule-based project tagging of bank transactions.
+
+A TaggingRule matches a pattern against one field of a transaction and assigns its
+projects; when several rules match, the one with the highest priority (then the oldest)
+wins. The literal ("contains") rules of each field are compiled into a single regex
+shaped like a trie of the literals and run as a lookahead at every position, so one
+scan of the text finds every literal occurring in it and the cost hardly grows with the
+number of rules. Regex rules are tried one by one, in priority order, only while they
+could still beat the best literal match.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence
+import re
+
+from sqlalchemy import bindparam, delete, exists, insert, update
+from sqlalchemy.orm import Session, selectinload
+
+from models import Transaction, TaggingRule, transaction_projects
+
+# Transaction fields a rule can match
+MATCH_FIELDS = ('description', 'reference', 'account_number')
+MATCH_TYPES = ('contains', 'regex')
+
+# Rows matched per fetch when applying rules to stored transactions
+APPLY_BATCH_SIZE = 5000
+
+
+def _trie_regex(literals: Iterable[str]) -> str:
+    """Regex matching the longest of the literals at a position, with branches shared by common prefixes"""
+    trie = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # A literal ends here: the longer continuations are optional
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+class RuleMatcher:
+    """Compiled tagging rules; match() returns the winning rule for a transaction"""
+
+    def __init__(self, rules: Sequence[TaggingRule]):
+        # Rank 0 is the best rule
+        self.rules = sorted(rules, key=lambda rule: (-(rule.priority or 0), rule.id))
+        self.literals: Dict[str, Dict[str, int]] = {}
+        self.regexes: Dict[str, List[tuple]] = {}
+        for rank, rule in enumerate(self.rules):
+            if rule.match_type == 'regex':
+                self.regexes.setdefault(rule.field, []).append((rank, re.compile(rule.pattern, re.IGNORECASE)))
+            elif rule.pattern:
+                # Only the best rank per literal matters
+                self.literals.setdefault(rule.field, {}).setdefault(rule.pattern.casefold(), rank)
+
+        self.scanners = {
+            field: re.compile(f'(?=({_trie_regex(literals)}))')
+            for field, literals in self.literals.items()
+        }
+        self.literal_lengths = {
+            field: sorted({len(literal) for literal in literals})
+            for field, literals in self.literals.items()
+        }
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def match(self, values) -> Optional[TaggingRule]:
+        """The winning rule for a transaction (any mapping or object with the match fields), or None"""
+        best = None
+        for field, scanner in self.scanners.items():
+            text = (_field_value(values, field) or '').casefold()
+            literals = self.literals[field]
+            for found in scanner.finditer(text):
+                longest = found.group(1)
+                # Every literal occurring here is a prefix of the longest one
+                for length in self.literal_lengths[field]:
+                    if length > len(longest):
+                        break
+                    rank = literals.get(longest[:length])
+                    if rank is not None and (best is None or rank < best):
+                        best = rank
+                if best == 0:
+                    return self.rules[0]
+
+        for field, regexes in self.regexes.items():
+            text = _field_value(values, field) or ''
+            for rank, regex in regexes:
+                if best is not None and rank >= best:
+                    break
+                if regex.search(text):
+                    best = rank
+                    break
+
+        return self.rules[best] if best is not None else None
+
+
+def _field_value(values, field: str) -> Optional[str]:
+    return values.get(field) if isinstance(values, dict) else getattr(values, field, None)
+
+
+def load_matcher(db: Session) -> RuleMatcher:
+    """Matcher for the active rules"""
+    rules = (
+        db.query(TaggingRule)
+        .options(selectinload(TaggingRule.projects))
+        .filter(TaggingRule.is_active == True)
+        .all()
+    )
+    return RuleMatcher(rules)
+
+
+def apply_tagging_rules(db: Session, *criteria, overwrite: bool = False, matcher: Optional[RuleMatcher] = None) -> int:
+    """Tag the transactions matching criteria (SQLAlchemy filter expressions) by the rules.
+
+    Only untagged transactions are considered unless overwrite is set, in which case a
+    matching rule replaces the existing projects. Returns the number of transactions
+    tagged. The caller commits.
+    """
+    matcher = matcher if matcher is not None else load_matcher(db)
+    if not matcher:
+        return 0
+
+    query = db.query(Transaction.id, *[getattr(Transaction, field) for field in MATCH_FIELDS]).filter(*criteria)
+    if not overwrite:
+        query = query.filter(
+            Transaction.project_id.is_(None),
+            ~exists().where(transaction_projects.c.transaction_id == Transaction.id)
+        )
+
+    tagged = {}  # transaction id -> project ids
+    for row in query.yield_per(APPLY_BATCH_SIZE):
+        rule = matcher.match(row._mapping)
+        if rule is not None and rule.projects:
+            tagged[row.id] = [project.id for project in rule.projects]
+    if not tagged:
+        return 0
+
+    transaction_ids = list(tagged)
+    for start in range(0, len(transaction_ids), APPLY_BATCH_SIZE):
+        chunk = transaction_ids[start:start + APPLY_BATCH_SIZE]
+        if overwrite:
+            db.execute(delete(transaction_projects).where(transaction_projects.c.transaction_id.in_(chunk)))
+        db.execute(insert(transaction_projects), [
+            {'transaction_id': transaction_id, 'project_id': project_id}
+            for transaction_id in chunk
+            for project_id in tagged[transaction_id]
+        ])
+        # Keep project_id for backward compatibility (only set for a single project)
+        db.execute(
+            update(Transaction.__table__)
+            .where(Transaction.__table__.c.id == bindparam('transaction_id'))
+            .values(project_id=bindparam('legacy_project_id')),
+            [
+                {
+                    'transaction_id': transaction_id,
+                    'legacy_project_id': tagged[transaction_id][0] if len(tagged[transaction_id]) == 1 else None
+                }
+                for transaction_id in chunk
+            ]
+        )
+    return len(tagged)
@@ -1,4 +1,4 @@
-import axios from 'axios'
+import axios, { AxiosResponse } from 'axios'
 
 // Use environment variable for API URL, fallback to localhost for development
 const API_BASE_URL = import.meta.env.VITE_API_URL || (import.meta.env.DEV ? 'http://localhost:8000' : '')
@@ -10,6 +10,22 @@ const apiClient = axios.create({
   },
 })
 
+// One page of a keyset-paginated listing; pass nextCursor back to get the following page
+export interface Page<T> {
+  items: T[]
+  nextCursor: string | null
+  total: number | null  // Omitted when requested with include_total: false
+}
+
+// Rows fetched per page by the transaction lists
+export const PAGE_SIZE = 200
+
+const toPage = <T,>(response: AxiosResponse<T[]>): Page<T> => ({
+  items: response.data,
+  nextCursor: response.headers['x-next-cursor'] ?? null,
+  total: response.headers['x-total-count'] != null ? Number(response.headers['x-total-count']) : null,
+})
+
 export interface Transaction {
   id: number
   date: string
@@ -37,6 +53,34 @@ export interface CashTransaction {
   created_at: string
 }
 
+// Either transaction_ids or filter selects the transactions; project_ids replaces their projects.
+// A filter needs at least one criterion, or all: true to select every transaction.
+export interface BulkTagRequest {
+  transaction_ids?: number[]
+  filter?: { project_id?: number; start_date?: string; end_date?: string; q?: string; all?: boolean }
+  project_ids: number[]
+}
+
+export interface BulkTagResult {
+  updated_count: number
+  project_ids: number[]
+}
+
+// A bank or cash transaction in the unified ledger; ids are unique per source
+export interface LedgerEntry {
+  source: 'bank' | 'cash'
+  id: number
+  date: string
+  amount: number
+  currency: string
+  description?: string
+  reference?: string  // Bank transactions only
+  account_number?: string  // Bank transactions only
+  project_id?: number
+  projects: Project[]
+  created_at: string
+}
+
 export interface Project {
   id: number
   name: string
@@ -66,9 +110,62 @@ export interface DashboardStats {
   project_stats?: ProjectStats[]
 }
 
+export interface CSVPreview {
+  columns: string[]
+  sample_rows: any[]
+  resolved_columns?: Record<string, string | null>  // Field -> column the upload will read it from
+  estimated_row_count: number
+  row_count_exact: boolean
+  encoding: string
+  delimiter: string
+  number_formats: Record<string, string | null>  // Amount field -> decimal separator
+  date_format: string | null
+}
+
+// Bytes of a CSV file sent for the column preview (matches PREVIEW_BYTES on the server)
+const CSV_PREVIEW_BYTES = 64 * 1024
+
+// How long waitForIngestJob waits for a job that makes no progress before giving up
+const INGEST_JOB_STALL_MS = 5 * 60 * 1000
+
+export interface UploadSummary {
+  upload_batch_id: string
+  upload_type: string
+  created_count: number
+  skipped_count: number
+  error_count: number
+  errors: string[]
+  date_fallback_count: number
+  already_uploaded: boolean
+}
+
+export interface MultiUploadSummary {
+  files: (UploadSummary & { file_name?: string })[]
+  created_count: number
+  skipped_count: number
+  error_count: number
+}
+
+export interface IngestJob {
+  id: string
+  file_name?: string
+  upload_type: string
+  status: 'queued' | 'running' | 'completed' | 'failed'
+  upload_batch_id: string
+  rows_processed: number
+  rows_created: number
+  rows_skipped: number
+  error_count: number
+  errors: string[]
+  already_uploaded: boolean
+  created_at: string
+  started_at?: string
+  finished_at?: string
+}
+
 export const api = {
   // Transactions
-  uploadMT940: async (file: File): Promise<Transaction[]> => {
+  uploadMT940: async (file: File): Promise<UploadSummary> => {
     const formData = new FormData()
     formData.append('file', file)
     const response = await apiClient.post('/api/upload-mt940', formData, {
@@ -77,16 +174,28 @@ export const api = {
     return response.data
   },
 
-  previewCSV: async (file: File): Promise<{ columns: string[]; sample_rows: any[] }> => {
+  // Several MT940 files and/or ZIP archives of them; one upload batch per statement file
+  uploadMT940Batch: async (files: File[]): Promise<MultiUploadSummary> => {
     const formData = new FormData()
-    formData.append('file', file)
+    files.forEach(file => formData.append('files', file))
+    const response = await apiClient.post('/api/upload-mt940-batch', formData, {
+      headers: { 'Content-Type': 'multipart/form-data' },
+    })
+    return response.data
+  },
+
+  // Only the beginning of the file is sent; the server estimates the row count from file_size
+  previewCSV: async (file: File): Promise<CSVPreview> => {
+    const formData = new FormData()
+    formData.append('file', file.slice(0, CSV_PREVIEW_BYTES), file.name)
+    formData.append('file_size', String(file.size))
     const response = await apiClient.post('/api/preview-csv', formData, {
       headers: { 'Content-Type': 'multipart/form-data' },
     })
     return response.data
   },
 
-  uploadCSV: async (file: File, columnMapping?: Record<string, string>): Promise<Transaction[]> => {
+  uploadCSV: async (file: File, columnMapping?: Record<string, string>): Promise<UploadSummary> => {
     const formData = new FormData()
     formData.append('file', file)
     if (columnMapping) {
@@ -98,6 +207,54 @@ export const api = {
     return response.data
   },
 
+  // Background ingestion jobs (large uploads are processed after the request returns)
+  createIngestJob: async (
+    file: File,
+    uploadType: 'MT940' | 'CSV',
+    columnMapping?: Record<string, string>
+  ): Promise<IngestJob> => {
+    const formData = new FormData()
+    formData.append('file', file)
+    formData.append('upload_type', uploadType)
+    if (columnMapping) {
+      formData.append('column_mapping', JSON.stringify(columnMapping))
+    }
+    const response = await apiClient.post('/api/ingest-jobs', formData, {
+      headers: { 'Content-Type': 'multipart/form-data' },
+    })
+    return response.data
+  },
+
+  getIngestJob: async (jobId: string): Promise<IngestJob> => {
+    const response = await apiClient.get(`/api/ingest-jobs/${jobId}`)
+    return response.data
+  },
+
+  // Poll a job until it completes or fails
+  // Throws when the job makes no progress for INGEST_JOB_STALL_MS (e.g. stays queued
+  // after its worker died), so the caller doesn't wait forever
+  waitForIngestJob: async (jobId: string, intervalMs = 1000): Promise<IngestJob> => {
+    let lastProgress = ''
+    let lastProgressAt = Date.now()
+    for (;;) {
+      const job = await api.getIngestJob(jobId)
+      if (job.status === 'completed' || job.status === 'failed') {
+        return job
+      }
+      const progress = `${job.status}:${job.rows_processed}`
+      if (progress !== lastProgress) {
+        lastProgress = progress
+        lastProgressAt = Date.now()
+      } else if (Date.now() - lastProgressAt > INGEST_JOB_STALL_MS) {
+        throw new Error(
+          `The upload has been ${job.status} without progress for ${INGEST_JOB_STALL_MS / 60000} minutes; ` +
+          'it may have been interrupted. Check the upload list before uploading the file again.'
+        )
+      }
+      await new Promise(resolve => setTimeout(resolve, intervalMs))
+    }
+  },
+
   getTransactions: async (params?: {
     project_id?: number
     start_date?: string
@@ -107,6 +264,18 @@ export const api = {
     return response.data
   },
 
+  getTransactionsPage: async (params?: {
+    project_id?: number
+    start_date?: string
+    end_date?: string
+    cursor?: string
+    include_total?: boolean
+    q?: string
+  }): Promise<Page<Transaction>> => {
+    const response = await apiClient.get('/api/transactions', { params: { limit: PAGE_SIZE, ...params } })
+    return toPage<Transaction>(response)
+  },
+
   updateTransaction: async (
     id: number,
     data: { project_id?: number | undefined; project_ids?: number[]; description?: string }
@@ -115,6 +284,18 @@ export const api = {
     return response.data
   },
 
+  // Sets the same projects on many transactions (by id or listing filter) in one request
+  bulkTagTransactions: async (data: BulkTagRequest): Promise<BulkTagResult> => {
+    const response = await apiClient.post('/api/transactions/bulk-tag', data)
+    return response.data
+  },
+
+  // Source data the transaction was imported from (CSV row by column or MT940 fields by tag)
+  getTransactionRaw: async (id: number): Promise<{ transaction_id: number; raw_data: unknown }> => {
+    const response = await apiClient.get(`/api/transactions/${id}/raw`)
+    return response.data
+  },
+
   deleteTransaction: async (_id: number): Promise<void> => {
     // Bank transactions cannot be deleted
     throw new Error('Bank transactions cannot be deleted')
@@ -128,6 +309,10 @@ export const api = {
     created_at: string
     account_number?: string
     statement_number?: string
+    file_name?: string
+    file_size?: number
+    skipped_count: number
+    error_count: number
   }>> => {
     const response = await apiClient.get('/api/upload-batches')
     return response.data
@@ -173,6 +358,18 @@ export const api = {
     return response.data
   },
 
+  getCashTransactionsPage: async (params?: {
+    project_id?: number
+    start_date?: string
+    end_date?: string
+    cursor?: string
+    include_total?: boolean
+    q?: string
+  }): Promise<Page<CashTransaction>> => {
+    const response = await apiClient.get('/api/cash-transactions', { params: { limit: PAGE_SIZE, ...params } })
+    return toPage<CashTransaction>(response)
+  },
+
   updateCashTransaction: async (
     id: number,
     data: Partial<CashTransaction>
@@ -181,10 +378,27 @@ export const api = {
     return response.data
   },
 
+  bulkTagCashTransactions: async (data: BulkTagRequest): Promise<BulkTagResult> => {
+    const response = await apiClient.post('/api/cash-transactions/bulk-tag', data)
+    return response.data
+  },
+
   deleteCashTransaction: async (id: number): Promise<void> => {
     await apiClient.delete(`/api/cash-transactions/${id}`)
   },
 
+  // Bank and cash transactions merged and sorted by the server, newest first
+  getLedgerPage: async (params?: {
+    project_id?: number
+    start_date?: string
+    end_date?: string
+    cursor?: string
+    include_total?: boolean
+  }): Promise<Page<LedgerEntry>> => {
+    const response = await apiClient.get('/api/ledger', { params: { limit: PAGE_SIZE, ...params } })
+    return toPage<LedgerEntry>(response)
+  },
+
   // Projects
   createProject: async (data: { name: string; description?: string }): Promise<Project> => {
     const response = await apiClient.post('/api/projects', data)
@@ -6,6 +6,9 @@ export default function CashTransactions() {
   const [transactions, setTransactions] = useState<CashTransaction[]>([])
   const [projects, setProjects] = useState<Project[]>([])
   const [loading, setLoading] = useState(false)
+  const [loadingMore, setLoadingMore] = useState(false)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [totalCount, setTotalCount] = useState<number | null>(null)
   const [showForm, setShowForm] = useState(false)
   const [formData, setFormData] = useState({
     date: format(new Date(), 'yyyy-MM-dd'),
@@ -15,6 +18,9 @@ export default function CashTransactions() {
     selectedProjectIds: [] as number[],
   })
   const [selectedProject, setSelectedProject] = useState<number | undefined>(undefined)
+  // Text in the search box; searchQuery follows it after a short pause in typing
+  const [searchText, setSearchText] = useState('')
+  const [searchQuery, setSearchQuery] = useState('')
   const [projectSearchTerm, setProjectSearchTerm] = useState('')
   const [showProjectDropdown, setShowProjectDropdown] = useState(false)
   const projectDropdownRef = useRef<HTMLDivElement>(null)
@@ -23,15 +29,26 @@ export default function CashTransactions() {
   useEffect(() => {
     loadTransactions()
     loadProjects()
-  }, [selectedProject])
+  }, [selectedProject, searchQuery])
 
+  useEffect(() => {
+    const timer = setTimeout(() => setSearchQuery(searchText.trim()), 300)
+    return () => clearTimeout(timer)
+  }, [searchText])
+
+  const listFilters = () => ({
+    ...(selectedProject ? { project_id: selectedProject } : {}),
+    ...(searchQuery ? { q: searchQuery } : {}),
+  })
+
+  // Loads the first page; loadMoreTransactions appends the next one
   const loadTransactions = async () => {
     setLoading(true)
     try {
-      const data = await api.getCashTransactions(
-        selectedProject ? { project_id: selectedProject } : undefined
-      )
-      setTransactions(data)
+      const page = await api.getCashTransactionsPage(listFilters())
+      setTransactions(page.items)
+      setNextCursor(page.nextCursor)
+      setTotalCount(page.total)
     } catch (error) {
       console.error('Failed to load cash transactions:', error)
     } finally {
@@ -39,6 +56,25 @@ export default function CashTransactions() {
     }
   }
 
+  const loadMoreTransactions = async () => {
+    if (!nextCursor) return
+    setLoadingMore(true)
+    try {
+      // The total was returned with the first page
+      const page = await api.getCashTransactionsPage({
+        ...listFilters(),
+        cursor: nextCursor,
+        include_total: false,
+      })
+      setTransactions(current => [...current, ...page.items])
+      setNextCursor(page.nextCursor)
+    } catch (error) {
+      console.error('Failed to load cash transactions:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const loadProjects = async () => {
     try {
       const data = await api.getProjects()
@@ -162,6 +198,16 @@ export default function CashTransactions() {
       <div className="mb-6 flex justify-between items-center">
         <h2 className="text-2xl font-bold text-gray-900">Cash Transactions</h2>
         <div className="flex gap-4">
+          <div>
+            <label className="block text-sm font-medium text-gray-700 mb-1">Search</label>
+            <input
+              type="search"
+              value={searchText}
+              onChange={(e) => setSearchText(e.target.value)}
+              placeholder="Description..."
+              className="border border-gray-300 rounded-md px-3 py-2"
+            />
+          </div>
           <div>
             <label className="block text-sm font-medium text-gray-700 mb-1">Filter by Project</label>
             <select
@@ -368,6 +414,22 @@ export default function CashTransactions() {
               </tbody>
             </table>
           </div>
+          {(nextCursor || totalCount !== null) && (
+            <div className="px-6 py-3 flex items-center justify-between border-t text-sm text-gray-500">
+              <span>
+                Showing {transactions.length}{totalCount !== null ? ` of ${totalCount}` : ''} transactions
+              </span>
+              {nextCursor && (
+                <button
+                  onClick={loadMoreTransactions}
+                  disabled={loadingMore}
+                  className="px-3 py-1 border rounded text-gray-700 hover:bg-gray-50 disabled:opacity-50"
+                >
+                  {loadingMore ? 'Loading...' : 'Load more'}
+                </button>
+              )}
+            </div>
+          )}
         </div>
       )}
     </div>
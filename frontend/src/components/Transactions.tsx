@@ -1,13 +1,19 @@
 import { useState, useEffect, useRef } from 'react'
-import { api, Transaction, Project } from '../api/client'
+import { api, Transaction, Project, CSVPreview } from '../api/client'
 import { format } from 'date-fns'
 
 export default function Transactions() {
   const [transactions, setTransactions] = useState<Transaction[]>([])
   const [projects, setProjects] = useState<Project[]>([])
   const [loading, setLoading] = useState(false)
+  const [loadingMore, setLoadingMore] = useState(false)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [totalCount, setTotalCount] = useState<number | null>(null)
   const [uploading, setUploading] = useState(false)
   const [selectedProject, setSelectedProject] = useState<number | undefined>(undefined)
+  // Text in the search box; searchQuery follows it after a short pause in typing
+  const [searchText, setSearchText] = useState('')
+  const [searchQuery, setSearchQuery] = useState('')
   // Map of transaction ID to pending project IDs (for batch editing)
   const [pendingTagChanges, setPendingTagChanges] = useState<Map<number, number[]>>(new Map())
   // Currently focused transaction for search input (only one search can be active at a time)
@@ -16,7 +22,7 @@ export default function Transactions() {
   const [showProjectDropdown, setShowProjectDropdown] = useState(false)
   const projectDropdownRef = useRef<HTMLDivElement>(null)
   const searchInputRef = useRef<HTMLInputElement>(null)
-  const [csvPreview, setCsvPreview] = useState<{ columns: string[]; sample_rows: any[] } | null>(null)
+  const [csvPreview, setCsvPreview] = useState<CSVPreview | null>(null)
   const [csvFile, setCsvFile] = useState<File | null>(null)
   const [columnMapping, setColumnMapping] = useState<Record<string, string>>({})
   const [showMappingModal, setShowMappingModal] = useState(false)
@@ -62,7 +68,12 @@ export default function Transactions() {
     loadTransactions()
     loadProjects()
     loadUploadBatches()
-  }, [selectedProject])
+  }, [selectedProject, searchQuery])
+
+  useEffect(() => {
+    const timer = setTimeout(() => setSearchQuery(searchText.trim()), 300)
+    return () => clearTimeout(timer)
+  }, [searchText])
 
   const loadUploadBatches = async () => {
     try {
@@ -73,13 +84,19 @@ export default function Transactions() {
     }
   }
 
+  const listFilters = () => ({
+    ...(selectedProject ? { project_id: selectedProject } : {}),
+    ...(searchQuery ? { q: searchQuery } : {}),
+  })
+
+  // Loads the first page; loadMoreTransactions appends the next one
   const loadTransactions = async () => {
     setLoading(true)
     try {
-      const data = await api.getTransactions(
-        selectedProject ? { project_id: selectedProject } : undefined
-      )
-      setTransactions(data)
+      const page = await api.getTransactionsPage(listFilters())
+      setTransactions(page.items)
+      setNextCursor(page.nextCursor)
+      setTotalCount(page.total)
     } catch (error) {
       console.error('Failed to load transactions:', error)
     } finally {
@@ -87,6 +104,25 @@ export default function Transactions() {
     }
   }
 
+  const loadMoreTransactions = async () => {
+    if (!nextCursor) return
+    setLoadingMore(true)
+    try {
+      // The total was returned with the first page
+      const page = await api.getTransactionsPage({
+        ...listFilters(),
+        cursor: nextCursor,
+        include_total: false,
+      })
+      setTransactions(current => [...current, ...page.items])
+      setNextCursor(page.nextCursor)
+    } catch (error) {
+      console.error('Failed to load transactions:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const loadProjects = async () => {
     try {
       const data = await api.getProjects()
@@ -97,15 +133,39 @@ export default function Transactions() {
   }
 
   const handleMT940Upload = async (e: React.ChangeEvent<HTMLInputElement>) => {
-    const file = e.target.files?.[0]
+    const files = Array.from(e.target.files || [])
+    const file = files[0]
     if (!file) return
 
     setUploading(true)
     try {
-      await api.uploadMT940(file)
+      // Several statements or a ZIP archive go through the multi-file endpoint
+      if (files.length > 1 || file.name.toLowerCase().endsWith('.zip')) {
+        const summary = await api.uploadMT940Batch(files)
+        await loadTransactions()
+        await loadUploadBatches()
+        const failed = summary.files.filter(f => f.error_count > 0)
+        const alreadyUploaded = summary.files.filter(f => f.already_uploaded)
+        alert(
+          `${summary.files.length} MT940 files processed: ${summary.created_count} imported, ` +
+          `${summary.skipped_count} duplicates skipped.` +
+          (alreadyUploaded.length ? `\nAlready uploaded: ${alreadyUploaded.map(f => f.file_name).join(', ')}` : '') +
+          (failed.length ? `\nFailed: ${failed.map(f => `${f.file_name}: ${f.errors.join('; ')}`).join('\n')}` : '')
+        )
+        return
+      }
+
+      const job = await api.waitForIngestJob((await api.createIngestJob(file, 'MT940')).id)
+      if (job.status === 'failed') {
+        throw new Error(job.errors.join('; '))
+      }
       await loadTransactions()
       await loadUploadBatches()
-      alert('MT940 file uploaded successfully!')
+      if (job.already_uploaded) {
+        alert('This MT940 file was already uploaded; nothing was imported.')
+        return
+      }
+      alert(`MT940 file uploaded successfully! ${job.rows_created} imported, ${job.rows_skipped} duplicates skipped.`)
     } catch (error: any) {
       alert(`Failed to upload: ${error.response?.data?.detail || error.message}`)
     } finally {
@@ -124,8 +184,13 @@ export default function Transactions() {
       setCsvPreview(preview)
       setCsvFile(file)
       
-      // Auto-detect column mappings
+      // Start from the column plan the server will apply, then auto-detect the remaining fields
       const autoMapping: Record<string, string> = {}
+      Object.entries(preview.resolved_columns || {}).forEach(([field, col]) => {
+        if (col) {
+          autoMapping[field] = col
+        }
+      })
       const fieldNames = ['date', 'amount', 'debit', 'credit', 'transaction_type', 'reference', 'description', 'currency', 'account_number', 'statement_number']
       
       preview.columns.forEach(col => {
@@ -175,14 +240,21 @@ export default function Transactions() {
 
     setUploading(true)
     try {
-      await api.uploadCSV(csvFile, columnMapping)
+      const job = await api.waitForIngestJob((await api.createIngestJob(csvFile, 'CSV', columnMapping)).id)
+      if (job.status === 'failed') {
+        throw new Error(job.errors.join('; '))
+      }
       await loadTransactions()
       await loadUploadBatches()
       setShowMappingModal(false)
       setCsvPreview(null)
       setCsvFile(null)
       setColumnMapping({})
-      alert('CSV file uploaded successfully!')
+      if (job.already_uploaded) {
+        alert('This CSV file was already uploaded; nothing was imported.')
+        return
+      }
+      alert(`CSV file uploaded successfully! ${job.rows_created} imported, ${job.rows_skipped} duplicates skipped.`)
     } catch (error: any) {
       alert(`Failed to upload: ${error.response?.data?.detail || error.message}`)
     } finally {
@@ -194,21 +266,16 @@ export default function Transactions() {
     if (pendingTagChanges.size === 0) return
 
     try {
-      // Process all pending changes
+      // Group the pending changes by their project set: one bulk request per distinct set
+      const groups = new Map<string, { projectIds: number[]; transactionIds: number[] }>()
       for (const [transactionId, projectIds] of pendingTagChanges.entries()) {
-        const transaction = transactions.find((t) => t.id === transactionId)
-        if (!transaction) continue
-
-        if (projectIds.length === 0) {
-          // No projects selected, remove project assignment
-          await api.updateTransaction(transactionId, { project_id: undefined })
-        } else if (projectIds.length === 1) {
-          // Single project, update normally
-          await api.updateTransaction(transactionId, { project_id: projectIds[0] })
-        } else {
-          // Multiple projects, split the transaction
-          await api.updateTransaction(transactionId, { project_ids: projectIds })
-        }
+        const key = [...projectIds].sort((a, b) => a - b).join(',')
+        const group = groups.get(key) || { projectIds, transactionIds: [] }
+        group.transactionIds.push(transactionId)
+        groups.set(key, group)
+      }
+      for (const { projectIds, transactionIds } of groups.values()) {
+        await api.bulkTagTransactions({ transaction_ids: transactionIds, project_ids: projectIds })
       }
       
       // Clear pending changes and reload
@@ -384,6 +451,16 @@ export default function Transactions() {
               Save All Changes ({pendingTagChanges.size})
             </button>
           )}
+          <div>
+            <label className="block text-sm font-medium text-gray-700 mb-1">Search</label>
+            <input
+              type="search"
+              value={searchText}
+              onChange={(e) => setSearchText(e.target.value)}
+              placeholder="Description, reference..."
+              className="border border-gray-300 rounded-md px-3 py-2"
+            />
+          </div>
           <div>
             <label className="block text-sm font-medium text-gray-700 mb-1">Filter by Project</label>
             <select
@@ -404,7 +481,8 @@ export default function Transactions() {
               <label className="block text-sm font-medium text-gray-700 mb-1">Upload MT940</label>
               <input
                 type="file"
-                accept=".940,.txt"
+                accept=".940,.txt,.sta,.zip"
+                multiple
                 onChange={handleMT940Upload}
                 disabled={uploading}
                 className="block text-sm text-gray-500 file:mr-4 file:py-2 file:px-4 file:rounded-md file:border-0 file:text-sm file:font-semibold file:bg-blue-50 file:text-blue-700 hover:file:bg-blue-100"
@@ -625,6 +703,22 @@ export default function Transactions() {
               </tbody>
             </table>
           </div>
+          {(nextCursor || totalCount !== null) && (
+            <div className="px-6 py-3 flex items-center justify-between border-t text-sm text-gray-500">
+              <span>
+                Showing {transactions.length}{totalCount !== null ? ` of ${totalCount}` : ''} transactions
+              </span>
+              {nextCursor && (
+                <button
+                  onClick={loadMoreTransactions}
+                  disabled={loadingMore}
+                  className="px-3 py-1 border rounded text-gray-700 hover:bg-gray-50 disabled:opacity-50"
+                >
+                  {loadingMore ? 'Loading...' : 'Load more'}
+                </button>
+              )}
+            </div>
+          )}
         </div>
       )}
 
@@ -636,7 +730,9 @@ export default function Transactions() {
               <h3 className="text-lg font-medium text-gray-900 mb-4">Map CSV Columns</h3>
               
               <div className="mb-4 p-3 bg-gray-50 rounded">
-                <p className="text-sm text-gray-600 mb-2">Available columns in your CSV:</p>
+                <p className="text-sm text-gray-600 mb-2">
+                  Available columns in your CSV ({csvPreview.row_count_exact ? '' : '~'}{csvPreview.estimated_row_count} rows):
+                </p>
                 <div className="flex flex-wrap gap-2">
                   {csvPreview.columns.map((col) => (
                     <span key={col} className="px-2 py-1 bg-blue-100 text-blue-800 rounded text-sm">